@@ -44,11 +44,31 @@ ML_MODEL_SUFFIX = "-v1"
 
 # Llama4Scout API Configuration (replaces Bedrock)
 LLAMA_API_ENDPOINT = "https://bkwg3037dnb7aq-8000.proxy.runpod.net/v1/chat/completions"
+# Inference servers the clients route between; add replicas here
+LLAMA_API_ENDPOINTS = [LLAMA_API_ENDPOINT]
+# Duplicate requests that run past the p95 latency to a second endpoint
+LLAMA_HEDGING = False
+# "transcript_first" shares one transcript prefix across the analysis prompts of a conversation,
+# which pays off on servers with automatic prefix caching (measure with tools/prefix_cache_benchmark.py)
+LLAMA_PROMPT_LAYOUT = "instruction_first"
 LLAMA_MODEL_NAME = "llama4scout"
 LLAMA_MAX_TOKENS = 1024
 LLAMA_TEMPERATURE = 0.1
 LLAMA_API_TIMEOUT = 30
 LLAMA_MAX_RETRIES = 3
+# LLM response cache entries expire from DynamoDB after this many seconds
+LLM_CACHE_TTL = 7 * 24 * 3600
+# /genai answer cache: entries live for ANSWER_CACHE_TTL seconds and a paraphrased question reuses
+# an answer when its similarity to a cached question is at least ANSWER_CACHE_THRESHOLD (1 = exact only)
+ANSWER_CACHE_TTL = 30 * 24 * 3600
+ANSWER_CACHE_THRESHOLD = 0.9
+# Standard /genai questions answered for every conversation at analysis time
+PRECOMPUTED_QUESTIONS = [
+    "What was the customer's issue?",
+    "Was the customer's issue resolved?",
+    "What did the agent promise to do?",
+    "Why did the customer call?",
+]
 
 # Lemonfox.ai API Configuration (replaces SageMaker)
 # LEMONFOX_API_KEY should be set via environment variable or AWS Secrets Manager
@@ -58,6 +78,39 @@ LEMONFOX_TIMEOUT = 300  # 5 minutes for long audio files
 LEMONFOX_MAX_RETRIES = 3
 LEMONFOX_MIN_SPEAKERS = 2
 LEMONFOX_MAX_SPEAKERS = 2
+# "presigned" lets Lemonfox download the audio from a presigned S3 URL valid for LEMONFOX_PRESIGNED_URL_EXPIRY
+# seconds; "stream" pipes the S3 object through the Lambda into a multipart upload
+LEMONFOX_AUDIO_MODE = "presigned"
+LEMONFOX_PRESIGNED_URL_EXPIRY = 3600
+# Asynchronous mode: the workflow submits each job with a callback URL and pauses on a Step Functions
+# task token until Lemonfox posts the result, so no Lambda waits on the API and call length is unbounded
+LEMONFOX_ASYNC = False
+LEMONFOX_ASYNC_TIMEOUT = 4 * 3600  # Fail the workflow if no callback arrives within this many seconds
+LEMONFOX_SUBMIT_TIMEOUT = 30
+# Long-audio mode: WAVs longer than LONG_AUDIO_THRESHOLD seconds are transcribed as concurrent windows of
+# LONG_AUDIO_WINDOW_SECONDS overlapping by LONG_AUDIO_WINDOW_OVERLAP seconds, then stitched together
+LONG_AUDIO_THRESHOLD = 1200
+LONG_AUDIO_WINDOW_SECONDS = 600
+LONG_AUDIO_WINDOW_OVERLAP = 30
+LONG_AUDIO_WINDOW_CONCURRENCY = 8
+# Audio is re-encoded to 16 kHz mono "flac" or "opus" before it is sent to Lemonfox ("none" sends it
+# unchanged). ffmpeg comes from an optional Lambda layer; without it the original audio is sent.
+AUDIO_UPLOAD_FORMAT = "flac"
+FFMPEG_LAYER_ARN = ""  # e.g. arn:aws:lambda:<region>:<account>:layer:ffmpeg:1, providing /opt/bin/ffmpeg
+# Silence trimming: non-speech runs of at least VAD_MIN_SILENCE seconds are removed from WAV audio before
+# it is sent, keeping VAD_PADDING seconds around speech; timestamps are mapped back to the original audio.
+# Needs numpy from an optional Lambda layer (e.g. AWS SDK for pandas); without it audio is sent untrimmed.
+VAD_ENABLED = True
+VAD_MIN_SILENCE = 2.0
+VAD_PADDING = 0.3
+NUMPY_LAYER_ARN = ""
+
+# Provider quotas enforced by the shared DynamoDB token bucket, in requests per minute.
+# Keys are "<api>" or "<api>:<model>".
+RATE_LIMITS = {
+    "llama:" + LLAMA_MODEL_NAME: 60,
+    "lemonfox": 30,
+}
 
 # Lambda Related Constants
 PYTHON_VERSION = "PYTHON_3_11"
@@ -1,6 +1,7 @@
 #  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #  SPDX-License-Identifier: MIT-0
 
+import json
 import os
 import typing
 
@@ -9,6 +10,7 @@ from aws_cdk import (
     aws_s3 as _s3,
     aws_s3_notifications,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
     Duration,
     Stack,
     aws_batch as batch,
@@ -29,6 +31,24 @@ from server.cdk.step_function import StepFunctionStack
 import cfg
 
 
+def invoke_self_statement(stack, function_name):
+    """
+    Permission for a function to invoke itself, with the ARN built from its fixed name: a grant on the
+    function would make its own role policy depend on it, a circular dependency
+    """
+    return iam.PolicyStatement(
+        actions=["lambda:InvokeFunction"],
+        resources=[
+            stack.format_arn(
+                service="lambda",
+                resource="function",
+                resource_name=function_name,
+                arn_format=aws_cdk.ArnFormat.COLON_RESOURCE_NAME,
+            )
+        ],
+    )
+
+
 class ServerStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -90,6 +110,8 @@ class ServerStack(Stack):
                 name="objectKey", type=dynamodb.AttributeType.STRING,
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            # Feeds the corpus indexer whenever a conversation is (re)processed
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
         )
 
         ssm.StringParameter(
@@ -99,6 +121,74 @@ class ServerStack(Stack):
             string_value=uploads_table.table_name
         )
 
+        # Creating DDB Table to cache LLM responses, keyed on a hash of model, prompt and parameters
+        llm_cache_table = dynamodb.Table(
+            self,
+            "ci_llm_cache_ddb",
+            partition_key=dynamodb.Attribute(
+                name="cacheKey", type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+        ssm.StringParameter(
+            self,
+            "llm_cache_ddb_param",
+            parameter_name="ci_llm_cache_ddb",
+            string_value=llm_cache_table.table_name
+        )
+
+        # Creating DDB Table holding one token bucket item per rate-limited API/model
+        rate_limit_table = dynamodb.Table(
+            self,
+            "ci_rate_limit_ddb",
+            partition_key=dynamodb.Attribute(
+                name="bucket", type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        ssm.StringParameter(
+            self,
+            "rate_limit_ddb_param",
+            parameter_name="ci_rate_limit_ddb",
+            string_value=rate_limit_table.table_name
+        )
+
+        # Creating DDB Table holding the cross-conversation search index (see lambdas/corpus_index.py)
+        corpus_index_table = dynamodb.Table(
+            self,
+            "ci_corpus_index_ddb",
+            partition_key=dynamodb.Attribute(
+                name="term", type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="docId", type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+        # Postings are partitioned by term, month and shard, so each item collection stays small;
+        # completedAt is projected for the date filter on a range's first and last month
+        corpus_index_table.add_local_secondary_index(
+            index_name="impact",
+            sort_key=dynamodb.Attribute(name="impact", type=dynamodb.AttributeType.NUMBER),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["completedAt"],
+        )
+
+        ssm.StringParameter(
+            self,
+            "corpus_index_ddb_param",
+            parameter_name="ci_corpus_index_ddb",
+            string_value=corpus_index_table.table_name
+        )
+
+        rate_limit_environment = {
+            "RATE_LIMIT_TABLE": rate_limit_table.table_name,
+            "RATE_LIMITS": json.dumps(cfg.RATE_LIMITS)
+        }
+
         # Create S3 bucket for processing (replacing ML stack bucket)
         ml_stack_output_bucket = _s3.Bucket(
             self,
@@ -132,18 +222,79 @@ class ServerStack(Stack):
         # Remove SSM parameter references - using Lemonfox API instead
         # diarization_model_endpoint = ssm.StringParameter.from_string_parameter_name(...)
 
+        lemonfox_environment = {
+            "LEMONFOX_API_KEY": os.getenv('LEMONFOX_API_KEY', ''),
+            "LEMONFOX_BASE_URL": cfg.LEMONFOX_BASE_URL,
+            "LEMONFOX_TIMEOUT": str(cfg.LEMONFOX_TIMEOUT),
+            "LEMONFOX_MAX_RETRIES": str(cfg.LEMONFOX_MAX_RETRIES),
+            "LEMONFOX_AUDIO_MODE": cfg.LEMONFOX_AUDIO_MODE,
+            "LEMONFOX_PRESIGNED_URL_EXPIRY": str(cfg.LEMONFOX_PRESIGNED_URL_EXPIRY),
+        }
+
+        # Asynchronous Lemonfox jobs waiting for their callback, expired by TTL
+        lemonfox_jobs_table = dynamodb.Table(
+            self,
+            "ci_lemonfox_jobs_ddb",
+            partition_key=dynamodb.Attribute(
+                name="jobId", type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+        # Public endpoint Lemonfox posts finished jobs to; each job URL carries its own secret
+        self.lemonfox_callback_fn = _lambda.Function(
+            self,
+            id="lemonfox_callback_fn",
+            runtime=ci_lambda_runtime,
+            handler="lemonfox_callback.handler",
+            code=_lambda.Code.from_asset("server/lambdas"),
+            timeout=Duration.minutes(3),
+            environment={
+                **lemonfox_environment,
+                "LEMONFOX_JOBS_TABLE": lemonfox_jobs_table.table_name,
+            },
+        )
+        lemonfox_callback_url = self.lemonfox_callback_fn.add_function_url(
+            auth_type=_lambda.FunctionUrlAuthType.NONE,
+        )
+
+        # ffmpeg for compressing audio and numpy for silence trimming before upload, when layers
+        # providing them are configured
+        audio_layers = []
+        if cfg.FFMPEG_LAYER_ARN:
+            audio_layers.append(
+                _lambda.LayerVersion.from_layer_version_arn(self, "ffmpeg_layer", cfg.FFMPEG_LAYER_ARN)
+            )
+        if cfg.NUMPY_LAYER_ARN:
+            audio_layers.append(
+                _lambda.LayerVersion.from_layer_version_arn(self, "numpy_layer", cfg.NUMPY_LAYER_ARN)
+            )
+
         self.diarization_fn = _lambda.Function(
             self,
             id="diarization_fn",
             runtime=ci_lambda_runtime,
             handler="diarization.handler",
             code=_lambda.Code.from_asset("server/lambdas"),
-            timeout=Duration.minutes(3),
+            # Windowed long-audio transcription waits for its slowest window
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            layers=audio_layers,
             environment={
-                "LEMONFOX_API_KEY": os.getenv('LEMONFOX_API_KEY', ''),
-                "LEMONFOX_BASE_URL": cfg.LEMONFOX_BASE_URL,
-                "LEMONFOX_TIMEOUT": str(cfg.LEMONFOX_TIMEOUT),
-                "LEMONFOX_MAX_RETRIES": str(cfg.LEMONFOX_MAX_RETRIES)
+                **lemonfox_environment,
+                "LONG_AUDIO_THRESHOLD": str(cfg.LONG_AUDIO_THRESHOLD),
+                "WINDOW_SECONDS": str(cfg.LONG_AUDIO_WINDOW_SECONDS),
+                "WINDOW_OVERLAP": str(cfg.LONG_AUDIO_WINDOW_OVERLAP),
+                "WINDOW_CONCURRENCY": str(cfg.LONG_AUDIO_WINDOW_CONCURRENCY),
+                "AUDIO_UPLOAD_FORMAT": cfg.AUDIO_UPLOAD_FORMAT if cfg.FFMPEG_LAYER_ARN else "none",
+                "FFMPEG_PATH": "/opt/bin/ffmpeg",
+                "VAD_ENABLED": "true" if cfg.VAD_ENABLED else "false",
+                "VAD_MIN_SILENCE": str(cfg.VAD_MIN_SILENCE),
+                "VAD_PADDING": str(cfg.VAD_PADDING),
+                "LEMONFOX_JOBS_TABLE": lemonfox_jobs_table.table_name,
+                "LEMONFOX_CALLBACK_URL": lemonfox_callback_url.url,
+                **rate_limit_environment
             },
         )
 
@@ -167,10 +318,8 @@ class ServerStack(Stack):
             code=_lambda.Code.from_asset("server/lambdas"),
             timeout=Duration.minutes(3),
             environment={
-                "LEMONFOX_API_KEY": os.getenv('LEMONFOX_API_KEY', ''),
-                "LEMONFOX_BASE_URL": cfg.LEMONFOX_BASE_URL,
-                "LEMONFOX_TIMEOUT": str(cfg.LEMONFOX_TIMEOUT),
-                "LEMONFOX_MAX_RETRIES": str(cfg.LEMONFOX_MAX_RETRIES)
+                **lemonfox_environment,
+                **rate_limit_environment
             },
         )
 
@@ -228,6 +377,26 @@ class ServerStack(Stack):
         )
 
         # Summarization stack to process output json file
+        summarize_environment = {
+            "MAX_TOKENS": "256",
+            "TEMPERATURE": "0.1",
+            "ANALYSIS_MODE": "concurrent",
+            "ANALYSIS_CONCURRENCY": "9",
+            "FIELD_TIMEOUT": "120",
+            "FIELD_MAX_RETRIES": "2",
+            "COMBINED_MAX_TOKENS": "1024",
+            "PROMPT_LAYOUT": cfg.LLAMA_PROMPT_LAYOUT,
+            "CONTEXT_TOKEN_BUDGET": "6000",
+            "COMPACT_TRANSCRIPT": "true",
+            "COMPACT_DEDUPE": "false",
+            "LLM_CACHE_TABLE": llm_cache_table.table_name,
+            "LLM_CACHE_TTL": str(cfg.LLM_CACHE_TTL),
+            "LLAMA_ENDPOINTS": ",".join(cfg.LLAMA_API_ENDPOINTS),
+            "LLM_HEDGING": str(cfg.LLAMA_HEDGING).lower(),
+            "PRECOMPUTED_QUESTIONS": json.dumps(cfg.PRECOMPUTED_QUESTIONS),
+            **rate_limit_environment
+        }
+
         self.summarize_fn = _lambda.Function(
             self,
             id="summarize_fn",
@@ -236,11 +405,55 @@ class ServerStack(Stack):
             runtime=ci_lambda_runtime,
             # Installing requests for Llama4Scout API calls
             code=_lambda.Code.from_asset("server/lambdas"),
+            environment=summarize_environment,
+        )
+
+        # Re-analysis of a single field across stored conversations after a prompt change
+        reanalyze_fn_name = "ci_reanalyze_fn"
+        self.reanalyze_fn = _lambda.Function(
+            self,
+            id="reanalyze_fn",
+            function_name=reanalyze_fn_name,
+            handler="reanalyze.handler",
+            timeout=Duration.minutes(15),
+            runtime=ci_lambda_runtime,
+            code=_lambda.Code.from_asset("server/lambdas"),
             environment={
-                "MAX_TOKENS": "256",
-                "TEMPERATURE": "0.1"
+                **summarize_environment,
+                "UploadsTable": uploads_table.table_name,
+                "REANALYSIS_CONCURRENCY": "4"
             },
         )
+        # Fans out by invoking itself asynchronously
+        self.reanalyze_fn.add_to_role_policy(invoke_self_statement(self, reanalyze_fn_name))
+
+        ssm.StringParameter(
+            self,
+            "reanalyze_fn_param",
+            parameter_name="ci_reanalyze_fn",
+            string_value=self.reanalyze_fn.function_name
+        )
+
+        # Bulk re-run of analysis and/or post-processing with S3 checkpoints
+        backfill_fn_name = "ci_backfill_fn"
+        self.backfill_fn = _lambda.Function(
+            self,
+            id="backfill_fn",
+            function_name=backfill_fn_name,
+            handler="backfill.handler",
+            timeout=Duration.minutes(15),
+            runtime=ci_lambda_runtime,
+            code=_lambda.Code.from_asset("server/lambdas"),
+            environment={
+                **summarize_environment,
+                "UploadsTable": uploads_table.table_name,
+                "BACKFILL_BUCKET": transcripts_input_bucket.bucket_name,
+                "BACKFILL_WORKERS": "4",
+                "BACKFILL_MAX_PER_MINUTE": "0"
+            },
+        )
+        # Continues long runs by invoking itself asynchronously
+        self.backfill_fn.add_to_role_policy(invoke_self_statement(self, backfill_fn_name))
 
         self.post_processing_fn = _lambda.Function(
             self,
@@ -252,6 +465,24 @@ class ServerStack(Stack):
             timeout=Duration.minutes(3)
         )
 
+        # Incremental corpus index maintenance from the uploads table stream
+        self.corpus_indexer_fn = _lambda.Function(
+            self,
+            id="corpus_indexer_fn",
+            runtime=ci_lambda_runtime,
+            handler="corpus_indexer.handler",
+            code=_lambda.Code.from_asset("server/lambdas"),
+            environment={"CORPUS_INDEX_TABLE": corpus_index_table.table_name},
+            timeout=Duration.minutes(5)
+        )
+        self.corpus_indexer_fn.add_event_source(lambda_event_sources.DynamoEventSource(
+            uploads_table,
+            starting_position=_lambda.StartingPosition.LATEST,
+            batch_size=10,
+            retry_attempts=3,
+            report_batch_item_failures=True,
+        ))
+
         s3_trigger_lambda = _lambda.Function(
             self,
             id="s3_upload_trigger_fn",
@@ -278,8 +509,14 @@ class ServerStack(Stack):
         transcripts_input_bucket.grant_read_write(self.check_sentiment_job_fn.role)
         transcripts_input_bucket.grant_read_write(self.post_processing_fn.role)
         transcripts_input_bucket.grant_read_write(self.diarization_fn.role)
+        transcripts_input_bucket.grant_read_write(self.lemonfox_callback_fn.role)
+        lemonfox_jobs_table.grant_read_write_data(self.diarization_fn.role)
+        lemonfox_jobs_table.grant_read_write_data(self.lemonfox_callback_fn.role)
         transcripts_input_bucket.grant_read_write(self.transcription_fn.role)
         transcripts_input_bucket.grant_read_write(self.summarize_fn.role)
+        transcripts_input_bucket.grant_read_write(self.reanalyze_fn.role)
+        transcripts_input_bucket.grant_read_write(self.backfill_fn.role)
+        transcripts_input_bucket.grant_read(self.corpus_indexer_fn.role)
         # transcripts_input_bucket.grant_read_write(comprehend_job_role)  # Removed - no longer needed
         transcripts_input_bucket.grant_read_write(self.transcription_output_fn.role)
         transcripts_input_bucket.grant_read_write(self.combine_file_output_fn.role)
@@ -287,6 +524,15 @@ class ServerStack(Stack):
 
         uploads_table.grant_read_write_data(self.post_processing_fn.role)
         uploads_table.grant_read_write_data(s3_trigger_lambda.role)
+        llm_cache_table.grant_read_write_data(self.summarize_fn.role)
+        uploads_table.grant_read_write_data(self.reanalyze_fn.role)
+        llm_cache_table.grant_read_write_data(self.reanalyze_fn.role)
+        uploads_table.grant_read_write_data(self.backfill_fn.role)
+        llm_cache_table.grant_read_write_data(self.backfill_fn.role)
+        corpus_index_table.grant_read_write_data(self.corpus_indexer_fn.role)
+        for api_fn in [self.diarization_fn, self.transcription_fn, self.summarize_fn,
+                       self.reanalyze_fn, self.backfill_fn]:
+            rate_limit_table.grant_read_write_data(api_fn.role)
 
         ml_stack_output_bucket.grant_read(self.diarization_fn)
         ml_stack_output_bucket.grant_read_write(self.transcription_fn)
@@ -294,15 +540,23 @@ class ServerStack(Stack):
         ml_stack_output_bucket.grant_read_write(self.check_diarization_output_fn)
 
         prompts.model_id_param.grant_read(self.summarize_fn.role)
-        prompts.summarization_prompt.grant_read(self.summarize_fn.role)
-        prompts.actions_prompt.grant_read(self.summarize_fn.role)
-        prompts.topic_prompt.grant_read(self.summarize_fn.role)
-        prompts.product_prompt.grant_read(self.summarize_fn.role)
-        prompts.resolved_prompt.grant_read(self.summarize_fn.role)
-        prompts.callback_prompt.grant_read(self.summarize_fn.role)
-        prompts.politeness_prompt.grant_read(self.summarize_fn.role)
-        prompts.agent_feedback_prompt.grant_read(self.summarize_fn.role)
-        prompts.customer_feedback_prompt.grant_read(self.summarize_fn.role)
+        for analysis_fn in [self.summarize_fn, self.reanalyze_fn, self.backfill_fn]:
+            prompts.summarization_prompt.grant_read(analysis_fn.role)
+            prompts.actions_prompt.grant_read(analysis_fn.role)
+            prompts.topic_prompt.grant_read(analysis_fn.role)
+            prompts.product_prompt.grant_read(analysis_fn.role)
+            prompts.resolved_prompt.grant_read(analysis_fn.role)
+            prompts.callback_prompt.grant_read(analysis_fn.role)
+            prompts.politeness_prompt.grant_read(analysis_fn.role)
+            prompts.agent_feedback_prompt.grant_read(analysis_fn.role)
+            prompts.customer_feedback_prompt.grant_read(analysis_fn.role)
+
+        # Precomputed /genai answers use the chatbot prompt, which is owned by the web app stack
+        chatbot_prompt = ssm.StringParameter.from_string_parameter_name(
+            self, "chatbot_prompt_param", cfg.SSM_LLM_CHATBOT_NAME
+        )
+        for analysis_fn in [self.summarize_fn, self.reanalyze_fn, self.backfill_fn]:
+            chatbot_prompt.grant_read(analysis_fn.role)
 
         # Comprehend policies removed - no longer needed
         # self.start_comprehension_fn.role.attach_inline_policy(comprehend_job_policy)
@@ -321,6 +575,7 @@ class ServerStack(Stack):
         step_function_stack = StepFunctionStack(cdk_scope=self)
         ci_step = step_function_stack.ci_step
         ci_step.grant_start_execution(s3_trigger_lambda)
+        ci_step.grant_task_response(self.lemonfox_callback_fn)
 
         # Adding ARN of State Machine to Lambda
         s3_trigger_lambda.add_environment("ci_workflow", ci_step.state_machine_arn)
@@ -9,6 +9,8 @@ from aws_cdk import (
 )
 from aws_cdk.aws_stepfunctions import JsonPath
 
+import cfg
+
 
 class StepFunctionStack:
     def __init__(self, cdk_scope):
@@ -64,12 +66,26 @@ class StepFunctionStack:
         # Remove Batch job - using Lemonfox API instead
         # convert_to_wav_step = _aws_stepfunctions_tasks.BatchSubmitJob(...)
 
-        diarization_fn_step = _aws_stepfunctions_tasks.LambdaInvoke(
-            cdk_scope,
-            id="Diarization",
-            lambda_function=cdk_scope.diarization_fn,
-            output_path="$.Payload",
-        )
+        if cfg.LEMONFOX_ASYNC:
+            # Submits the Lemonfox job and pauses until lemonfox_callback returns the task token
+            diarization_fn_step = _aws_stepfunctions_tasks.LambdaInvoke(
+                cdk_scope,
+                id="Diarization",
+                lambda_function=cdk_scope.diarization_fn,
+                integration_pattern=_aws_stepfunctions.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+                payload=_aws_stepfunctions.TaskInput.from_object({
+                    "event": JsonPath.object_at("$.event"),
+                    "task_token": JsonPath.task_token,
+                }),
+                task_timeout=_aws_stepfunctions.Timeout.duration(Duration.seconds(cfg.LEMONFOX_ASYNC_TIMEOUT)),
+            )
+        else:
+            diarization_fn_step = _aws_stepfunctions_tasks.LambdaInvoke(
+                cdk_scope,
+                id="Diarization",
+                lambda_function=cdk_scope.diarization_fn,
+                output_path="$.Payload",
+            )
 
         check_diarization_output_fn_step = _aws_stepfunctions_tasks.LambdaInvoke(
             cdk_scope,
@@ -0,0 +1,141 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import shutil
+import subprocess
+import threading
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+# Audio is re-encoded to 16 kHz mono before it is sent for transcription. ffmpeg is not part of the
+# Lambda bundle; provide it through a layer (FFMPEG_PATH, e.g. /opt/bin/ffmpeg). Without it, or with
+# AUDIO_UPLOAD_FORMAT=none, the original file is sent.
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+AUDIO_UPLOAD_FORMAT = os.getenv("AUDIO_UPLOAD_FORMAT", "flac")
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+OPUS_BITRATE = os.getenv("OPUS_BITRATE", "24k")
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Format -> ffmpeg codec arguments, container, file extension and content type
+FORMATS = {
+    "flac": (["-c:a", "flac"], "flac", "flac", "audio/flac"),
+    "opus": (["-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip"], "ogg", "opus", "audio/ogg"),
+}
+
+s3_client = boto3.client("s3")
+_ffmpeg = {}
+
+
+def ffmpeg_available():
+    if "path" not in _ffmpeg:
+        _ffmpeg["path"] = shutil.which(FFMPEG_PATH)
+        if _ffmpeg["path"] is None:
+            print(f"ffmpeg not found at {FFMPEG_PATH}, audio is sent without transcoding")
+    return _ffmpeg["path"] is not None
+
+
+class CountingReader:
+    """
+    Read side of the encoder pipe that counts the compressed bytes uploaded
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+
+def feed(body, stdin):
+    try:
+        for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg exited early; its exit status reports why
+        pass
+    finally:
+        stdin.close()
+
+
+def transcode(bucket, key, target_key, audio_format):
+    """
+    Stream an S3 audio object through ffmpeg into a new object: the source is fed to the decoder and
+    the encoder output uploaded in parts as it is produced, so neither is held in memory or on disk
+
+    Returns:
+        dict: Original and compressed sizes of the object
+    """
+    codec, container, _, content_type = FORMATS[audio_format]
+    s3_obj = s3_client.get_object(Bucket=bucket, Key=key)
+    process = subprocess.Popen(
+        [_ffmpeg["path"], "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), *codec, "-f", container, "pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    feeder = threading.Thread(target=feed, args=(s3_obj["Body"], process.stdin), daemon=True)
+    feeder.start()
+    output = CountingReader(process.stdout)
+    try:
+        s3_client.upload_fileobj(output, bucket, target_key, ExtraArgs={"ContentType": content_type},
+                                 Config=TransferConfig(multipart_chunksize=8 * 1024 * 1024))
+    except Exception:
+        # Stop the encoder so neither it nor the feeder thread is left blocked on a pipe
+        process.kill()
+        process.wait()
+        feeder.join()
+        raise
+    feeder.join()
+    errors = process.stderr.read().decode("utf-8", "replace")
+    if process.wait() != 0:
+        raise Exception(f"ffmpeg failed to transcode {key}: {errors.strip()[-500:]}")
+    return {"originalBytes": s3_obj["ContentLength"], "uploadBytes": output.bytes}
+
+
+def prepare_audio(bucket, key, output_prefix):
+    """
+    Compressed copy of an audio object to send for transcription, written under output_prefix
+
+    Returns:
+        tuple: S3 URI of the audio to send, and the transcoding stats (None when sent unchanged)
+    """
+    if AUDIO_UPLOAD_FORMAT not in FORMATS or not ffmpeg_available():
+        return f"s3://{bucket}/{key}", None
+    _, _, extension, _ = FORMATS[AUDIO_UPLOAD_FORMAT]
+    stem = os.path.splitext(os.path.basename(key))[0]
+    target_key = f"{output_prefix}/{stem}.{AUDIO_SAMPLE_RATE // 1000}k.{extension}"
+    try:
+        stats = transcode(bucket, key, target_key, AUDIO_UPLOAD_FORMAT)
+    except Exception as err:
+        print(f"Transcoding failed, sending the original audio: {err}")
+        return f"s3://{bucket}/{key}", None
+    stats["format"] = AUDIO_UPLOAD_FORMAT
+    print(f"Transcoded {key} to {AUDIO_UPLOAD_FORMAT}: {stats['originalBytes']} -> {stats['uploadBytes']} bytes")
+    return f"s3://{bucket}/{target_key}", stats
+
+
+def combine_stats(stats):
+    """
+    Total sizes and original-to-compressed ratio over the transcoded files of a job
+
+    Returns:
+        dict: Upload stats, or None if nothing was transcoded
+    """
+    stats = [item for item in stats if item]
+    if not stats:
+        return None
+    original = sum(item["originalBytes"] for item in stats)
+    upload = sum(item["uploadBytes"] for item in stats)
+    return {
+        "format": stats[0]["format"],
+        "files": len(stats),
+        "originalBytes": original,
+        "uploadBytes": upload,
+        "ratio": round(original / upload, 2) if upload else 0,
+    }
@@ -0,0 +1,245 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+import post_processor
+import reanalyze
+import summarize
+
+print("Loading Backfill Fn...")
+s3_client = boto3.client("s3")
+lambda_client = boto3.client("lambda")
+tableName = os.environ["UploadsTable"]
+table = boto3.resource("dynamodb").Table(tableName)
+
+CHECKPOINT_BUCKET = os.environ["BACKFILL_BUCKET"]
+CHECKPOINT_PREFIX = "backfill/"
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+# Upper bound on conversations started per minute, 0 disables pacing
+BACKFILL_MAX_PER_MINUTE = int(os.getenv("BACKFILL_MAX_PER_MINUTE", "0"))
+CONTINUATION_MARGIN_MS = int(os.getenv("CONTINUATION_MARGIN_MS", "180000"))
+
+STAGE_POST_PROCESSING = "post_processing"
+STAGE_ANALYSIS = "analysis"
+# Analysis patches the output JSON that post-processing rewrites, so it runs second
+STAGE_ORDER = [STAGE_POST_PROCESSING, STAGE_ANALYSIS]
+
+# Artifact names every workflow execution uses (check_input_file_type, combine_transcription_files and
+# detect_*_job_status)
+GROUPS_FILE = "groups"
+AUDIO_TRANSCRIPTION_FILE = "original_transcription.txt"
+SENTIMENT_OUTPUT_FILE = "llama-api-sentiment-output"
+ENTITIES_OUTPUT_FILE = "llama-api-entities-output"
+
+# post_processor stages its outputs under fixed /tmp names, so only one conversation runs it at a time
+post_processing_lock = threading.Lock()
+
+
+def checkpoint_key(job_id):
+    return f"{CHECKPOINT_PREFIX}{job_id}.json"
+
+
+def save_checkpoint(job):
+    s3_client.put_object(
+        Bucket=CHECKPOINT_BUCKET,
+        Key=checkpoint_key(job["job_id"]),
+        Body=json.dumps(job).encode("utf-8"),
+    )
+
+
+def load_checkpoint(job_id):
+    s3_obj = s3_client.get_object(Bucket=CHECKPOINT_BUCKET, Key=checkpoint_key(job_id))
+    return json.loads(s3_obj["Body"].read().decode("utf-8"))
+
+
+def find_checkpoint(job_id):
+    try:
+        return load_checkpoint(job_id)
+    except ClientError as err:
+        if err.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return None
+
+
+def list_object_keys(prefix):
+    """
+    Processed conversations whose objectKey starts with prefix, read from the uploads table
+    """
+    scan_kwargs = {
+        "FilterExpression": Attr("objectKey").begins_with(prefix) & Attr("executionCompletedAt").exists(),
+        "ProjectionExpression": "objectKey",
+    }
+    keys = []
+    while True:
+        page = table.scan(**scan_kwargs)
+        keys.extend(item["objectKey"] for item in page["Items"])
+        if "LastEvaluatedKey" not in page:
+            return sorted(keys)
+        scan_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def new_job(event, job_id):
+    stages = [stage for stage in STAGE_ORDER if stage in event.get("stages", [STAGE_ANALYSIS])]
+    if not stages:
+        raise ValueError(f"stages must be a subset of {STAGE_ORDER}")
+    if "object_keys" in event:
+        pending = list(event["object_keys"])
+    else:
+        pending = list_object_keys(event.get("prefix", "input/"))
+    return {
+        "job_id": job_id,
+        "stages": stages,
+        "force": bool(event.get("force", False)),
+        "workers": int(event.get("workers", BACKFILL_WORKERS)),
+        "max_per_minute": int(event.get("max_per_minute", BACKFILL_MAX_PER_MINUTE)),
+        "total": len(pending),
+        "pending": pending,
+        "counts": {"updated": 0, "skipped": 0, "failed": 0},
+        "failed_keys": [],
+        "elapsed_seconds": 0.0,
+        "status": "RUNNING",
+    }
+
+
+def post_processing_event(item):
+    """
+    Rebuild the post-processing input of a conversation from what its processing stored: artifact
+    names from its output location, and analysis fields, language and pipeline statistics from its
+    output JSON, which re-analysis keeps current. Execution history is not used, since Step Functions
+    deletes it 90 days after an execution ends.
+    """
+    conversation, _ = reanalyze.read_output(item["bucketName"], item["outputFile"])
+    analytics = conversation["ConversationAnalytics"]
+    summary = analytics["Summary"]
+    output_key, output_name = item["outputFile"].rsplit("/", 1)
+    input_file = output_name[:-len(".json")]
+    # Only audio conversations have speaker timings
+    audio = "SpeakerTime" in analytics
+    event = {
+        "bucket": item["bucketName"],
+        "key": item["objectKey"],
+        "content_type": item["contentType"] if audio else "text/plain",
+        "output_s3_key": output_key,
+        "input_file": input_file,
+        "groups": GROUPS_FILE,
+        "diarization_file": f"{input_file}.diarization.txt",
+        "original_transcription_file": AUDIO_TRANSCRIPTION_FILE if audio else f"{input_file}.original.txt",
+        "sentiment_job_output_file": SENTIMENT_OUTPUT_FILE,
+        "entities_job_output_file": ENTITIES_OUTPUT_FILE,
+        "dominant_language_code": analytics["LanguageCode"],
+        "dominant_language": analytics["Language"],
+        "PrecomputedAnswers": summary.get("PrecomputedAnswers", {}),
+        "PromptVersions": summary.get("PromptVersions", {}),
+    }
+    for field, (summary_key, attribute) in reanalyze.OUTPUT_FIELDS.items():
+        event[field] = summary.get(summary_key, item.get(attribute, ""))
+    for name, output_name in (("TranscriptTokens", "TranscriptTokens"), ("audio_upload", "AudioUpload"),
+                              ("silence_trim", "SilenceTrim")):
+        if output_name in analytics:
+            event[name] = analytics[output_name]
+    return event
+
+
+def run_post_processing(item):
+    """
+    Re-run post-processing from the conversation's stored outputs
+    """
+    event = post_processing_event(item)
+    with post_processing_lock:
+        post_processor.handler({"event": event}, None)
+
+
+def process_conversation(object_key, job):
+    item = table.get_item(Key={"objectKey": object_key}, ConsistentRead=True).get("Item")
+    if item is None or "outputFile" not in item:
+        raise Exception(f"{object_key} has not been processed yet")
+    status = "skipped"
+    if STAGE_POST_PROCESSING in job["stages"]:
+        run_post_processing(item)
+        status = "updated"
+    if STAGE_ANALYSIS in job["stages"]:
+        if reanalyze.reanalyze_conversation(item, summarize.ANALYSIS_FIELDS, job["force"]) == "updated":
+            status = "updated"
+    return status
+
+
+def report_progress(job):
+    done = job["total"] - len(job["pending"])
+    throughput = done / job["elapsed_seconds"] * 60 if job["elapsed_seconds"] else 0.0
+    eta_minutes = len(job["pending"]) / throughput if throughput else None
+    job["throughput_per_minute"] = round(throughput, 2)
+    job["eta_minutes"] = round(eta_minutes, 1) if eta_minutes is not None else None
+    print(
+        f"Backfill {job['job_id']}: {done}/{job['total']} done, {job['counts']}, "
+        f"{job['throughput_per_minute']}/min, ETA {job['eta_minutes']} min"
+    )
+
+
+def handler(event, context):
+    """
+    Re-run pipeline stages over stored conversations.
+
+    Start a job with {"prefix": "input/"} or {"object_keys": [...]}, plus optional "stages"
+    ("analysis", "post_processing"), "workers", "max_per_minute", "force" and "job_id".
+    Resume an interrupted job with {"job_id": ...}; progress is checkpointed to S3 after every batch.
+    A job started without a job_id is named after the invocation's request id, so a retry of the
+    same asynchronous invocation resumes it instead of starting the work over.
+    """
+    if "job_id" in event and "prefix" not in event and "object_keys" not in event:
+        job = load_checkpoint(event["job_id"])
+        print(f"Resuming backfill {job['job_id']} with {len(job['pending'])} conversations left")
+    else:
+        job_id = event.get("job_id") or context.aws_request_id
+        job = find_checkpoint(job_id)
+        if job is None:
+            job = new_job(event, job_id)
+            print(f"Starting backfill {job['job_id']} over {job['total']} conversations, stages {job['stages']}")
+        else:
+            print(f"Backfill {job_id} already started, resuming with {len(job['pending'])} conversations left")
+    save_checkpoint(job)
+
+    batch_size = max(1, job["workers"])
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        while job["pending"]:
+            batch_started = time.time()
+            batch = job["pending"][:batch_size]
+            futures = {key: executor.submit(process_conversation, key, job) for key in batch}
+            for object_key, future in futures.items():
+                try:
+                    job["counts"][future.result()] += 1
+                except Exception as err:
+                    print(f"Backfill failed for {object_key}: {err}")
+                    job["counts"]["failed"] += 1
+                    job["failed_keys"].append(object_key)
+
+            if job["max_per_minute"]:
+                min_batch_seconds = len(batch) * 60.0 / job["max_per_minute"]
+                time.sleep(max(0.0, min_batch_seconds - (time.time() - batch_started)))
+
+            job["pending"] = job["pending"][len(batch):]
+            job["elapsed_seconds"] += time.time() - batch_started
+            report_progress(job)
+            save_checkpoint(job)
+
+            if job["pending"] and context.get_remaining_time_in_millis() < CONTINUATION_MARGIN_MS:
+                lambda_client.invoke(
+                    FunctionName=context.function_name,
+                    InvocationType="Event",
+                    Payload=json.dumps({"job_id": job["job_id"]}),
+                )
+                print(f"Continuing backfill {job['job_id']} in a new invocation")
+                return {"job_id": job["job_id"], "status": "CONTINUED", "counts": job["counts"]}
+
+    job["status"] = "SUCCEEDED"
+    save_checkpoint(job)
+    print(f"Backfill {job['job_id']} completed: {job['counts']}")
+    return {"job_id": job["job_id"], "status": job["status"], "counts": job["counts"]}
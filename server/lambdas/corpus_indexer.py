@@ -0,0 +1,60 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+from corpus_index import CorpusIndex
+
+print("Loading Corpus Indexer Fn...")
+s3_client = boto3.client("s3")
+corpus_index = CorpusIndex()
+deserializer = TypeDeserializer()
+
+# Uploads table attributes that change what the corpus index holds for a conversation
+INDEXED_ATTRIBUTES = ["segmentIndexFile", "executionCompletedAt", "summary", "topic", "product"]
+
+
+def deserialize(image):
+    return {name: deserializer.deserialize(value) for name, value in image.items()}
+
+
+def needs_indexing(old, new):
+    if "segmentIndexFile" not in new:
+        return False
+    return any(old.get(name) != new.get(name) for name in INDEXED_ATTRIBUTES)
+
+
+def index_item(item):
+    s3_obj = s3_client.get_object(Bucket=item["bucketName"], Key=item["segmentIndexFile"])
+    segments = json.loads(s3_obj["Body"].read().decode("utf-8"))["segments"]
+    corpus_index.index_conversation(item["objectKey"], segments, {
+        "summary": item.get("summary", ""),
+        "topic": item.get("topic", ""),
+        "product": item.get("product", ""),
+        "completedAt": item.get("executionCompletedAt", ""),
+    })
+
+
+def handler(event, context):
+    """
+    Keep the corpus index in step with the uploads table: triggered by its stream, re-indexes a
+    conversation whenever post-processing or re-analysis changes its segments or summary fields
+    """
+    failures = []
+    for record in event["Records"]:
+        if record["eventName"] == "REMOVE":
+            continue
+        new = deserialize(record["dynamodb"].get("NewImage", {}))
+        old = deserialize(record["dynamodb"].get("OldImage", {}))
+        if not needs_indexing(old, new):
+            continue
+        try:
+            index_item(new)
+        except Exception as err:
+            print(f"Corpus indexing failed for {new.get('objectKey')}: {err}")
+            failures.append({"itemIdentifier": record["dynamodb"]["SequenceNumber"]})
+    # Only the failed records are retried (ReportBatchItemFailures)
+    return {"batchItemFailures": failures}
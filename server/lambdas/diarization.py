@@ -4,57 +4,143 @@
 import os
 import boto3
 import json
+import audio_transcoder
+import job_context
+import silence_trimmer
+import windowed_transcription
 from lemonfox_client import LemonfoxClient
+from lemonfox_jobs import LEMONFOX_JOBS_TABLE, LemonfoxJobs
 
 print("Loading Diarization Function...")
 s3_client = boto3.client("s3")
 lemonfox_client = LemonfoxClient()
+lemonfox_jobs = LemonfoxJobs() if LEMONFOX_JOBS_TABLE else None
+
+
+def audio_key(event):
+    # For MP3 files, use the original file path
+    # For WAV files, use the converted WAV file path
+    if event.get("content_type", "") in ['mp3', 'audio/mp3']:
+        return event["key"]
+    return f"{event['output_s3_key']}/{event['audio_wav_file']}"
+
+
+def trim_silence(event):
+    """
+    Cut long non-speech spans out of WAV audio before upload. The silence map is kept as an artifact
+    so the result's timestamps can be moved back onto the original audio.
+
+    Returns:
+        str: Key of the audio to send
+    """
+    key = audio_key(event)
+    if event.get("content_type", "") in ['mp3', 'audio/mp3']:
+        return key
+    trimmed = silence_trimmer.trim_silence(event["bucket"], key, event["output_s3_key"])
+    if trimmed is None:
+        return key
+    trimmed_key, silence_map = trimmed
+    job_context.put_artifact(event, "silence_map", silence_map)
+    event["silence_trim"] = silence_trimmer.summary(silence_map)
+    return trimmed_key
+
+
+def prepare_upload(event, uploads, key):
+    """
+    Compress the audio for upload and return the location to send
+    """
+    audio_url, stats = audio_transcoder.prepare_audio(event["bucket"], key, event["output_s3_key"])
+    uploads.append(stats)
+    return audio_url
+
+
+def record_uploads(event, uploads):
+    audio_upload = audio_transcoder.combine_stats(uploads)
+    if audio_upload is not None:
+        event["audio_upload"] = audio_upload
+        print(f"Audio upload: {audio_upload}")
+
+
+def complete_diarization(event, result):
+    """
+    Write the diarization file for a Lemonfox result and record the outputs in the event
+    """
+    s3_bucket = event["bucket"]
+    output_key = event["output_s3_key"]
+
+    # Timestamps of audio sent with its silences removed refer to the trimmed audio
+    silence_map = job_context.get_artifact(event, "silence_map")
+    if silence_map:
+        result = silence_trimmer.restore_timestamps(result, silence_map)
+
+    # Process the result to extract diarization data
+    diarization_data = lemonfox_client.process_lemonfox_result(result)
+    
+    # Save diarization data to S3
+    diarization_file_suffix = "diarization.txt"
+    diarization_file_path = f"/tmp/{diarization_file_suffix}"
+    
+    with open(diarization_file_path, "w") as f:
+        f.write(diarization_data)
+    
+    diarization_s3_key = f"{output_key}/{diarization_file_suffix}"
+    s3_client.upload_file(diarization_file_path, s3_bucket, diarization_s3_key)
+    
+    # Update event with diarization output path
+    event["diarization_out_path"] = f"s3://{s3_bucket}/{diarization_s3_key}"
+    # Store full result for transcription step; the event only carries its S3 reference
+    job_context.put_artifact(event, "lemonfox_result", result)
+    event["diarization_file"] = diarization_file_suffix
+    
+    print(f"✅ Diarization completed for {event['key']}")
+    print(f"Diarization output: s3://{s3_bucket}/{diarization_s3_key}")
+    return event
+
+
+def submit(e):
+    """
+    Asynchronous mode: submit the job with a callback URL and return at once. The workflow stays
+    paused on its task token until lemonfox_callback resumes it.
+    """
+    event = e["event"]
+    uploads = []
+    audio_url = prepare_upload(event, uploads, trim_silence(event))
+    record_uploads(event, uploads)
+    callback_url = lemonfox_jobs.register(e["task_token"], event)
+    lemonfox_client.submit_transcription(audio_url, callback_url)
+    print(f"Submitted Lemonfox job for {audio_url}")
+    return {"event": event, "status": "SUBMITTED"}
 
 
 def handler(e, context):
+    if "task_token" in e:
+        return submit(e)
+
     event = e["event"]
     s3_bucket = event["bucket"]
     key = event["key"]
-    output_key = event["output_s3_key"]
     content_type = event.get("content_type", "")
     
     try:
-        # For MP3 files, use the original file path
-        # For WAV files, use the converted WAV file path
-        if content_type in ['mp3', 'audio/mp3']:
-            audio_url = f"s3://{s3_bucket}/{key}"
-        else:
-            wav_file = event["audio_wav_file"]
-            audio_url = f"s3://{s3_bucket}/{output_key}/{wav_file}"
-        
-        print(f"Starting Lemonfox API call for diarization of {audio_url}")
+        print(f"Starting Lemonfox API call for diarization of s3://{s3_bucket}/{audio_key(event)}")
         print(f"Content type: {content_type}")
         
-        # Call Lemonfox API for transcription with diarization
-        result = lemonfox_client.transcribe_with_diarization(audio_url)
-        
-        # Process the result to extract diarization data
-        diarization_data = lemonfox_client.process_lemonfox_result(result)
+        speech_key = trim_silence(event)
         
-        # Save diarization data to S3
-        diarization_file_suffix = "diarization.txt"
-        diarization_file_path = f"/tmp/{diarization_file_suffix}"
+        # Long WAV recordings are transcribed as concurrent overlapping windows
+        uploads = []
+        result = None
+        if content_type not in ['mp3', 'audio/mp3']:
+            result = windowed_transcription.transcribe_long_audio(
+                lemonfox_client, s3_bucket, speech_key, event["output_s3_key"], uploads
+            )
         
-        with open(diarization_file_path, "w") as f:
-            f.write(diarization_data)
-        
-        diarization_s3_key = f"{output_key}/{diarization_file_suffix}"
-        s3_client.upload_file(diarization_file_path, s3_bucket, diarization_s3_key)
-        
-        # Update event with diarization output path
-        event["diarization_out_path"] = f"s3://{s3_bucket}/{diarization_s3_key}"
-        event["lemonfox_result"] = result  # Store full result for transcription step
-        event["diarization_file"] = diarization_file_suffix
-        
-        print(f"✅ Diarization completed for {key}")
-        print(f"Diarization output: s3://{s3_bucket}/{diarization_s3_key}")
+        # Call Lemonfox API for transcription with diarization
+        if result is None:
+            result = lemonfox_client.transcribe_with_diarization(prepare_upload(event, uploads, speech_key))
+        record_uploads(event, uploads)
         
-        return {"event": event, "status": "SUCCEEDED"}
+        return {"event": complete_diarization(event, result), "status": "SUCCEEDED"}
         
     except Exception as e:
         print(f"❌ Error in diarization: {str(e)}")
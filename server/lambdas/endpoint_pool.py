@@ -0,0 +1,126 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import threading
+from collections import deque
+
+from adaptive_policy import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError
+
+# Weight of the newest response time in each endpoint's moving average
+EWMA_ALPHA = float(os.getenv("ENDPOINT_EWMA_ALPHA", "0.3"))
+# Hedge after this percentile of recent response times, or after HEDGE_DEFAULT_DELAY
+# until HEDGE_MIN_SAMPLES responses have been seen
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "10"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible server with its own health state
+    """
+
+    def __init__(self, name, url):
+        self.url = url
+        self.ewma = None
+        self.in_flight = 0
+        self.concurrency = AdaptiveConcurrencyLimiter()
+        self.breaker = CircuitBreaker(name)
+
+    def score(self):
+        # An idle endpoint without measurements is tried first so every replica gets sampled,
+        # but it is not sent more work until its first response arrives
+        if self.ewma is None:
+            return 0.0 if self.in_flight == 0 else float("inf")
+        return self.ewma * (self.in_flight + 1)
+
+
+class EndpointPool:
+    """
+    Routes each request to the endpoint with the lowest expected latency: the moving average
+    of its response times scaled by the requests it already has in flight
+    """
+
+    def __init__(self, name, urls):
+        self.name = name
+        self.endpoints = [Endpoint(f"{name}[{i}]", url) for i, url in enumerate(urls)]
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """
+        Reserve the best endpoint whose circuit allows a request
+
+        Raises:
+            CircuitOpenError: When every candidate endpoint is unavailable
+        """
+        with self.lock:
+            candidates = sorted(
+                (endpoint for endpoint in self.endpoints if endpoint not in exclude),
+                key=Endpoint.score,
+            )
+        for endpoint in candidates:
+            try:
+                endpoint.breaker.before_request()
+            except CircuitOpenError:
+                continue
+            with self.lock:
+                endpoint.in_flight += 1
+            return endpoint
+        raise CircuitOpenError(f"No {self.name} endpoint available")
+
+    def release(self, endpoint, latency, ok):
+        """
+        Record the outcome of a request. Failures count as at least twice the current average
+        so traffic moves away from a struggling endpoint before its circuit opens.
+        """
+        with self.lock:
+            endpoint.in_flight -= 1
+            if ok:
+                self.latencies.append(latency)
+            elif endpoint.ewma is not None:
+                latency = max(latency, endpoint.ewma * 2)
+            if endpoint.ewma is None:
+                endpoint.ewma = latency
+            else:
+                endpoint.ewma = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * endpoint.ewma
+        if ok:
+            endpoint.breaker.record_success()
+        else:
+            endpoint.breaker.record_failure()
+
+    def hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_DELAY
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE / 100))
+        return ordered[index]
+
+    def stats(self):
+        with self.lock:
+            return [
+                {
+                    "url": endpoint.url,
+                    "ewma": round(endpoint.ewma, 3) if endpoint.ewma is not None else None,
+                    "in_flight": endpoint.in_flight,
+                    "limit": round(endpoint.concurrency.limit, 2),
+                    "circuit": endpoint.breaker.state,
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+def get_pool(name, urls):
+    """
+    Endpoint pool shared by every client in the container
+    """
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = EndpointPool(name, urls)
+        return _pools[name]
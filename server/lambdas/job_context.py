@@ -0,0 +1,60 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import urllib.parse
+
+import boto3
+
+s3_client = boto3.client("s3")
+
+# Large intermediate results (e.g. the Lemonfox verbose_json response) are written once under
+# <output_s3_key>/artifacts/ and the Step Functions event only carries their S3 URIs in
+# event["artifacts"], keeping it far below the 256 KB state payload limit
+ARTIFACTS_PREFIX = "artifacts"
+
+
+def artifact_key(output_key, name):
+    return f"{output_key}/{ARTIFACTS_PREFIX}/{name}.json"
+
+
+def put_artifact(event, name, value):
+    """
+    Store a JSON-serialisable artifact of the job and record its reference in the event
+
+    Returns:
+        str: S3 URI of the artifact
+    """
+    s3_bucket = event["bucket"]
+    key = artifact_key(event["output_s3_key"], name)
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=key,
+        Body=json.dumps(value, ensure_ascii=False).encode("utf-8"),
+        ContentType="application/json",
+    )
+    uri = f"s3://{s3_bucket}/{key}"
+    event.setdefault("artifacts", {})[name] = uri
+    # Executions started before artifacts existed may still carry the value inline
+    event.pop(name, None)
+    return uri
+
+
+def load_artifact(uri):
+    location = urllib.parse.urlparse(uri)
+    s3_obj = s3_client.get_object(Bucket=location.netloc, Key=location.path[1:])
+    return json.loads(s3_obj["Body"].read().decode("utf-8"))
+
+
+def has_artifact(event, name):
+    return name in event.get("artifacts", {}) or name in event
+
+
+def get_artifact(event, name, default=None):
+    """
+    Fetch an artifact referenced by the event, falling back to an inline value
+    """
+    uri = event.get("artifacts", {}).get(name)
+    if uri is None:
+        return event.get(name, default)
+    return load_artifact(uri)
@@ -0,0 +1,52 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import base64
+import json
+
+import boto3
+
+import diarization
+from lemonfox_jobs import LemonfoxJobs
+
+print("Loading Lemonfox Callback Fn...")
+sfn_client = boto3.client("stepfunctions")
+lemonfox_jobs = LemonfoxJobs()
+
+
+def read_body(event):
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    return json.loads(body) if body else {}
+
+
+def handler(event, context):
+    """
+    Function URL receiving finished asynchronous Lemonfox jobs: writes the diarization outputs and
+    resumes the paused workflow with the job's task token
+    """
+    params = event.get("queryStringParameters") or {}
+    job = lemonfox_jobs.claim(params.get("job", ""), params.get("secret", ""))
+    if job is None:
+        print(f"Ignoring callback for unknown or completed job {params.get('job')}")
+        return {"statusCode": 404}
+
+    job_event = job["event"]
+    try:
+        result = read_body(event)
+        if "segments" not in result and "text" not in result:
+            raise Exception(f"Lemonfox job failed: {json.dumps(result)[:500]}")
+        diarization.complete_diarization(job_event, result)
+        sfn_client.send_task_success(
+            taskToken=job["taskToken"],
+            output=json.dumps({"event": job_event, "status": "SUCCEEDED"}),
+        )
+    except Exception as err:
+        print(f"❌ Lemonfox job {params.get('job')} for {job_event['key']} failed: {err}")
+        sfn_client.send_task_failure(
+            taskToken=job["taskToken"],
+            error="LemonfoxJobFailed",
+            cause=str(err)[:256],
+        )
+    return {"statusCode": 200}
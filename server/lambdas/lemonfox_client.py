@@ -4,7 +4,55 @@
 import requests
 import time
 import os
+import uuid
+import urllib.parse
+import boto3
 import cfg
+import http_transport
+import rate_limiter
+
+# How an s3:// audio location reaches Lemonfox: "presigned" sends a time-limited GET URL for Lemonfox to
+# download, "stream" pipes the S3 object body into the multipart upload without buffering it in /tmp
+LEMONFOX_AUDIO_MODE = os.getenv("LEMONFOX_AUDIO_MODE", cfg.LEMONFOX_AUDIO_MODE)
+LEMONFOX_PRESIGNED_URL_EXPIRY = int(os.getenv("LEMONFOX_PRESIGNED_URL_EXPIRY", str(cfg.LEMONFOX_PRESIGNED_URL_EXPIRY)))
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartStream:
+    """
+    multipart/form-data request body whose file part is read from an S3 object while it is sent.
+    The total length is known up front, so requests sends a Content-Length header and only one
+    chunk of the audio is held in memory at a time.
+    """
+    
+    def __init__(self, fields, filename, body, content_length, content_type):
+        self.boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            if isinstance(value, bool):
+                value = str(value).lower()
+            parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        )
+        self.head = "".join(parts).encode("utf-8")
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.body = body
+        self.content_length = content_length
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+    
+    def __len__(self):
+        return len(self.head) + self.content_length + len(self.tail)
+    
+    def __iter__(self):
+        yield self.head
+        for chunk in self.body.iter_chunks(STREAM_CHUNK_SIZE):
+            yield chunk
+        yield self.tail
+
 
 class LemonfoxClient:
     """
@@ -13,12 +61,46 @@ class LemonfoxClient:
     
     def __init__(self):
         self.api_key = cfg.LEMONFOX_API_KEY
-        self.base_url = cfg.LEMONFOX_BASE_URL
+        # Overridable to point at a stand-in server (tools/standin_server.py)
+        self.base_url = os.getenv("LEMONFOX_BASE_URL", cfg.LEMONFOX_BASE_URL)
         self.timeout = cfg.LEMONFOX_TIMEOUT
         self.max_retries = cfg.LEMONFOX_MAX_RETRIES
         self.min_speakers = cfg.LEMONFOX_MIN_SPEAKERS
         self.max_speakers = cfg.LEMONFOX_MAX_SPEAKERS
         self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.session = http_transport.get_session("lemonfox")
+        self.limiter = rate_limiter.get_limiter("lemonfox")
+        self.audio_mode = LEMONFOX_AUDIO_MODE
+        self.s3_client = boto3.client("s3")
+    
+    def _request_body(self, data):
+        """
+        Request arguments for form data whose "file" field is an audio location. Lemonfox cannot read
+        private s3:// URIs, so those are replaced by a presigned URL or streamed as a multipart upload.
+        Called once per attempt, as a streamed body can only be sent once.
+        """
+        audio_url = data["file"]
+        if not audio_url.startswith("s3://"):
+            return {"headers": self.headers, "data": data}
+        location = urllib.parse.urlparse(audio_url)
+        bucket, key = location.netloc, location.path[1:]
+        if self.audio_mode == "stream":
+            s3_obj = self.s3_client.get_object(Bucket=bucket, Key=key)
+            stream = MultipartStream(
+                {name: value for name, value in data.items() if name != "file"},
+                os.path.basename(key),
+                s3_obj["Body"],
+                s3_obj["ContentLength"],
+                s3_obj.get("ContentType") or "application/octet-stream",
+            )
+            print(f"Streaming {s3_obj['ContentLength']} bytes of {audio_url} to Lemonfox")
+            return {"headers": {**self.headers, "Content-Type": stream.content_type}, "data": stream}
+        presigned_url = self.s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=LEMONFOX_PRESIGNED_URL_EXPIRY,
+        )
+        return {"headers": self.headers, "data": {**data, "file": presigned_url}}
     
     def transcribe_with_diarization(self, audio_url, language="english"):
         """
@@ -48,11 +130,12 @@ class LemonfoxClient:
         
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(
-                    url, 
-                    headers=self.headers, 
-                    data=data, 
-                    timeout=self.timeout
+                self._acquire()
+                response = http_transport.post(
+                    self.session,
+                    url,
+                    timeout=self.timeout,
+                    **self._request_body(data)
                 )
                 response.raise_for_status()
                 
@@ -74,6 +157,57 @@ class LemonfoxClient:
         
         raise Exception(f"❌ Failed to get response from Lemonfox API after {self.max_retries} attempts.")
     
+    def submit_transcription(self, audio_url, callback_url, language="english", translate=False):
+        """
+        Submit a transcription with speaker diarization that Lemonfox delivers to callback_url
+        when it finishes, instead of holding the connection open for the whole job
+        
+        Args:
+            audio_url (str): URL or S3 path to the audio file
+            callback_url (str): URL that receives the verbose_json result as a POST body
+            language (str): Language of the audio (default: "english")
+            translate (bool): Also translate the transcript to English
+            
+        Returns:
+            dict: Lemonfox API acknowledgement
+        """
+        url = f"{self.base_url}/audio/transcriptions"
+        
+        data = {
+            "file": audio_url,
+            "response_format": "verbose_json",
+            "speaker_labels": True,
+            "min_speakers": self.min_speakers,
+            "max_speakers": self.max_speakers,
+            "language": language,
+            "callback_url": callback_url
+        }
+        if translate:
+            data["translate"] = True
+        
+        print(f"Submitting Lemonfox transcription job for {audio_url}")
+        
+        for attempt in range(self.max_retries):
+            try:
+                self._acquire()
+                response = http_transport.post(
+                    self.session,
+                    url,
+                    timeout=cfg.LEMONFOX_SUBMIT_TIMEOUT,
+                    **self._request_body(data)
+                )
+                response.raise_for_status()
+                print(f"✅ Lemonfox job submitted on attempt {attempt + 1}")
+                return response.json() if response.content else {}
+                
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Attempt {attempt + 1}/{self.max_retries}: Lemonfox job submission failed: {e}")
+            
+            if attempt < self.max_retries - 1:
+                time.sleep(2 ** attempt)
+        
+        raise Exception(f"❌ Failed to submit Lemonfox job after {self.max_retries} attempts.")
+    
     def transcribe_only(self, audio_url, language="english"):
         """
         Transcribe audio without speaker diarization
@@ -99,7 +233,8 @@ class LemonfoxClient:
         print(f"Language: {language}")
         
         try:
-            response = requests.post(url, headers=self.headers, data=data, timeout=self.timeout)
+            self._acquire()
+            response = http_transport.post(self.session, url, timeout=self.timeout, **self._request_body(data))
             response.raise_for_status()
             
             result = response.json()
@@ -138,7 +273,8 @@ class LemonfoxClient:
         print(f"Source Language: {language}")
         
         try:
-            response = requests.post(url, headers=self.headers, data=data, timeout=self.timeout)
+            self._acquire()
+            response = http_transport.post(self.session, url, timeout=self.timeout, **self._request_body(data))
             response.raise_for_status()
             
             result = response.json()
@@ -149,6 +285,15 @@ class LemonfoxClient:
             print(f"❌ Lemonfox API request failed: {e}")
             raise Exception(f"Failed to translate and transcribe audio: {e}")
     
+    def _acquire(self):
+        """
+        Wait for a request token when a Lemonfox rate limit is configured
+        """
+        if self.limiter is not None:
+            waited = self.limiter.acquire()
+            if waited > 1:
+                print(f"⏳ Waited {waited:.1f}s for a Lemonfox rate limit token")
+    
     def process_lemonfox_result(self, result):
         """
         Process Lemonfox result to extract diarization data in expected format
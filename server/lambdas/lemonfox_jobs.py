@@ -0,0 +1,68 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import secrets
+import time
+import uuid
+from urllib.parse import urlencode
+
+import boto3
+from botocore.exceptions import ClientError
+
+LEMONFOX_JOBS_TABLE = os.getenv("LEMONFOX_JOBS_TABLE", "")
+LEMONFOX_CALLBACK_URL = os.getenv("LEMONFOX_CALLBACK_URL", "")
+# Jobs outlive the workflow's task timeout by a day before DynamoDB expires them
+LEMONFOX_JOB_TTL = int(os.getenv("LEMONFOX_JOB_TTL", str(5 * 24 * 3600)))
+
+
+class LemonfoxJobs:
+    """
+    Pending asynchronous Lemonfox jobs. Each job holds the Step Functions task token and event of the
+    paused workflow, and a random secret that the callback URL must present to resume it.
+    """
+
+    def __init__(self, table_name=None, callback_url=None):
+        self.table = boto3.resource("dynamodb").Table(table_name or LEMONFOX_JOBS_TABLE)
+        self.base_url = callback_url or LEMONFOX_CALLBACK_URL
+
+    def register(self, task_token, event):
+        """
+        Returns:
+            str: Callback URL that completes the job
+        """
+        job_id = str(uuid.uuid4())
+        secret = secrets.token_urlsafe(24)
+        self.table.put_item(Item={
+            "jobId": job_id,
+            "secret": secret,
+            "taskToken": task_token,
+            "event": json.dumps(event),
+            "submittedAt": int(time.time()),
+            "expiresAt": int(time.time()) + LEMONFOX_JOB_TTL,
+        })
+        return f"{self.base_url.rstrip('/')}/?{urlencode({'job': job_id, 'secret': secret})}"
+
+    def claim(self, job_id, secret):
+        """
+        Remove a job whose secret matches, so a repeated callback cannot resume the workflow twice
+
+        Returns:
+            dict: The job, or None if it is unknown, already claimed or the secret is wrong
+        """
+        try:
+            item = self.table.delete_item(
+                Key={"jobId": job_id},
+                ConditionExpression="secret = :secret",
+                ExpressionAttributeValues={":secret": secret},
+                ReturnValues="ALL_OLD",
+            ).get("Attributes")
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            raise
+        if item is None:
+            return None
+        item["event"] = json.loads(item["event"])
+        return item
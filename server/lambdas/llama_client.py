@@ -4,7 +4,48 @@
 import requests
 import json
 import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import http_transport
+import rate_limiter
+from adaptive_policy import CircuitOpenError, retry_after_seconds
+from endpoint_pool import get_pool
+from llm_cache import LLMResponseCache
+
+DEFAULT_ENDPOINT = "https://bkwg3037dnb7aq-8000.proxy.runpod.net/v1/chat/completions"
+
+
+class LlamaClientError(Exception):
+    """
+    Base error for failed Llama4Scout requests
+    """
+
+
+class LlamaTimeoutError(LlamaClientError):
+    pass
+
+
+class LlamaRequestError(LlamaClientError):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LlamaResponseError(LlamaClientError):
+    pass
+
+
+class LlamaUnavailableError(LlamaClientError):
+    """
+    Raised without calling an endpoint while every circuit breaker is open
+    or no rate limit token is available
+    """
+
+
+# Runs the primary and hedge copies of a request when hedging is enabled
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_WORKERS", "32")))
+
 
 class Llama4ScoutClient:
     """
@@ -13,12 +54,55 @@ class Llama4ScoutClient:
     """
     
     def __init__(self):
-        self.api_endpoint = "https://bkwg3037dnb7aq-8000.proxy.runpod.net/v1/chat/completions"
+        # Comma-separated pool of OpenAI-compatible chat completion URLs
+        self.api_endpoints = [
+            url.strip() for url in os.getenv("LLAMA_ENDPOINTS", DEFAULT_ENDPOINT).split(",") if url.strip()
+        ]
         self.model_name = "llama4scout"
         self.max_tokens = int(os.getenv("MAX_TOKENS", "1024"))
         self.temperature = float(os.getenv("TEMPERATURE", "0.1"))
         self.timeout = int(os.getenv("API_TIMEOUT", "30"))
         self.max_retries = int(os.getenv("MAX_RETRIES", "3"))
+        self.cache = LLMResponseCache() if os.getenv("LLM_CACHE_ENABLED", "true") == "true" else None
+        self.session = http_transport.get_session("llama")
+        self.limiter = rate_limiter.get_limiter("llama", self.model_name)
+        self.pool = get_pool("llama", self.api_endpoints)
+        # Send a duplicate to a second endpoint when the first is slower than the pool's p95
+        self.hedging = os.getenv("LLM_HEDGING", "false") == "true"
+        # Token counts reported by the server, including prompt tokens served from its prefix cache
+        self.usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self.usage_lock = threading.Lock()
+    
+    def _messages(self, prompt, parameters):
+        """
+        Chat messages for a prompt. A "context" parameter is sent as a leading system message
+        so requests that share it also share a prefix the server can cache.
+        """
+        messages = [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+        if parameters.get("context"):
+            messages.insert(0, {"role": "system", "content": parameters["context"]})
+        return messages
+
+    def _record_usage(self, result):
+        usage = result.get("usage") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        with self.usage_lock:
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            self.usage["cached_tokens"] += details.get("cached_tokens") or 0
+            self.usage["completion_tokens"] += usage.get("completion_tokens") or 0
+
+    def usage_since(self, snapshot):
+        """
+        Token usage accumulated since an earlier copy of self.usage
+        """
+        with self.usage_lock:
+            return {name: value - snapshot.get(name, 0) for name, value in self.usage.items()}
     
     def generate_response(self, prompt, parameters=None):
         """
@@ -26,73 +110,256 @@ class Llama4ScoutClient:
         
         Args:
             prompt (str): The input prompt
-            parameters (dict): Optional parameters like max_tokens, temperature
+            parameters (dict): Optional parameters like max_tokens, temperature,
+                timeout, max_retries, use_cache and context
             
         Returns:
             str: Generated response text
+            
+        Raises:
+            LlamaClientError: When no response could be generated
         """
         if parameters is None:
             parameters = {}
         
         payload = {
             "model": self.model_name,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            "messages": self._messages(prompt, parameters),
             "max_tokens": parameters.get("max_tokens", self.max_tokens),
             "temperature": parameters.get("temperature", self.temperature)
         }
         
+        cache_key = None
+        if self.cache is not None and parameters.get("use_cache", True):
+            cache_key = LLMResponseCache.make_key(
+                self.model_name, prompt, payload["temperature"], payload["max_tokens"], parameters.get("context")
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = self._post(
+            payload,
+            parameters.get("timeout", self.timeout),
+            parameters.get("max_retries", self.max_retries)
+        )
+        if cache_key is not None:
+            self.cache.put(cache_key, response)
+        return response
+
+    def _post(self, payload, timeout, max_retries):
+        """
+        Send a chat completion request with retries and return the generated text
+        """
         headers = {
             "Content-Type": "application/json"
         }
         
-        # Retry logic with exponential backoff
-        for attempt in range(self.max_retries):
+        # Retry logic with exponential backoff, or the server's Retry-After when given
+        for attempt in range(max_retries):
             try:
-                response = requests.post(
-                    self.api_endpoint,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-                
-                result = response.json()
-                
-                # Extract the generated text from response
-                if "choices" in result and len(result["choices"]) > 0:
-                    content = result["choices"][0]["message"]["content"]
-                    return content.strip()
-                else:
-                    print(f"No choices in API response: {result}")
-                    return "Error: No response generated"
-                    
-            except requests.exceptions.Timeout:
-                print(f"API request timeout (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                else:
-                    return "Error: API request timeout"
-                    
-            except requests.exceptions.RequestException as e:
-                print(f"API request failed (attempt {attempt + 1}/{self.max_retries}): {e}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                else:
-                    return f"Error: API request failed - {str(e)}"
+                if self.hedging:
+                    return self._hedged_request(headers, payload, timeout)
+                return self._request(self._reserve(), headers, payload, timeout)
                     
-            except (KeyError, IndexError, json.JSONDecodeError) as e:
-                print(f"Response parsing failed: {e}")
-                return f"Error: Invalid response format - {str(e)}"
+            except (LlamaTimeoutError, LlamaRequestError) as e:
+                retryable = getattr(e, "status_code", None) in (None, 429) or e.status_code >= 500
+                print(f"API request failed (attempt {attempt + 1}/{max_retries}): {e}")
+                if not retryable or attempt == max_retries - 1:
+                    raise
+                time.sleep(getattr(e, "retry_after", None) or 2 ** attempt)
                 
-        return "Error: All retry attempts failed"
+        raise LlamaClientError("All retry attempts failed")
+
+    def _hedged_request(self, headers, payload, timeout):
+        """
+        Send the request to the best endpoint and, if it has not answered within the pool's
+        hedge delay, send a duplicate to the next best one. The first answer wins; the slower
+        request is left to finish in the background so its latency still reaches the pool.
+        """
+        primary = self._reserve()
+        first = hedge_executor.submit(self._request, primary, headers, payload, timeout)
+        delay = self.pool.hedge_delay()
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+
+        # A hedge is only worth sending if it does not have to wait for a rate limit token
+        backup = self._reserve(exclude=(primary,), wait_for_token=False)
+        if backup is None:
+            return first.result()
+        print(f"Hedging Llama4Scout request to {backup.url} after {delay:.1f}s")
+        second = hedge_executor.submit(self._request, backup, headers, payload, timeout)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is None:
+            return winner.result()
+        return (second if winner is first else first).result()
+
+    def _reserve(self, exclude=(), wait_for_token=True):
+        """
+        Take a rate limit token and pick the endpoint for one request.
+        Without wait_for_token, returns None instead of waiting or failing.
+        """
+        if wait_for_token:
+            try:
+                self._acquire()
+            except rate_limiter.RateLimitTimeout as e:
+                raise LlamaUnavailableError(str(e)) from e
+        elif self.limiter is not None and self.limiter.try_acquire() != 0:
+            return None
+        try:
+            return self.pool.acquire(exclude)
+        except CircuitOpenError as e:
+            if not wait_for_token:
+                return None
+            raise LlamaUnavailableError(str(e)) from e
+
+    def _request(self, endpoint, headers, payload, timeout):
+        response = self._send(endpoint, headers, payload, timeout)
+        try:
+            result = response.json()
+            self._record_usage(result)
+            
+            # Extract the generated text from response
+            if "choices" in result and len(result["choices"]) > 0:
+                content = result["choices"][0]["message"]["content"]
+                return content.strip()
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"Response parsing failed: {e}")
+            raise LlamaResponseError(f"Invalid response format - {str(e)}") from e
+        print(f"No choices in API response: {result}")
+        raise LlamaResponseError("No response generated")
+
+    def _send(self, endpoint, headers, payload, timeout, stream=False):
+        """
+        Send one request to a reserved endpoint within its adaptive concurrency limit,
+        feeding the outcome back into the endpoint's latency average and circuit breaker.
+        A streamed response keeps its concurrency slot until the caller has read the body
+        and calls _release.
+        """
+        endpoint.concurrency.acquire()
+        started = time.time()
+        overloaded = True
+        held = False
+        try:
+            response = http_transport.post(
+                self.session,
+                endpoint.url,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                stream=stream
+            )
+            if response.status_code == 429 or response.status_code >= 500:
+                error = LlamaRequestError(f"HTTP {response.status_code} from {endpoint.url}", response.status_code)
+                error.retry_after = retry_after_seconds(response)
+                response.close()
+                raise error
+            overloaded = False
+            if response.status_code >= 400:
+                response.close()
+                raise LlamaRequestError(f"HTTP {response.status_code} from {endpoint.url}", response.status_code)
+            held = stream
+            return response
+        except requests.exceptions.Timeout as e:
+            raise LlamaTimeoutError(f"API request timeout from {endpoint.url}") from e
+        except requests.exceptions.RequestException as e:
+            raise LlamaRequestError(f"API request failed - {str(e)}") from e
+        finally:
+            if not held:
+                self._release(endpoint, time.time() - started, overloaded)
+
+    def _release(self, endpoint, latency, overloaded, ok=None):
+        endpoint.concurrency.release(latency, overloaded)
+        self.pool.release(endpoint, latency, not overloaded if ok is None else ok)
     
+    def generate_stream(self, prompt, parameters=None):
+        """
+        Generate response using Llama4Scout API, yielding text as it is produced.
+        Consumes the OpenAI-compatible server-sent events stream (stream=True).
+        
+        Args:
+            prompt (str): The input prompt
+            parameters (dict): Optional parameters like max_tokens, temperature,
+                timeout, use_cache and context
+            
+        Yields:
+            str: Generated text fragments
+        """
+        if parameters is None:
+            parameters = {}
+        
+        payload = {
+            "model": self.model_name,
+            "messages": self._messages(prompt, parameters),
+            "max_tokens": parameters.get("max_tokens", self.max_tokens),
+            "temperature": parameters.get("temperature", self.temperature),
+            "stream": True,
+            # The final event then carries token usage like a non-streamed response
+            "stream_options": {"include_usage": True}
+        }
+        
+        cache_key = None
+        if self.cache is not None and parameters.get("use_cache", True):
+            cache_key = LLMResponseCache.make_key(
+                self.model_name, prompt, payload["temperature"], payload["max_tokens"], parameters.get("context")
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        fragments = []
+        endpoint = self._reserve()
+        response = self._send(
+            endpoint,
+            {"Content-Type": "application/json", "Accept": "text/event-stream"},
+            payload,
+            parameters.get("timeout", self.timeout),
+            stream=True
+        )
+        # The endpoint is busy until the whole body has been generated, so the request only counts
+        # against its concurrency limit and latency once the stream is finished or abandoned
+        started = time.time() - response.timing["total"]
+        failed = False
+        try:
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get("usage"):
+                        self._record_usage(chunk)
+                    choices = chunk.get("choices", [])
+                    if not choices:
+                        continue
+                    fragment = choices[0].get("delta", {}).get("content")
+                    if fragment:
+                        fragments.append(fragment)
+                        yield fragment
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(endpoint, time.time() - started, False, ok=not failed)
+
+        if cache_key is not None and fragments:
+            self.cache.put(cache_key, "".join(fragments).strip())
+
+    def _acquire(self):
+        """
+        Wait for a request token when a rate limit is configured for the model
+        """
+        if self.limiter is not None:
+            waited = self.limiter.acquire()
+            if waited > 1:
+                print(f"Waited {waited:.1f}s for a Llama4Scout rate limit token")
+
     def test_connection(self):
         """
         Test the API connection with a simple request
@@ -101,5 +368,9 @@ class Llama4ScoutClient:
             bool: True if connection successful, False otherwise
         """
         test_prompt = "Hello, can you respond with just the word TEST?"
-        response = self.generate_response(test_prompt, {"max_tokens": 10})
+        try:
+            response = self.generate_response(test_prompt, {"max_tokens": 10, "use_cache": False})
+        except LlamaClientError as e:
+            print(f"Connection test failed: {e}")
+            return False
         return "TEST" in response.upper()
@@ -0,0 +1,89 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+    A per-container LRU tier sits in front of an optional DynamoDB tier whose items
+    expire through the table's TTL attribute.
+    """
+
+    def __init__(self, table_name=None, max_entries=None, ttl_seconds=None):
+        if table_name is None:
+            table_name = os.getenv("LLM_CACHE_TABLE", "")
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.table = boto3.resource("dynamodb").Table(table_name) if table_name else None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "durable_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(model, prompt, temperature, max_tokens, context=None):
+        """
+        Hash of everything that determines the generated text
+        """
+        fields = {"model": model, "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens}
+        # Only keyed when present, so entries written before context messages existed stay valid
+        if context is not None:
+            fields["context"] = context
+        material = json.dumps(fields, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+            self.entries.pop(key, None)
+
+        if self.table is not None:
+            try:
+                item = self.table.get_item(Key={"cacheKey": key}).get("Item")
+                # DynamoDB TTL deletion is lazy, so expired items can still be returned
+                if item is not None and int(item["expiresAt"]) > now:
+                    self._remember(key, item["response"], int(item["expiresAt"]))
+                    with self.lock:
+                        self.stats["durable_hits"] += 1
+                    return item["response"]
+            except Exception as e:
+                print(f"LLM cache lookup failed: {e}")
+
+        with self.lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, response):
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._remember(key, response, expires_at)
+        if self.table is not None:
+            try:
+                self.table.put_item(Item={"cacheKey": key, "response": response, "expiresAt": expires_at})
+            except Exception as e:
+                print(f"LLM cache write failed: {e}")
+
+    def _remember(self, key, response, expires_at):
+        with self.lock:
+            self.entries[key] = (response, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats)
+        print(f"LLM cache stats: {stats}")
+        return stats
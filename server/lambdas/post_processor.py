@@ -11,6 +11,7 @@ from decimal import Context
 import re
 import server_constants
 import pickle
+import segment_index
 
 import boto3
 
@@ -252,6 +253,24 @@ def handler(e, context):
     payload["customerSentiment"] = str(customer_sentiment).strip()
     conversation_analytics_json["Summary"]["CustomerSentiment"] = payload["customerSentiment"]
 
+    payload["precomputedAnswers"] = event.get("PrecomputedAnswers", {})
+    conversation_analytics_json["Summary"]["PrecomputedAnswers"] = payload["precomputedAnswers"]
+
+    payload["promptVersions"] = event.get("PromptVersions", {})
+    conversation_analytics_json["Summary"]["PromptVersions"] = payload["promptVersions"]
+
+    transcript_tokens = event.get("TranscriptTokens", {})
+    if transcript_tokens:
+        payload["transcriptTokensOriginal"] = transcript_tokens["Original"]
+        payload["transcriptTokensCompacted"] = transcript_tokens["Compacted"]
+        conversation_analytics_json["TranscriptTokens"] = transcript_tokens
+
+    if event.get("audio_upload"):
+        conversation_analytics_json["AudioUpload"] = event["audio_upload"]
+
+    if event.get("silence_trim"):
+        conversation_analytics_json["SilenceTrim"] = event["silence_trim"]
+
     payload["dominantLanguage"] = str(dominant_language).strip()
     conversation_analytics_json["Language"] = payload["dominantLanguage"]
 
@@ -327,10 +346,12 @@ def handler(e, context):
     output_file = f"{output_key}/{input_file}.json"
     sentiment_output_file = f"{output_key}/sentiment.json"
     entities_output_file = f"{output_key}/entities.json"
+    segment_index_file = f"{output_key}/segment_index.json"
     entities_local = "/tmp/entities.json"
     sentiment_local = "/tmp/sentiment.json"
 
     payload["outputFile"] = output_file
+    payload["segmentIndexFile"] = segment_index_file
     json_file_name = "/tmp/" + input_file + ".json"
 
     with open(sentiment_local, "w", encoding="utf-8") as f:
@@ -345,6 +366,13 @@ def handler(e, context):
         json.dump(transcript_json, f, ensure_ascii=False, indent=4, cls=DecimalEncoder)
     s3_client.upload_file(json_file_name, s3_bucket, output_file)
 
+    # Retrieval index used by /genai to send only the segments relevant to a question
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=segment_index_file,
+        Body=json.dumps(segment_index.build_index(transcript_speech_segments), ensure_ascii=False).encode("utf-8"),
+    )
+
     if "Item" in object_from_table:
         table.put_item(Item=payload)
         print(f"Updated values for {key} in DDB ")
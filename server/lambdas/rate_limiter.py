@@ -0,0 +1,135 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+
+import boto3
+
+# Requests per minute by bucket name ("<api>" or "<api>:<model>"), e.g. {"llama:llama4scout": 60}
+RATE_LIMITS = json.loads(os.getenv("RATE_LIMITS", "{}"))
+RATE_LIMIT_TABLE = os.getenv("RATE_LIMIT_TABLE", "")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "300"))
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when no token became available within the maximum wait
+    """
+
+
+class LocalTokenBucket:
+    """
+    In-memory token bucket for a single process, used for tests and local runs
+    """
+
+    def __init__(self, name, per_minute, max_wait=None):
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.max_wait = RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Take a token if one is available
+
+        Returns:
+            float: 0 on success, otherwise seconds until the next token
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Block until a token is available
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        started = time.time()
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return time.time() - started
+            if time.time() - started + wait > self.max_wait:
+                raise RateLimitTimeout(f"No {self.name} token within {self.max_wait}s")
+            time.sleep(wait)
+
+
+class DynamoDBTokenBucket(LocalTokenBucket):
+    """
+    Token bucket shared by every Lambda instance through one DynamoDB item per bucket.
+    Refill and consumption are applied with a conditional write on the last update time,
+    so concurrent callers never spend the same token twice.
+    """
+
+    def __init__(self, name, per_minute, table_name, max_wait=None):
+        super().__init__(name, per_minute, max_wait)
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.client = self.table.meta.client
+
+    def try_acquire(self):
+        while True:
+            item = self.table.get_item(Key={"bucket": self.name}, ConsistentRead=True).get("Item")
+            now_ms = int(time.time() * 1000)
+            if item is None:
+                tokens = self.capacity
+                conditions = {
+                    "ConditionExpression": "attribute_not_exists(#bucket)",
+                    "ExpressionAttributeNames": {"#bucket": "bucket"},
+                }
+            else:
+                # Every write must move updatedAt forward for the condition to detect races
+                now_ms = max(now_ms, int(item["updatedAt"]) + 1)
+                elapsed = (now_ms - int(item["updatedAt"])) / 1000.0
+                tokens = min(self.capacity, float(item["tokens"]) + elapsed * self.rate)
+                conditions = {
+                    "ConditionExpression": "updatedAt = :previous",
+                    "ExpressionAttributeValues": {":previous": item["updatedAt"]},
+                }
+
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            try:
+                self.table.put_item(
+                    Item={"bucket": self.name, "tokens": Decimal(str(round(tokens - 1, 6))), "updatedAt": now_ms},
+                    **conditions,
+                )
+                return 0.0
+            except self.client.exceptions.ConditionalCheckFailedException:
+                # Another instance took a token in between, re-read and try again
+                time.sleep(random.uniform(0, 0.05))
+
+
+def get_limiter(api, model=None):
+    """
+    Shared limiter for an API (and optionally a model), or None when no limit is configured.
+    Uses the DynamoDB bucket when RATE_LIMIT_TABLE is set and the in-memory one otherwise.
+    """
+    name = f"{api}:{model}" if model else api
+    per_minute = RATE_LIMITS.get(name, RATE_LIMITS.get(api))
+    if not per_minute:
+        return None
+    with _limiters_lock:
+        if name not in _limiters:
+            if RATE_LIMIT_TABLE:
+                _limiters[name] = DynamoDBTokenBucket(name, per_minute, RATE_LIMIT_TABLE)
+            else:
+                _limiters[name] = LocalTokenBucket(name, per_minute)
+        return _limiters[name]
@@ -0,0 +1,217 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+import summarize
+
+print("Loading Re-analysis Fn...")
+s3_client = boto3.client("s3")
+lambda_client = boto3.client("lambda")
+tableName = os.environ["UploadsTable"]
+table = boto3.resource("dynamodb").Table(tableName)
+
+REANALYSIS_CONCURRENCY = int(os.getenv("REANALYSIS_CONCURRENCY", "4"))
+# Concurrent batches read per scan page; an unbounded 1 MB page can hold thousands of conversations
+SCAN_PAGE_BATCHES = int(os.getenv("REANALYSIS_SCAN_PAGE_BATCHES", "4"))
+# Hand the remaining work to a fresh invocation when less than this much time is left
+CONTINUATION_MARGIN_MS = int(os.getenv("CONTINUATION_MARGIN_MS", "180000"))
+# Attempts at patching an output JSON that another re-analysis keeps rewriting
+OUTPUT_WRITE_ATTEMPTS = 5
+
+# Event field -> (key under ConversationAnalytics.Summary, uploads table attribute), as written by post_processor
+OUTPUT_FIELDS = {
+    "Summarization": ("Summary", "summary"),
+    "ActionItems": ("Actions", "actionItem"),
+    "Topic": ("Topic", "topic"),
+    "Politeness": ("Politeness", "politeness"),
+    "Callback": ("Callback", "callbackValue"),
+    "Product": ("Product", "product"),
+    "Resolution": ("Resolved", "resolution"),
+    "AgentSentiment": ("AgentSentiment", "agentSentiment"),
+    "CustomerSentiment": ("CustomerSentiment", "customerSentiment"),
+}
+
+
+def find_field(prompt_name):
+    for field, ssm_name, transform in summarize.ANALYSIS_FIELDS:
+        if ssm_name == prompt_name:
+            return field, ssm_name, transform
+    raise ValueError(f"{prompt_name} is not an analysis prompt")
+
+
+def read_output(s3_bucket, output_file):
+    s3_obj = s3_client.get_object(Bucket=s3_bucket, Key=output_file)
+    return json.loads(s3_obj["Body"].read().decode("utf-8")), s3_obj["ETag"]
+
+
+def apply_results(conversation, results, versions):
+    summary = conversation["ConversationAnalytics"]["Summary"]
+    for field, value in results.items():
+        summary[OUTPUT_FIELDS[field][0]] = value
+    summary.setdefault("PromptVersions", {}).update(versions)
+
+
+def write_output(s3_bucket, output_file, conversation, etag, results, versions):
+    """
+    Patch the re-analysed fields into the output JSON. The write only succeeds if the object is
+    unchanged since it was read; otherwise the fields are applied again to the latest version, so a
+    concurrent re-analysis of other fields is not overwritten.
+    """
+    for _ in range(OUTPUT_WRITE_ATTEMPTS):
+        apply_results(conversation, results, versions)
+        try:
+            s3_client.put_object(
+                Bucket=s3_bucket,
+                Key=output_file,
+                Body=json.dumps(conversation, ensure_ascii=False, indent=4).encode("utf-8"),
+                IfMatch=etag,
+            )
+            return
+        except ClientError as err:
+            if err.response["Error"]["Code"] not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise
+        conversation, etag = read_output(s3_bucket, output_file)
+    raise Exception(f"{output_file} changed on every attempt, re-analysis not written")
+
+
+def update_item(object_key, results, versions):
+    """
+    Set the re-analysed attributes and only their entries of the promptVersions map
+    """
+    update_expression = []
+    attribute_names = {}
+    attribute_values = {}
+    for i, (field, value) in enumerate(results.items()):
+        attribute_names[f"#f{i}"] = OUTPUT_FIELDS[field][1]
+        attribute_values[f":v{i}"] = value
+        update_expression.append(f"#f{i} = :v{i}")
+        attribute_names[f"#p{i}"] = field
+        attribute_values[f":p{i}"] = versions[field]
+        update_expression.append(f"promptVersions.#p{i} = :p{i}")
+    update = {
+        "Key": {"objectKey": object_key},
+        "UpdateExpression": "SET " + ", ".join(update_expression),
+        "ExpressionAttributeNames": attribute_names,
+        "ExpressionAttributeValues": attribute_values,
+    }
+    try:
+        table.update_item(**update)
+    except ClientError as err:
+        if err.response["Error"]["Code"] != "ValidationException":
+            raise
+        # Items processed before prompt versions were recorded have no map to set entries in
+        try:
+            table.update_item(
+                Key={"objectKey": object_key},
+                UpdateExpression="SET promptVersions = :empty",
+                ConditionExpression="attribute_not_exists(promptVersions)",
+                ExpressionAttributeValues={":empty": {}},
+            )
+        except ClientError as condition_err:
+            if condition_err.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        table.update_item(**update)
+
+
+def reanalyze_conversation(item, fields, force=False):
+    """
+    Recompute analysis fields for one conversation and patch its output JSON and table item.
+    Fields already produced by the current prompt version are skipped unless force is set.
+
+    Returns:
+        str: "updated" or "skipped"
+    """
+    s3_bucket = item["bucketName"]
+    output_file = item["outputFile"]
+    conversation, etag = read_output(s3_bucket, output_file)
+    versions = conversation["ConversationAnalytics"]["Summary"].get("PromptVersions", {})
+    stale_fields = [
+        (field, ssm_name, transform)
+        for field, ssm_name, transform in fields
+        if force or versions.get(field) != summarize.prompt_registry.get_version(ssm_name)
+    ]
+    if not stale_fields:
+        return "skipped"
+
+    lines = conversation.get("TranslatedTranscript") or conversation["RawTranscript"]
+    transcript = "".join(line.strip() + "\n" for line in lines)
+    transcript, _ = summarize.prepare_transcript(transcript, output_file)
+    results = summarize.run_analysis_concurrent(transcript, stale_fields)
+    results = {field: str(value).strip() for field, value in results.items() if value}
+    if not results:
+        raise Exception(f"No usable fields generated for {item['objectKey']}")
+
+    new_versions = summarize.prompt_versions(results)
+    write_output(s3_bucket, output_file, conversation, etag, results, new_versions)
+    update_item(item["objectKey"], results, new_versions)
+    return "updated"
+
+
+def continue_reanalysis(context, field, version, ssm_name, start_key, counts):
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"prompt": ssm_name, "start_key": start_key, "counts": counts}),
+    )
+    print(f"Continuing re-analysis of {field} in a new invocation: {counts}")
+    return {"field": field, "version": version, "status": "CONTINUED", "counts": counts}
+
+
+def handler(event, context):
+    """
+    Recompute one analysis field across all processed conversations.
+
+    Expects {"prompt": <SSM prompt name>} and, on continuation, the scan position in
+    "start_key" plus running "counts".
+    """
+    field, ssm_name, transform = find_field(event["prompt"])
+    summarize.prompt_registry.invalidate()
+    version = summarize.prompt_registry.get_version(ssm_name)
+    counts = event.get("counts", {"updated": 0, "skipped": 0, "failed": 0})
+    print(f"Re-analysing {field} with prompt version {version}")
+
+    batch_size = max(1, REANALYSIS_CONCURRENCY)
+    scan_kwargs = {"FilterExpression": Attr("executionCompletedAt").exists(), "Limit": batch_size * SCAN_PAGE_BATCHES}
+    start_key = event.get("start_key")
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        while True:
+            if start_key:
+                scan_kwargs["ExclusiveStartKey"] = start_key
+            page = table.scan(**scan_kwargs)
+            items = page["Items"]
+            for i in range(0, len(items), batch_size):
+                batch = items[i:i + batch_size]
+                futures = {
+                    item["objectKey"]: executor.submit(
+                        reanalyze_conversation, item, [(field, ssm_name, transform)]
+                    )
+                    for item in batch
+                }
+                for object_key, future in futures.items():
+                    try:
+                        counts[future.result()] += 1
+                    except Exception as err:
+                        print(f"Re-analysis of {field} failed for {object_key}: {err}")
+                        counts["failed"] += 1
+
+                # Within a page, continue after the last conversation handled
+                if i + batch_size < len(items) and context.get_remaining_time_in_millis() < CONTINUATION_MARGIN_MS:
+                    return continue_reanalysis(
+                        context, field, version, ssm_name, {"objectKey": batch[-1]["objectKey"]}, counts
+                    )
+
+            start_key = page.get("LastEvaluatedKey")
+            if not start_key:
+                break
+            if context.get_remaining_time_in_millis() < CONTINUATION_MARGIN_MS:
+                return continue_reanalysis(context, field, version, ssm_name, start_key, counts)
+
+    print(f"Re-analysis of {field} completed: {counts}")
+    return {"field": field, "version": version, "status": "SUCCEEDED", "counts": counts}
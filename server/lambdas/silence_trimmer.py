@@ -0,0 +1,243 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import bisect
+import os
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+from windowed_transcription import read_wav_info
+
+# Energy-based voice activity detection run on WAV inputs before upload: non-speech runs of at least
+# VAD_MIN_SILENCE seconds are cut out, keeping VAD_PADDING seconds either side of the speech around them.
+# numpy is not part of the Lambda bundle; provide it through a layer, otherwise audio is sent untrimmed.
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true") == "true"
+VAD_MIN_SILENCE = float(os.getenv("VAD_MIN_SILENCE", "2.0"))
+VAD_PADDING = float(os.getenv("VAD_PADDING", "0.3"))
+VAD_FRAME_SECONDS = 0.03
+# A frame is speech when louder than the noise floor (10th percentile of frame energy) by VAD_MARGIN_DB,
+# or than VAD_MAX_THRESHOLD_DB dBFS, whichever is lower
+VAD_MARGIN_DB = 12.0
+VAD_MAX_THRESHOLD_DB = -35.0
+# Audio is sent unchanged unless trimming removes at least this share of it
+VAD_MIN_SAVING = 0.05
+READ_CHUNK_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Sample width -> numpy dtype, offset and full scale of integer PCM
+SAMPLE_FORMATS = {
+    8: ("u1", 128.0, 128.0),
+    16: ("<i2", 0.0, 32768.0),
+    32: ("<i4", 0.0, 2147483648.0),
+}
+
+s3_client = boto3.client("s3")
+_numpy = {}
+
+
+def get_numpy():
+    if "module" not in _numpy:
+        try:
+            import numpy
+        except ImportError:
+            print("numpy is not installed, audio is sent without silence trimming")
+            numpy = None
+        _numpy["module"] = numpy
+    return _numpy["module"]
+
+
+def frame_energies(np, bucket, key, info):
+    """
+    Stream the PCM data of a WAV object and compute the energy of each frame, in dBFS
+    """
+    dtype, offset, scale = SAMPLE_FORMATS[info.bits]
+    frame_bytes = int(info.sample_rate * VAD_FRAME_SECONDS) * info.block_align
+    s3_obj = s3_client.get_object(
+        Bucket=bucket, Key=key, Range=f"bytes={info.data_offset}-{info.data_offset + info.data_size - 1}"
+    )
+    energies, carry = [], b""
+    for chunk in s3_obj["Body"].iter_chunks(READ_CHUNK_SIZE):
+        data = carry + chunk
+        usable = len(data) - len(data) % frame_bytes
+        if usable:
+            samples = (np.frombuffer(data[:usable], dtype=dtype).astype(np.float32) - offset) / scale
+            power = np.mean(np.square(samples.reshape(-1, frame_bytes * 8 // info.bits)), axis=1)
+            energies.append(10 * np.log10(power + 1e-10))
+        carry = data[usable:]
+    return np.concatenate(energies) if energies else np.empty(0, dtype=np.float32)
+
+
+def speech_spans(np, energies, duration):
+    """
+    Returns:
+        list: (start, end) seconds of audio to keep, or None if nothing is worth removing
+    """
+    if not len(energies):
+        return None
+    floor = max(float(np.percentile(energies, 10)), -90.0)
+    speech = energies > min(floor + VAD_MARGIN_DB, VAD_MAX_THRESHOLD_DB)
+    if not speech.any():
+        return None
+
+    # Runs of non-speech frames, as [start, end) frame indexes
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    silences = zip(np.flatnonzero(edges == -1), np.flatnonzero(edges == 1))
+
+    spans, kept_from = [], 0.0
+    for first, last in silences:
+        start, end = first * VAD_FRAME_SECONDS, min(last * VAD_FRAME_SECONDS, duration)
+        if end - start < max(VAD_MIN_SILENCE, 2 * VAD_PADDING):
+            continue
+        cut_start = start + VAD_PADDING if first > 0 else 0.0
+        cut_end = end - VAD_PADDING if end < duration else duration
+        if cut_start > kept_from:
+            spans.append((kept_from, cut_start))
+        kept_from = cut_end
+    if kept_from < duration:
+        spans.append((kept_from, duration))
+    return spans
+
+
+class ChunkReader:
+    """
+    File-like view of an iterator of byte chunks, for upload_fileobj
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b""
+
+    def read(self, size=-1):
+        parts, length = [self.buffer], len(self.buffer)
+        while size is None or size < 0 or length < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = b"".join(parts)
+        if size is None or size < 0:
+            size = len(data)
+        data, self.buffer = data[:size], data[size:]
+        return data
+
+
+def kept_chunks(header, body, byte_ranges):
+    """
+    Yield the header, then only the given [start, end) byte ranges of a sequentially read body
+    """
+    yield header
+    ranges = iter(byte_ranges)
+    start, end = next(ranges, (float("inf"), float("inf")))
+    position = 0
+    for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+        chunk_end = position + len(chunk)
+        while start < chunk_end:
+            yield chunk[max(start - position, 0):min(end, chunk_end) - position]
+            if end > chunk_end:
+                break
+            start, end = next(ranges, (float("inf"), float("inf")))
+        position = chunk_end
+
+
+def write_trimmed(bucket, key, info, spans, target_key):
+    """
+    Write a WAV holding only the kept spans of the original
+
+    Returns:
+        tuple: [trimmed start, original start] seconds of each kept span, and the trimmed duration
+    """
+    byte_ranges, offsets, written = [], [], 0
+    for start, end in spans:
+        first = int(start * info.sample_rate)
+        last = min(int(end * info.sample_rate), info.data_size // info.block_align)
+        if last <= first:
+            continue
+        byte_ranges.append((first * info.block_align, last * info.block_align))
+        offsets.append([round(written / info.sample_rate, 3), round(first / info.sample_rate, 3)])
+        written += last - first
+
+    s3_obj = s3_client.get_object(
+        Bucket=bucket, Key=key, Range=f"bytes={info.data_offset}-{info.data_offset + info.data_size - 1}"
+    )
+    header = info.header(written * info.block_align)
+    s3_client.upload_fileobj(
+        ChunkReader(kept_chunks(header, s3_obj["Body"], byte_ranges)),
+        bucket,
+        target_key,
+        Config=TransferConfig(multipart_chunksize=COPY_CHUNK_SIZE),
+    )
+    return offsets, written / info.sample_rate
+
+
+def trim_silence(bucket, key, output_prefix):
+    """
+    Remove long non-speech spans from a PCM WAV before it is sent for transcription
+
+    Returns:
+        tuple: Key of the trimmed WAV and its silence map, or None if the audio is sent unchanged
+    """
+    if not VAD_ENABLED:
+        return None
+    np = get_numpy()
+    if np is None:
+        return None
+    info = read_wav_info(bucket, key)
+    if info is None or info.bits not in SAMPLE_FORMATS:
+        return None
+
+    spans = speech_spans(np, frame_energies(np, bucket, key, info), info.duration)
+    if spans is None or sum(end - start for start, end in spans) > info.duration * (1 - VAD_MIN_SAVING):
+        print(f"Not enough silence in {key} to trim")
+        return None
+
+    stem = os.path.splitext(os.path.basename(key))[0]
+    target_key = f"{output_prefix}/{stem}.speech.wav"
+    offsets, speech_duration = write_trimmed(bucket, key, info, spans, target_key)
+    silence_map = {
+        "originalSeconds": round(info.duration, 3),
+        "speechSeconds": round(speech_duration, 3),
+        "offsets": offsets,
+    }
+    print(f"Trimmed {key} from {info.duration:.0f}s to {speech_duration:.0f}s of speech in {len(offsets)} spans")
+    return target_key, silence_map
+
+
+def to_original(seconds, offsets, end=False):
+    """
+    Map a time on the trimmed audio back onto the original. An end time falling exactly on the join of
+    two spans stays with the earlier one.
+    """
+    trimmed_starts = [trimmed for trimmed, _ in offsets]
+    if end:
+        i = bisect.bisect_left(trimmed_starts, seconds) - 1
+    else:
+        i = bisect.bisect_right(trimmed_starts, seconds) - 1
+    trimmed, original = offsets[max(i, 0)]
+    return round(original + seconds - trimmed, 3)
+
+
+def restore_timestamps(result, silence_map):
+    """
+    Move the segment and word timestamps of a Lemonfox result from the trimmed audio back onto
+    the original audio's timeline
+    """
+    offsets = silence_map["offsets"]
+    for segment in result.get("segments", []):
+        for item in [segment, *segment.get("words", [])]:
+            if "start" in item:
+                item["start"] = to_original(item["start"], offsets)
+            if "end" in item:
+                item["end"] = to_original(item["end"], offsets, end=True)
+    if "duration" in result:
+        result["duration"] = silence_map["originalSeconds"]
+    return result
+
+
+def summary(silence_map):
+    return {
+        "originalSeconds": silence_map["originalSeconds"],
+        "speechSeconds": silence_map["speechSeconds"],
+        "spans": len(silence_map["offsets"]),
+    }
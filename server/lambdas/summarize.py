@@ -3,9 +3,25 @@
 
 import json
 import os
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 import boto3
-from llama_client import Llama4ScoutClient
+from llama_client import Llama4ScoutClient, LlamaClientError
+from transcript_utils import compact_transcript, estimate_tokens, split_transcript
+from prompt_registry import (
+    PromptRegistry,
+    SSM_LLM_CHATBOT_NAME,
+    SSM_LLM_SUMMARIZATION_NAME,
+    SSM_LLM_ACTION_PROMPT,
+    SSM_LLM_TOPIC_PROMPT,
+    SSM_LLM_PRODUCT_PROMPT,
+    SSM_LLM_RESOLVED_PROMPT,
+    SSM_LLM_CALLBACK_PROMPT,
+    SSM_LLM_POLITE_PROMPT,
+    SSM_LLM_AGENT_SENTIMENT_PROMPT,
+    SSM_LLM_CUSTOMER_SENTIMENT_PROMPT,
+)
 
 print("Loading Summarization Fn...")
 s3_client = boto3.client("s3")
@@ -15,21 +31,76 @@ ssm_client = boto3.client("ssm")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "256"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
 
+# Analysis execution: "concurrent" fans all prompts out at once, "sequential" keeps the old paced loop,
+# "combined" asks for every field in a single structured JSON response
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "concurrent")
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "9"))
+FIELD_TIMEOUT = int(os.getenv("FIELD_TIMEOUT", "120"))
+FIELD_MAX_RETRIES = int(os.getenv("FIELD_MAX_RETRIES", "2"))
+# Pacing is left to the shared rate limiter; a fixed delay can still be set for unlimited endpoints
+SEQUENTIAL_DELAY = int(os.getenv("SEQUENTIAL_DELAY", "0"))
+COMBINED_MAX_TOKENS = int(os.getenv("COMBINED_MAX_TOKENS", "1024"))
+
+# Prompt assembly: "instruction_first" renders each stored template as one message with the transcript inline,
+# "transcript_first" sends the transcript as an identical leading system message for every field and the
+# field instruction last, so a server with automatic prefix caching prefills the transcript only once
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "instruction_first")
+TRANSCRIPT_CONTEXT = (
+    "You are analysing a customer service conversation. "
+    "Answer the instruction that follows using only this transcript.\n\n"
+    "Transcript: {transcript}"
+)
+
+# Transcript compaction before prompt rendering (individual stages are configured in transcript_utils)
+COMPACT_TRANSCRIPT = os.getenv("COMPACT_TRANSCRIPT", "true") == "true"
+
+# Long-transcript (map-reduce) configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+MAP_MAX_TOKENS = int(os.getenv("MAP_MAX_TOKENS", "512"))
+MAX_REDUCE_ROUNDS = int(os.getenv("MAX_REDUCE_ROUNDS", "3"))
+OMITTED_MARKER = "[...]"
+MAP_PROMPT = (
+    "The following is one part of a longer customer service conversation. "
+    "Write condensed notes of this part, keeping who said what about the customer's issue, "
+    "products or services mentioned, actions taken by the agent, whether the issue was resolved, "
+    "any callback, the agent's politeness and the sentiment of both the agent and the customer.\n\n"
+    "Transcript part: {transcript}\n\n"
+    "Notes:"
+)
+
+# Standard /genai questions answered for every conversation alongside the analysis fields, with the
+# chatbot prompt, so the web app can serve them without an interactive LLM call
+PRECOMPUTED_QUESTIONS = json.loads(os.getenv("PRECOMPUTED_QUESTIONS", "[]"))
+PRECOMPUTED_MAX_TOKENS = int(os.getenv("PRECOMPUTED_MAX_TOKENS", "1024"))
+
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
 
 # Initialize Llama4Scout client
 llama_client = Llama4ScoutClient()
 
-SSM_LLM_SUMMARIZATION_NAME = "ci_summarization_prompt"
-SSM_LLM_ACTION_PROMPT = "ci_action_prompt"
-SSM_LLM_TOPIC_PROMPT = "ci_topic_prompt"
-SSM_LLM_PRODUCT_PROMPT = "ci_product_prompt"
-SSM_LLM_RESOLVED_PROMPT = "ci_resolved_prompt"
-SSM_LLM_CALLBACK_PROMPT = "ci_callback_prompt"
-SSM_LLM_POLITE_PROMPT = "ci_politeness_prompt"
-SSM_LLM_AGENT_SENTIMENT_PROMPT = "ci_agent_sentiment_prompt"
-SSM_LLM_CUSTOMER_SENTIMENT_PROMPT = "ci_customer_sentiment_prompt"
+def first_value(response):
+    return str(response).split(',', 1)[0]
+
+
+# Event key, SSM prompt name and optional response post-processing for every analysis field
+ANALYSIS_FIELDS = [
+    ("Summarization", SSM_LLM_SUMMARIZATION_NAME, None),
+    ("ActionItems", SSM_LLM_ACTION_PROMPT, None),
+    ("Topic", SSM_LLM_TOPIC_PROMPT, None),
+    ("Politeness", SSM_LLM_POLITE_PROMPT, None),
+    ("Callback", SSM_LLM_CALLBACK_PROMPT, None),
+    ("Product", SSM_LLM_PRODUCT_PROMPT, None),
+    ("Resolution", SSM_LLM_RESOLVED_PROMPT, None),
+    ("AgentSentiment", SSM_LLM_AGENT_SENTIMENT_PROMPT, first_value),
+    ("CustomerSentiment", SSM_LLM_CUSTOMER_SENTIMENT_PROMPT, first_value),
+]
+
+prompt_registry = PromptRegistry(
+    ssm_client,
+    [ssm_name for _, ssm_name, _ in ANALYSIS_FIELDS] + ([SSM_LLM_CHATBOT_NAME] if PRECOMPUTED_QUESTIONS else []),
+)
+
 
 def call_llama(parameters, prompt):
     """
@@ -38,7 +109,7 @@ def call_llama(parameters, prompt):
     return llama_client.generate_response(prompt, parameters)
 
 
-def generate_llama_query(prompt, transcript, question=""):
+def generate_llama_query(prompt, transcript, question="", options=None):
     """
     Generate query using Llama4Scout instead of Bedrock
     """
@@ -52,11 +123,302 @@ def generate_llama_query(prompt, transcript, question=""):
         "temperature": TEMPERATURE,
         "max_tokens": MAX_TOKENS
     }
+    if options:
+        parameters.update(options)
     
     generated_text = call_llama(parameters, prompt)
     return generated_text
 
 
+def get_prompt(ssm_name):
+    return prompt_registry.get(ssm_name)
+
+
+def field_question(prompt):
+    """
+    A single-field prompt template without its transcript block, keeping the trailing answer label
+    """
+    lines = prompt.replace("<br>", "\n").split("\n")
+    question = "\n".join(line for line in lines if "{transcript}" not in line)
+    return re.sub(r"\n{3,}", "\n\n", question).strip()
+
+
+def analyze_field(ssm_name, transform, transcript):
+    """
+    Generate a single analysis field, bounded by the per-field timeout and retry budget
+    """
+    prompt = get_prompt(ssm_name)
+    options = {"timeout": FIELD_TIMEOUT, "max_retries": FIELD_MAX_RETRIES}
+    if PROMPT_LAYOUT == "transcript_first":
+        prompt = field_question(prompt)
+        options["context"] = TRANSCRIPT_CONTEXT.replace("{transcript}", transcript)
+    query_response = generate_llama_query(prompt, transcript, "", options)
+    if transform is not None:
+        query_response = transform(query_response)
+    return query_response
+
+
+def answer_question(question, transcript):
+    """
+    Answer a precomputed question the way /genai would, bounded like an analysis field
+    """
+    prompt = get_prompt(SSM_LLM_CHATBOT_NAME)
+    options = {"max_tokens": PRECOMPUTED_MAX_TOKENS, "timeout": FIELD_TIMEOUT, "max_retries": FIELD_MAX_RETRIES}
+    if PROMPT_LAYOUT == "transcript_first":
+        prompt = field_question(prompt)
+        options["context"] = TRANSCRIPT_CONTEXT.replace("{transcript}", transcript)
+    return str(generate_llama_query(prompt, transcript, question, options)).strip()
+
+
+def run_analysis_concurrent(transcript, fields=None, questions=()):
+    """
+    Send all analysis prompts, and the answers to any precomputed questions, at once, capped at
+    ANALYSIS_CONCURRENCY in-flight requests. A failed field is left empty and a failed question is
+    left out so neither can block the remaining ones.
+    """
+    if fields is None:
+        fields = ANALYSIS_FIELDS
+    results = {}
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, ANALYSIS_CONCURRENCY)) as executor:
+        futures = {}
+        for i, (field, ssm_name, transform) in enumerate(fields):
+            futures[field] = executor.submit(analyze_field, ssm_name, transform, transcript)
+            # Let the first request populate the server's prefix cache before the others arrive
+            if i == 0 and PROMPT_LAYOUT == "transcript_first" and len(fields) + len(questions) > 1:
+                wait([futures[field]])
+        question_futures = {
+            question: executor.submit(answer_question, question, transcript) for question in questions
+        }
+        for field, future in futures.items():
+            try:
+                results[field] = future.result()
+            except Exception as err:
+                print(f"Analysis of {field} failed: {err}")
+                results[field] = ""
+        answers = {}
+        for question, future in question_futures.items():
+            try:
+                answers[question] = future.result()
+            except Exception as err:
+                print(f"Precomputed question '{question}' failed: {err}")
+        if answers:
+            results["PrecomputedAnswers"] = answers
+    print(f"Analysed {len(futures)} fields and {len(question_futures)} questions in {time.time() - started:.1f}s")
+    return results
+
+
+def run_analysis_sequential(transcript):
+    """
+    Generate analysis fields one after another, pausing SEQUENTIAL_DELAY seconds between calls
+    """
+    results = {}
+    for field, ssm_name, transform in ANALYSIS_FIELDS:
+        try:
+            results[field] = analyze_field(ssm_name, transform, transcript)
+        except LlamaClientError as err:
+            print(f"Analysis of {field} failed: {err}")
+            results[field] = ""
+        time.sleep(SEQUENTIAL_DELAY)
+    return results
+
+
+def field_instruction(prompt):
+    """
+    Reduce a single-field prompt template to its instruction text by dropping the transcript block
+    and the trailing answer label
+    """
+    lines = [line.strip() for line in prompt.replace("<br>", "\n").split("\n")]
+    lines = [line for line in lines if line and "{transcript}" not in line]
+    if len(lines) > 1 and lines[-1].endswith(":"):
+        lines = lines[:-1]
+    return " ".join(lines)
+
+
+def build_combined_prompt(fields):
+    instructions = "\n".join(
+        f'"{field}": {field_instruction(get_prompt(ssm_name))}'
+        for field, ssm_name, transform in fields
+    )
+    return (
+        "Please analyze the following transcript and answer every instruction below. "
+        "Respond with only a JSON object that has exactly these keys, each with a string value.\n\n"
+        f"{instructions}\n\n"
+        "Transcript: {transcript}\n\n"
+        "JSON:"
+    )
+
+
+def parse_combined_response(response, fields):
+    """
+    Validate the combined JSON response against the expected fields.
+    Returns the valid values and the list of fields that are missing or malformed.
+    """
+    values = {}
+    match = re.search(r"\{.*\}", str(response), re.DOTALL)
+    try:
+        document = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError as err:
+        print(f"Combined analysis response is not valid JSON: {err}")
+        document = {}
+    if not isinstance(document, dict):
+        document = {}
+
+    invalid = []
+    for field, ssm_name, transform in fields:
+        value = document.get(field)
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            value = "\n".join(value)
+        if not isinstance(value, str) or not value.strip():
+            invalid.append((field, ssm_name, transform))
+            continue
+        values[field] = transform(value) if transform is not None else value.strip()
+    return values, invalid
+
+
+def run_analysis_combined(transcript):
+    """
+    Request every analysis field in one structured call, then re-ask only for fields
+    that came back missing or malformed.
+    """
+    prompt = build_combined_prompt(ANALYSIS_FIELDS)
+    try:
+        response = generate_llama_query(
+            prompt,
+            transcript,
+            "",
+            {"max_tokens": COMBINED_MAX_TOKENS, "timeout": FIELD_TIMEOUT, "max_retries": FIELD_MAX_RETRIES},
+        )
+    except LlamaClientError as err:
+        print(f"Combined analysis failed: {err}")
+        response = ""
+    results, invalid = parse_combined_response(response, ANALYSIS_FIELDS)
+    if invalid:
+        print(f"Re-asking for {len(invalid)} fields: {[field for field, _, _ in invalid]}")
+        results.update(run_analysis_concurrent(transcript, invalid))
+    return results
+
+
+def map_transcript(transcript):
+    """
+    Map step: condense each token-budgeted window of the transcript in parallel
+    """
+    windows = split_transcript(transcript, CONTEXT_TOKEN_BUDGET)
+    print(f"Mapping {len(windows)} transcript windows")
+    options = {"max_tokens": MAP_MAX_TOKENS, "timeout": FIELD_TIMEOUT, "max_retries": FIELD_MAX_RETRIES}
+
+    def condense(window):
+        try:
+            return generate_llama_query(MAP_PROMPT, window, "", options)
+        except LlamaClientError as err:
+            print(f"Condensing transcript window failed: {err}")
+            return ""
+
+    with ThreadPoolExecutor(max_workers=max(1, ANALYSIS_CONCURRENCY)) as executor:
+        notes = list(executor.map(condense, windows))
+    return "\n".join(
+        f"Part {i + 1}: {note.strip()}" for i, note in enumerate(notes)
+    ) + "\n"
+
+
+def fit_transcript(transcript, budget):
+    """
+    Whole turns from both ends of a transcript, within the token budget. The middle is dropped,
+    as the opening states the customer's issue and the close its resolution.
+    """
+    lines = [line for window in split_transcript(transcript, budget // 2) for line in window.splitlines()]
+    head, tail = [], []
+    used = estimate_tokens(OMITTED_MARKER + "\n")
+    first, last = 0, len(lines) - 1
+    while first <= last:
+        line = lines[first] if len(head) <= len(tail) else lines[last]
+        cost = estimate_tokens(line + "\n")
+        if used + cost > budget:
+            break
+        used += cost
+        if len(head) <= len(tail):
+            head.append(line)
+            first += 1
+        else:
+            tail.insert(0, line)
+            last -= 1
+    if first <= last:
+        head.append(OMITTED_MARKER)
+    return "\n".join(head + tail) + "\n"
+
+
+def reduce_transcript(transcript):
+    """
+    Condense a transcript that does not fit the context budget into window notes, repeating
+    the map step until the notes fit. The analysis prompts then run over the notes as the
+    reduce step. Notes still over budget after MAX_REDUCE_ROUNDS are cut down to fit, rather
+    than leaving the model to truncate or reject the prompt.
+    """
+    for round_number in range(MAX_REDUCE_ROUNDS):
+        if estimate_tokens(transcript) <= CONTEXT_TOKEN_BUDGET:
+            break
+        before = estimate_tokens(transcript)
+        transcript = map_transcript(transcript)
+        print(f"Reduce round {round_number + 1}: ~{before} -> ~{estimate_tokens(transcript)} tokens")
+    if estimate_tokens(transcript) > CONTEXT_TOKEN_BUDGET:
+        print(
+            f"Transcript is ~{estimate_tokens(transcript)} tokens after {MAX_REDUCE_ROUNDS} reduce rounds, "
+            f"cutting it to {CONTEXT_TOKEN_BUDGET}"
+        )
+        transcript = fit_transcript(transcript, CONTEXT_TOKEN_BUDGET)
+    return transcript
+
+
+def prepare_transcript(transcript, output_key):
+    """
+    Compact the transcript and fall back to map-reduce when it exceeds the context budget
+
+    Returns:
+        tuple: Transcript to analyse and its original/compacted token estimates
+    """
+    original_tokens = estimate_tokens(transcript)
+    if COMPACT_TRANSCRIPT:
+        transcript = compact_transcript(transcript)
+    compacted_tokens = estimate_tokens(transcript)
+    print(f"Transcript tokens for {output_key}: ~{original_tokens} original, ~{compacted_tokens} compacted")
+
+    if compacted_tokens > CONTEXT_TOKEN_BUDGET:
+        print(f"Transcript for {output_key} exceeds {CONTEXT_TOKEN_BUDGET} tokens, using map-reduce")
+        transcript = reduce_transcript(transcript)
+    return transcript, {"Original": original_tokens, "Compacted": compacted_tokens}
+
+
+def prompt_versions(results):
+    """
+    Version of the prompt behind every field that was generated successfully
+    """
+    versions = {
+        field: prompt_registry.get_version(ssm_name)
+        for field, ssm_name, _ in ANALYSIS_FIELDS
+        if results.get(field)
+    }
+    if results.get("PrecomputedAnswers"):
+        versions["PrecomputedAnswers"] = prompt_registry.get_version(SSM_LLM_CHATBOT_NAME)
+    return versions
+
+
+def report_prefill(output_key, usage):
+    """
+    Log how much of the analysis prefill the server answered from its prefix cache
+
+    Returns:
+        dict: Prompt tokens sent and the share of them served from the cache
+    """
+    prompt_tokens = usage["prompt_tokens"]
+    cached_tokens = usage["cached_tokens"]
+    saved = cached_tokens / prompt_tokens * 100 if prompt_tokens else 0.0
+    print(
+        f"Prefill for {output_key} ({PROMPT_LAYOUT}): {usage['requests']} requests, "
+        f"{prompt_tokens} prompt tokens, {cached_tokens} from prefix cache ({saved:.1f}% saved)"
+    )
+    return {"Prompt": prompt_tokens, "Cached": cached_tokens}
+
+
 def merge_json(original, addition):
     for k, v in addition.items():
         if k not in original:
@@ -100,79 +462,23 @@ def handler(e, context):
             transcript_data += line.strip() + "\n"
 
     try:
-        llm_summarization_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_SUMMARIZATION_NAME
-        )
-        prompt = llm_summarization_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Summarization"] = query_response
-        time.sleep(30)
-
-        llm_action_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_ACTION_PROMPT
-        )
-        prompt = llm_action_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["ActionItems"] = query_response
-        time.sleep(30)
-
-        llm_topic_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_TOPIC_PROMPT
-        )
-        prompt = llm_topic_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Topic"] = query_response
-        time.sleep(30)
-
-        llm_polite_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_POLITE_PROMPT
-        )
-        prompt = llm_polite_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Politeness"] = query_response
-        time.sleep(30)
-
-        llm_callback_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_CALLBACK_PROMPT
-        )
-        prompt = llm_callback_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Callback"] = query_response
-        time.sleep(30)
-
-        llm_product_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_PRODUCT_PROMPT
-        )
-        prompt = llm_product_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Product"] = query_response
-        time.sleep(30)
-
-        llm_resolved_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_RESOLVED_PROMPT
-        )
-        prompt = llm_resolved_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["Resolution"] = query_response
-        time.sleep(30)
-
-        llm_agent_sentiment_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_AGENT_SENTIMENT_PROMPT
-        )
-        prompt = llm_agent_sentiment_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["AgentSentiment"] = str(query_response).split(',', 1)[0]
-        time.sleep(30)
-
-        llm_customer_sentiment_prompt = ssm_client.get_parameter(
-            Name=SSM_LLM_CUSTOMER_SENTIMENT_PROMPT
-        )
-        prompt = llm_customer_sentiment_prompt["Parameter"]["Value"]
-        query_response = generate_llama_query(prompt, transcript_data, "")
-        event["CustomerSentiment"] = str(query_response).split(',', 1)[0]
-        time.sleep(30)
+        transcript_data, event["TranscriptTokens"] = prepare_transcript(transcript_data, output_key)
 
+        usage = dict(llama_client.usage)
+        if ANALYSIS_MODE == "sequential":
+            results = run_analysis_sequential(transcript_data)
+            results.update(run_analysis_concurrent(transcript_data, [], PRECOMPUTED_QUESTIONS))
+        elif ANALYSIS_MODE == "combined":
+            results = run_analysis_combined(transcript_data)
+            results.update(run_analysis_concurrent(transcript_data, [], PRECOMPUTED_QUESTIONS))
+        else:
+            results = run_analysis_concurrent(transcript_data, questions=PRECOMPUTED_QUESTIONS)
+        report_prefill(output_key, llama_client.usage_since(usage))
+        event.update(results)
+        event["PromptVersions"] = prompt_versions(results)
         print(f"Summarization completed for {output_key}")
+        if llama_client.cache is not None:
+            llama_client.cache.report()
     except Exception as err:
         query_response = "An error occurred generating Llama4Scout query response."
         print(err)
@@ -0,0 +1,151 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import re
+
+# Rough characters-per-token ratio for English text with Llama-family tokenizers
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+
+# Compaction stages applied before prompt rendering
+COMPACT_FILLERS = os.getenv("COMPACT_FILLERS", "true") == "true"
+COMPACT_LABELS = os.getenv("COMPACT_LABELS", "true") == "true"
+COMPACT_DEDUPE = os.getenv("COMPACT_DEDUPE", "false") == "true"
+# Speaker labels longer than this are replaced by a short alias and a legend line
+MAX_LABEL_LENGTH = int(os.getenv("MAX_LABEL_LENGTH", "10"))
+
+FILLER_PATTERN = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+|a+h+|e+r+|mm+)\b[,.]?\s*", re.IGNORECASE)
+# Stuttered words only: repeated digits are card numbers, PINs and amounts, not disfluencies
+REPEATED_WORD_PATTERN = re.compile(r"\b([A-Za-z]+)(?:[\s,]+\1\b)+", re.IGNORECASE)
+# A short name before the colon; a colon inside a time ("10:30") or a sentence is not a label
+SPEAKER_LABEL_PATTERN = re.compile(r"^\s*([A-Za-z][\w .'-]{0,30}?)\s*:(?!\d)")
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate used to choose between the single-pass and long-transcript paths
+    """
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def split_speaker(line):
+    """
+    Split a transcript line into its speaker label and text
+
+    Args:
+        line (str): One transcript line
+
+    Returns:
+        tuple: (speaker, text), with an empty speaker for an unlabeled line
+    """
+    match = SPEAKER_LABEL_PATTERN.match(line)
+    # "... at 10: ..." ends in a number, not a name
+    if not match or not re.search(r"[A-Za-z]", match.group(1).split()[-1]):
+        return "", line
+    return match.group(1), line[match.end():]
+
+
+def split_transcript(transcript, max_tokens):
+    """
+    Split a transcript into windows of at most max_tokens, breaking only on speaker-turn
+    (line) boundaries. A single turn longer than the budget is split on sentence, then word,
+    boundaries.
+
+    Args:
+        transcript (str): Transcript with one "Speaker: text" turn per line
+        max_tokens (int): Token budget per window
+
+    Returns:
+        list: Transcript windows
+    """
+    windows = []
+    current = []
+    current_tokens = 0
+    for turn in transcript.splitlines():
+        if not turn.strip():
+            continue
+        for piece in _split_turn(turn, max_tokens):
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                windows.append("\n".join(current) + "\n")
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        windows.append("\n".join(current) + "\n")
+    return windows
+
+
+def _split_turn(turn, max_tokens):
+    if estimate_tokens(turn) <= max_tokens:
+        return [turn]
+    # Every piece of a labeled turn keeps its speaker label; unlabeled text gets no prefix
+    speaker, text = split_speaker(turn)
+    prefix = f"{speaker}: " if speaker else ""
+    # Prefer sentence boundaries, falling back to words for a sentence over the budget
+    units = []
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text.strip()):
+        if estimate_tokens(prefix + sentence) <= max_tokens:
+            units.append(sentence)
+        else:
+            units.extend(sentence.split())
+    pieces = []
+    current = []
+    length = len(prefix)
+    for unit in units:
+        # Track the piece length rather than re-joining it for every unit
+        if current and int((length + 1 + len(unit)) / CHARS_PER_TOKEN) + 1 > max_tokens:
+            pieces.append(prefix + " ".join(current))
+            current = []
+            length = len(prefix)
+        length += len(unit) + (1 if current else 0)
+        current.append(unit)
+    if current:
+        pieces.append(prefix + " ".join(current))
+    return pieces
+
+
+def compact_transcript(transcript, fillers=None, labels=None, dedupe=None):
+    """
+    Shrink a transcript before it is sent to the LLM: drop disfluencies, collapse whitespace
+    and blank lines, alias long speaker labels and optionally drop repeated utterances.
+
+    Args:
+        transcript (str): Transcript with one "Speaker: text" turn per line
+        fillers (bool): Remove filler words and stuttered repeats (default: COMPACT_FILLERS)
+        labels (bool): Alias long speaker labels (default: COMPACT_LABELS)
+        dedupe (bool): Drop an utterance identical to the same speaker's previous one
+            (default: COMPACT_DEDUPE)
+
+    Returns:
+        str: Compacted transcript
+    """
+    fillers = COMPACT_FILLERS if fillers is None else fillers
+    labels = COMPACT_LABELS if labels is None else labels
+    dedupe = COMPACT_DEDUPE if dedupe is None else dedupe
+
+    aliases = {}
+    previous = {}
+    turns = []
+    for line in transcript.splitlines():
+        speaker, text = split_speaker(line)
+        if fillers:
+            text = FILLER_PATTERN.sub("", text)
+            text = REPEATED_WORD_PATTERN.sub(r"\1", text)
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if dedupe:
+            if previous.get(speaker) == text.lower():
+                continue
+            previous[speaker] = text.lower()
+        if labels and len(speaker) > MAX_LABEL_LENGTH:
+            speaker = aliases.setdefault(speaker, f"S{len(aliases) + 1}")
+        turns.append(f"{speaker}: {text}" if speaker else text)
+
+    legend = [f"{alias} = {speaker}" for speaker, alias in aliases.items()]
+    if legend:
+        turns.insert(0, "Speakers: " + ", ".join(legend))
+    return "\n".join(turns) + "\n"
@@ -4,6 +4,7 @@
 import json
 import os
 import boto3
+import job_context
 from lemonfox_client import LemonfoxClient
 
 print("Loading Transcription Function...")
@@ -20,9 +21,9 @@ def handler(e, context):
 
     try:
         # Check if we already have Lemonfox result from diarization step
-        if "lemonfox_result" in event:
+        if job_context.has_artifact(event, "lemonfox_result"):
             print("Using Lemonfox result from diarization step")
-            result = event["lemonfox_result"]
+            result = job_context.get_artifact(event, "lemonfox_result")
         else:
             # Fallback: call Lemonfox API directly
             audio_url = f"s3://{s3_bucket}/{output_key}/{event['audio_wav_file']}"
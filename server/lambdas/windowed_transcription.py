@@ -0,0 +1,256 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+import audio_transcoder
+import cfg
+
+# Long-audio mode: WAV inputs longer than LONG_AUDIO_THRESHOLD seconds are split into WINDOW_SECONDS windows
+# that overlap by WINDOW_OVERLAP seconds, transcribed concurrently and stitched back together
+LONG_AUDIO_ENABLED = os.getenv("LONG_AUDIO_ENABLED", "true") == "true"
+LONG_AUDIO_THRESHOLD = int(os.getenv("LONG_AUDIO_THRESHOLD", "1200"))
+WINDOW_SECONDS = int(os.getenv("WINDOW_SECONDS", "600"))
+WINDOW_OVERLAP = int(os.getenv("WINDOW_OVERLAP", "30"))
+WINDOW_CONCURRENCY = int(os.getenv("WINDOW_CONCURRENCY", "8"))
+WINDOWS_PREFIX = "windows"
+# Later steps only know this many speaker labels (server_constants.SPEAKERS)
+MAX_SPEAKERS = cfg.LEMONFOX_MAX_SPEAKERS
+# Enough to reach the data chunk of any WAV header seen in practice
+HEADER_RANGE = 65536
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+s3_client = boto3.client("s3")
+
+
+class WavInfo:
+    def __init__(self, fmt_chunk, data_offset, data_size):
+        self.fmt_chunk = fmt_chunk
+        _, self.channels, self.sample_rate, self.byte_rate, self.block_align, self.bits = struct.unpack(
+            "<HHIIHH", fmt_chunk[:16]
+        )
+        self.data_offset = data_offset
+        self.data_size = data_size - data_size % self.block_align
+
+    @property
+    def duration(self):
+        return self.data_size / self.byte_rate
+
+    def header(self, data_size):
+        fmt = b"fmt " + struct.pack("<I", len(self.fmt_chunk)) + self.fmt_chunk
+        return b"RIFF" + struct.pack("<I", 4 + len(fmt) + 8 + data_size) + b"WAVE" + fmt + b"data" + struct.pack("<I", data_size)
+
+
+def read_wav_info(bucket, key):
+    """
+    Locate the PCM data of a WAV object from a ranged read of its header
+
+    Returns:
+        WavInfo: Format and data chunk position, or None if the object is not a parseable WAV
+    """
+    s3_obj = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER_RANGE - 1}")
+    object_size = int(s3_obj["ContentRange"].rsplit("/", 1)[1])
+    header = s3_obj["Body"].read()
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    position, fmt_chunk = 12, None
+    while position + 8 <= len(header):
+        chunk_id = header[position:position + 4]
+        chunk_size = struct.unpack("<I", header[position + 4:position + 8])[0]
+        if chunk_id == b"fmt ":
+            fmt_chunk = header[position + 8:position + 8 + chunk_size]
+        elif chunk_id == b"data":
+            if fmt_chunk is None or struct.unpack("<H", fmt_chunk[:2])[0] not in (1, 0xFFFE):
+                return None
+            # Streamed WAVs may leave the data size unset
+            data_size = min(chunk_size, object_size - position - 8)
+            return WavInfo(fmt_chunk, position + 8, data_size)
+        position += 8 + chunk_size + chunk_size % 2
+    return None
+
+
+def plan_windows(duration, window=WINDOW_SECONDS, overlap=WINDOW_OVERLAP):
+    """
+    Returns:
+        list: (start, end) seconds of overlapping windows covering the whole duration
+    """
+    windows = []
+    start = 0.0
+    while True:
+        end = min(duration, start + window)
+        windows.append((start, end))
+        if end >= duration:
+            return windows
+        start = end - overlap
+
+
+class WindowReader:
+    """
+    File-like view of a WAV window: a rebuilt header followed by a ranged read of the original
+    object's PCM data, so upload_fileobj copies the window without holding it in memory
+    """
+
+    def __init__(self, header, body):
+        self.header = header
+        self.body = body
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self.header = self.header + self.body.read(), b""
+            return data
+        data, self.header = self.header[:size], self.header[size:]
+        if len(data) < size:
+            data += self.body.read(size - len(data))
+        return data
+
+
+def write_window(bucket, key, info, start, end, window_key):
+    first_frame = int(start * info.sample_rate)
+    last_frame = min(int(end * info.sample_rate), info.data_size // info.block_align)
+    first_byte = info.data_offset + first_frame * info.block_align
+    data_size = (last_frame - first_frame) * info.block_align
+    s3_obj = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={first_byte}-{first_byte + data_size - 1}")
+    s3_client.upload_fileobj(
+        WindowReader(info.header(data_size), s3_obj["Body"]),
+        bucket,
+        window_key,
+        Config=TransferConfig(multipart_chunksize=COPY_CHUNK_SIZE),
+    )
+
+
+def overlap_seconds(a, b):
+    return max(0.0, min(a["end"], b["end"]) - max(a["start"], b["start"]))
+
+
+def match_speakers(previous, current, overlap_start, overlap_end, labels, max_speakers=MAX_SPEAKERS):
+    """
+    Map the speaker labels of a window onto the global labels, by how long each pair of labels
+    speaks at the same time within the overlap region. A label that cannot be matched takes a
+    global label not used in this window yet; a new global label is only created while there are
+    fewer than max_speakers, otherwise the label joins the one it shared most time with.
+
+    Args:
+        labels (list): Global labels assigned so far, extended in place with any new label
+
+    Returns:
+        dict: window label -> global label
+    """
+    shared = {}
+    for segment in current:
+        if segment["end"] <= overlap_start or segment["start"] >= overlap_end:
+            continue
+        for earlier in previous:
+            if earlier["end"] <= overlap_start or earlier["start"] >= overlap_end:
+                continue
+            pair = (segment.get("speaker"), earlier.get("speaker"))
+            shared[pair] = shared.get(pair, 0.0) + overlap_seconds(segment, earlier)
+
+    mapping, taken = {}, set()
+    for (label, global_label), _ in sorted(shared.items(), key=lambda item: item[1], reverse=True):
+        if label in mapping or global_label in taken:
+            continue
+        mapping[label] = global_label
+        taken.add(global_label)
+    for segment in current:
+        label = segment.get("speaker")
+        if label is None or label in mapping:
+            continue
+        free = [global_label for global_label in labels if global_label not in taken]
+        if free:
+            mapping[label] = free[0]
+        elif len(labels) < max(max_speakers, 1):
+            labels.append(f"SPEAKER_{len(labels):02d}")
+            mapping[label] = labels[-1]
+        else:
+            closest = [(seconds, pair[1]) for pair, seconds in shared.items() if pair[0] == label]
+            mapping[label] = max(closest)[1] if closest else labels[0]
+        taken.add(mapping[label])
+    return mapping
+
+
+def shift(segment, offset):
+    """
+    Copy of a window-local segment, and its words, moved onto the original timeline
+    """
+    shifted = {**segment, "start": segment.get("start", 0) + offset, "end": segment.get("end", 0) + offset}
+    if "words" in segment:
+        shifted["words"] = [
+            {**word, "start": word.get("start", 0) + offset, "end": word.get("end", 0) + offset}
+            for word in segment["words"]
+        ]
+    return shifted
+
+
+def stitch(windows, results):
+    """
+    Merge per-window Lemonfox results into one result on the original timeline. Each overlap is
+    split at its midpoint: a segment is kept from the window in which its midpoint falls, and
+    speaker labels are carried across windows through the overlap.
+
+    Returns:
+        dict: verbose_json-shaped result with the stitched segments and text
+    """
+    labels = []
+    merged = []
+    previous = []
+    for i, ((start, end), result) in enumerate(zip(windows, results)):
+        segments = [shift(segment, start) for segment in result.get("segments", [])]
+        overlap_end = windows[i - 1][1] if i > 0 else start
+        mapping = match_speakers(previous, segments, start, overlap_end, labels)
+        for segment in segments:
+            if segment.get("speaker") is not None:
+                segment["speaker"] = mapping[segment["speaker"]]
+
+        cut_before = (start + windows[i - 1][1]) / 2 if i > 0 else float("-inf")
+        cut_after = (windows[i + 1][0] + end) / 2 if i + 1 < len(windows) else float("inf")
+        merged.extend(
+            segment for segment in segments
+            if cut_before <= (segment["start"] + segment["end"]) / 2 < cut_after
+        )
+        previous = segments
+
+    for i, segment in enumerate(merged):
+        segment["id"] = i
+    return {
+        "task": "transcribe",
+        "language": results[0].get("language", "") if results else "",
+        "duration": windows[-1][1] if windows else 0,
+        "text": "".join(segment.get("text", "") for segment in merged).strip(),
+        "segments": merged,
+    }
+
+
+def transcribe_long_audio(lemonfox_client, bucket, key, output_key, uploads=None):
+    """
+    Transcribe a long WAV as concurrent overlapping windows, each compressed before it is sent.
+    Transcoding stats of the windows are appended to uploads when given.
+
+    Returns:
+        dict: Stitched result, or None if the audio is short or not a PCM WAV
+    """
+    if not LONG_AUDIO_ENABLED:
+        return None
+    info = read_wav_info(bucket, key)
+    if info is None or info.duration <= LONG_AUDIO_THRESHOLD:
+        return None
+
+    windows = plan_windows(info.duration)
+    print(f"Transcribing {info.duration:.0f}s of audio as {len(windows)} windows of {WINDOW_SECONDS}s")
+
+    def transcribe_window(numbered_window):
+        i, (start, end) = numbered_window
+        window_key = f"{output_key}/{WINDOWS_PREFIX}/{i:03d}.wav"
+        write_window(bucket, key, info, start, end, window_key)
+        audio_url, stats = audio_transcoder.prepare_audio(bucket, window_key, f"{output_key}/{WINDOWS_PREFIX}")
+        if uploads is not None:
+            uploads.append(stats)
+        return lemonfox_client.transcribe_with_diarization(audio_url)
+
+    with ThreadPoolExecutor(max_workers=max(1, WINDOW_CONCURRENCY)) as executor:
+        results = list(executor.map(transcribe_window, enumerate(windows)))
+    return stitch(windows, results)
@@ -0,0 +1,14 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lambda modules are deployed flat, with cfg.py alongside; import them the same way
+for path in ("web_app/lambdas", "server/lambdas", ""):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+# Modules create their boto3 clients at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
@@ -0,0 +1,95 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import email.utils
+import threading
+import time
+
+import pytest
+
+import adaptive_policy
+from adaptive_policy import AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError, retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_limiter_grows_additively_and_backs_off_multiplicatively(monkeypatch):
+    monkeypatch.setattr(adaptive_policy, "CONCURRENCY_BACKOFF", 0.5)
+    limiter = AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=5, latency_target=10)
+
+    # One full window of fast responses adds one slot
+    for _ in range(4):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release(1.0, overloaded=False)
+    assert limiter.limit == pytest.approx(5.0, abs=0.1)
+
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(1.0, overloaded=False)
+    assert limiter.limit == 5
+
+    limiter.acquire()
+    limiter.release(1.0, overloaded=True)
+    assert limiter.limit == 2.5
+    limiter.acquire()
+    limiter.release(30.0, overloaded=False)
+    limiter.acquire()
+    limiter.release(30.0, overloaded=False)
+    assert limiter.limit == 1
+    assert limiter.in_flight == 0
+
+
+def test_limiter_blocks_beyond_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+
+    assert not acquired.wait(0.1)
+    limiter.release(0.1, overloaded=False)
+    assert acquired.wait(1)
+    waiter.join()
+
+
+def test_breaker_opens_then_lets_one_probe_through(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(adaptive_policy.time, "time", lambda: now[0])
+    breaker = CircuitBreaker("llama", failure_threshold=2, reset_timeout=30)
+
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    now[0] += 30
+    breaker.before_request()
+    # Only the probe goes through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 30
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
+
+
+def test_retry_after_seconds(monkeypatch):
+    monkeypatch.setattr(adaptive_policy, "MAX_RETRY_AFTER", 60)
+    in_ten_seconds = email.utils.formatdate(time.time() + 10, usegmt=True)
+
+    assert retry_after_seconds(FakeResponse({})) is None
+    assert retry_after_seconds(FakeResponse({"Retry-After": "2.5"})) == 2.5
+    assert retry_after_seconds(FakeResponse({"Retry-After": "3600"})) == 60
+    assert retry_after_seconds(FakeResponse({"Retry-After": "-5"})) == 0
+    assert 8 <= retry_after_seconds(FakeResponse({"Retry-After": in_ten_seconds})) <= 10
+    assert retry_after_seconds(FakeResponse({"Retry-After": "soon"})) is None
@@ -0,0 +1,43 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+from answer_cache import lexical_similarity, match_question, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  What was  the Issue?? ") == "what was the issue"
+
+
+def test_match_question_exact_and_paraphrase():
+    candidates = ["What was the customer's issue?", "Why did the customer call?"]
+
+    assert match_question("what was the customer's issue", candidates) == candidates[0]
+    assert match_question("What were the customers issues?", candidates) == candidates[0]
+    assert match_question("Why did the customer call?", candidates) == candidates[1]
+
+
+def test_match_question_rejects_added_qualifier():
+    assert match_question("Why did the customer call twice?", ["Why did the customer call?"]) is None
+    assert match_question(
+        "What did the agent promise to do about the refund?", ["What did the agent promise to do?"]
+    ) is None
+    assert match_question("What was the customer's second issue?", ["What was the customer's issue?"]) is None
+    assert match_question("Why did the customer call us?", ["Why did the customer call?"]) is None
+    # In either direction
+    assert lexical_similarity("What was the customer's issue?", "What was the customer's second issue?") == 0.0
+
+
+def test_match_question_rejects_swapped_role():
+    question = "Did the customer agree to the new price?"
+
+    assert match_question(question, ["Did the agent agree to the new price?"]) is None
+    assert lexical_similarity(question, "Did the agent agree to the new price?") == 0.0
+
+
+def test_match_question_rejects_negation():
+    assert match_question("Was the issue resolved?", ["Was the issue not resolved?"]) is None
+    assert match_question("Wasn't the issue resolved?", ["Was the issue resolved?"]) is None
+
+
+def test_match_question_rejects_unrelated():
+    assert match_question("What product was discussed?", ["Was the customer's issue resolved?"]) is None
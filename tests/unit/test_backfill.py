@@ -0,0 +1,103 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+os.environ.setdefault("UploadsTable", "uploads")
+os.environ.setdefault("BACKFILL_BUCKET", "backfill-bucket")
+
+import backfill  # noqa: E402
+
+
+class FakeContext:
+    function_name = "ci_backfill_fn"
+
+    def __init__(self, aws_request_id):
+        self.aws_request_id = aws_request_id
+
+    def get_remaining_time_in_millis(self):
+        return 15 * 60 * 1000
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket=backfill.CHECKPOINT_BUCKET)
+        monkeypatch.setattr(backfill, "s3_client", s3_client)
+        yield s3_client
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    keys = []
+    monkeypatch.setattr(backfill, "process_conversation", lambda object_key, job: keys.append(object_key) or "updated")
+    return keys
+
+
+def test_post_processing_event_from_stored_outputs(monkeypatch):
+    conversation = {
+        "ConversationAnalytics": {
+            "Summary": {
+                # Refreshed by a re-analysis after the original execution
+                "Summary": "New summary",
+                "Topic": "Refund",
+                "PromptVersions": {"Summarization": "v2"},
+            },
+            "Language": "english",
+            "LanguageCode": "en",
+            "SpeakerTime": {},
+            "TranscriptTokens": {"Original": 100, "Compacted": 80},
+        },
+    }
+    monkeypatch.setattr(backfill.reanalyze, "read_output", lambda bucket, key: (conversation, "etag"))
+    item = {
+        "objectKey": "input/call.wav",
+        "bucketName": "bucket",
+        "outputFile": "output/call/call.json",
+        "contentType": "audio/wav",
+        "summary": "Old summary",
+        "product": "Card",
+    }
+
+    event = backfill.post_processing_event(item)
+
+    assert event["output_s3_key"] == "output/call"
+    assert event["input_file"] == "call"
+    assert event["content_type"] == "audio/wav"
+    assert event["original_transcription_file"] == backfill.AUDIO_TRANSCRIPTION_FILE
+    assert event["dominant_language_code"] == "en"
+    assert event["Summarization"] == "New summary"
+    assert event["Topic"] == "Refund"
+    assert event["Product"] == "Card"
+    assert event["PromptVersions"] == {"Summarization": "v2"}
+    assert event["TranscriptTokens"] == {"Original": 100, "Compacted": 80}
+    assert "silence_trim" not in event
+
+
+def test_handler_names_new_job_after_request(checkpoints, processed):
+    result = backfill.handler({"object_keys": ["a", "b"]}, FakeContext("request-1"))
+
+    assert result == {"job_id": "request-1", "status": "SUCCEEDED", "counts": {"updated": 2, "skipped": 0, "failed": 0}}
+    assert processed == ["a", "b"]
+    assert backfill.load_checkpoint("request-1")["status"] == "SUCCEEDED"
+
+
+def test_handler_retried_invocation_resumes_its_job(checkpoints, processed):
+    job = backfill.new_job({"object_keys": ["a", "b", "c"]}, "request-1")
+    job["pending"] = ["c"]
+    job["counts"]["updated"] = 2
+    backfill.save_checkpoint(job)
+
+    result = backfill.handler({"object_keys": ["a", "b", "c"]}, FakeContext("request-1"))
+
+    assert processed == ["c"]
+    assert result["counts"]["updated"] == 3
+    assert json.loads(
+        checkpoints.get_object(Bucket=backfill.CHECKPOINT_BUCKET, Key="backfill/request-1.json")["Body"].read()
+    )["pending"] == []
@@ -0,0 +1,92 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import corpus_index
+from corpus_index import CorpusIndex
+
+
+@pytest.fixture
+def index():
+    with mock_aws():
+        boto3.resource("dynamodb").create_table(
+            TableName="corpus",
+            KeySchema=[
+                {"AttributeName": "term", "KeyType": "HASH"},
+                {"AttributeName": "docId", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "term", "AttributeType": "S"},
+                {"AttributeName": "docId", "AttributeType": "S"},
+                {"AttributeName": "impact", "AttributeType": "N"},
+            ],
+            LocalSecondaryIndexes=[{
+                "IndexName": corpus_index.IMPACT_INDEX,
+                "KeySchema": [
+                    {"AttributeName": "term", "KeyType": "HASH"},
+                    {"AttributeName": "impact", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["completedAt"]},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield CorpusIndex("corpus")
+
+
+def metadata(completed_at, summary=""):
+    return {"summary": summary, "topic": "Billing", "product": "", "completedAt": completed_at}
+
+
+def test_search_ranks_matching_segments(index):
+    index.index_conversation(
+        "input/a.wav", ["Agent: hello", "Customer: I want a refund for the refund"], metadata("2024-05-02")
+    )
+    index.index_conversation(
+        "input/b.wav", ["Customer: my refund never arrived, the card was charged"], metadata("2024-05-03")
+    )
+    index.index_conversation("input/c.wav", ["Customer: the app keeps crashing"], metadata("2024-05-04"))
+
+    hits = index.search("refund", 10)
+
+    assert [(hit["key"], hit["line"]) for hit in hits] == [("a.wav", 1), ("b.wav", 0)]
+    assert hits[0]["text"] == "Customer: I want a refund for the refund"
+    assert hits[0]["topic"] == "Billing"
+
+
+def test_search_filters_by_date_before_ranking(index, monkeypatch):
+    monkeypatch.setattr(corpus_index, "POSTINGS_PER_PARTITION", 2)
+    # Many stronger matches outside the range must not crowd out the one inside it
+    for i in range(10):
+        index.index_conversation(f"input/old{i}.wav", ["Customer: refund refund refund"], metadata("2024-03-10"))
+    index.index_conversation("input/before.wav", ["Customer: refund refund"], metadata("2024-05-01T08:00:00"))
+    index.index_conversation(
+        "input/new.wav", ["Customer: I asked about a refund and the delivery date"], metadata("2024-05-20T10:00:00")
+    )
+
+    hits = index.search("refund", 3, since="2024-05-14", until="2024-05-21")
+
+    assert [hit["key"] for hit in hits] == ["new.wav"]
+    assert index.search("refund", 3, since="2025-01-01") == []
+
+
+def test_reindex_replaces_postings_and_counts(index):
+    index.index_conversation("input/a.wav", ["Customer: refund please"], metadata("2024-04-30", "Refund request"))
+    index.index_conversation("input/a.wav", ["Customer: where is my parcel"], metadata("2024-05-02"))
+
+    assert index.search("refund", 5) == []
+    assert [hit["key"] for hit in index.search("parcel", 5, since="2024-05-01")] == ["a.wav"]
+    assert index._df("refund") == 0
+    assert index._df("parcel") == 1
+    documents, months = index._stats()
+    assert documents == 1
+    assert {"2024-04", "2024-05"} <= months
+
+
+def test_undated_conversations_only_match_without_a_range(index):
+    index.index_conversation("input/a.wav", ["Customer: refund please"], metadata(""))
+
+    assert [hit["key"] for hit in index.search("refund", 5)] == ["a.wav"]
+    assert index.search("refund", 5, until="2030-01-01") == []
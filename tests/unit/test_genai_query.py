@@ -0,0 +1,67 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+
+import pytest
+
+os.environ.setdefault("UploadsTable", "uploads")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import genai_query  # noqa: E402
+
+
+@pytest.fixture
+def conversation(monkeypatch):
+    monkeypatch.setattr(genai_query.prompt_registry, "get_version", lambda name: "v1")
+    return {
+        "promptVersions": {"PrecomputedAnswers": "v1"},
+        "precomputedAnswers": {
+            "What did the agent promise to do?": "Call back tomorrow.",
+            "Was the customer's issue resolved?": "Yes.",
+        },
+    }
+
+
+def test_precomputed_answer_for_matching_question(conversation):
+    assert genai_query.precomputed_answer(conversation, "what did the agent promise to do") == "Call back tomorrow."
+    assert genai_query.precomputed_answer(conversation, "Was the customers issue resolved?") == "Yes."
+
+
+def test_precomputed_answer_not_served_for_other_role(conversation):
+    assert genai_query.precomputed_answer(conversation, "What did the customer promise to do?") is None
+    assert genai_query.precomputed_answer(conversation, "Was the agent's issue resolved?") is None
+
+
+def test_precomputed_answer_not_served_for_narrower_question(conversation):
+    conversation["precomputedAnswers"]["What was the customer's issue?"] = "A double charge."
+
+    assert genai_query.precomputed_answer(conversation, "What was the customer's second issue?") is None
+    assert genai_query.precomputed_answer(conversation, "What did the agent promise to do next?") is None
+
+
+def test_precomputed_answer_ignored_after_prompt_change(conversation, monkeypatch):
+    monkeypatch.setattr(genai_query.prompt_registry, "get_version", lambda name: "v2")
+
+    assert genai_query.precomputed_answer(conversation, "What did the agent promise to do?") is None
+
+
+def test_stream_worker_writes_only_extend_the_text(monkeypatch):
+    writes = []
+    monkeypatch.setattr(genai_query, "STREAM_FLUSH_INTERVAL", 0)
+    monkeypatch.setattr(genai_query, "get_conversation", lambda key: {"objectKey": key})
+    monkeypatch.setattr(genai_query, "load_transcript", lambda item, query: "Agent: hello\n")
+    monkeypatch.setattr(genai_query.prompt_registry, "get_version", lambda name: "v1")
+    monkeypatch.setattr(genai_query.prompt_registry, "get", lambda name: "{transcript} {question}")
+    monkeypatch.setattr(genai_query, "cache_answer", lambda *args: None)
+    fragments = ["\n ", "The", " answer.", "\n"]
+    monkeypatch.setattr(genai_query.llama_client, "generate_stream", lambda prompt, parameters: iter(fragments))
+    monkeypatch.setattr(genai_query, "write_stream", lambda stream_id, text, done: writes.append(text))
+
+    genai_query.stream_worker({"stream_id": "s", "key": "k", "query": "q"})
+
+    # A client reading each write from its previous offset ends up with the final text
+    received, offset = "", 0
+    for text in writes:
+        received, offset = received + text[offset:], len(text)
+    assert received == writes[-1] == "The answer.\n"
@@ -0,0 +1,107 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import base64
+import json
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import lemonfox_callback
+from lemonfox_jobs import LemonfoxJobs
+
+
+class FakeStepFunctions:
+    def __init__(self):
+        self.calls = []
+
+    def send_task_success(self, taskToken, output):
+        self.calls.append(("success", taskToken, json.loads(output)))
+
+    def send_task_failure(self, taskToken, error, cause):
+        self.calls.append(("failure", taskToken, error))
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    with mock_aws():
+        boto3.resource("dynamodb").create_table(
+            TableName="lemonfox-jobs",
+            KeySchema=[{"AttributeName": "jobId", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "jobId", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        jobs = LemonfoxJobs("lemonfox-jobs", "https://callback.example/")
+        monkeypatch.setattr(lemonfox_callback, "lemonfox_jobs", jobs)
+        yield jobs
+
+
+@pytest.fixture
+def sfn(monkeypatch):
+    sfn = FakeStepFunctions()
+    monkeypatch.setattr(lemonfox_callback, "sfn_client", sfn)
+    return sfn
+
+
+@pytest.fixture
+def completed(monkeypatch):
+    results = []
+    monkeypatch.setattr(
+        lemonfox_callback.diarization, "complete_diarization", lambda event, result: results.append(result)
+    )
+    return results
+
+
+def url_params(url):
+    return {name: values[0] for name, values in parse_qs(urlparse(url).query).items()}
+
+
+def callback_event(url, body, encode=False):
+    params = url_params(url)
+    body = json.dumps(body)
+    if encode:
+        body = base64.b64encode(body.encode("utf-8")).decode("ascii")
+    return {"queryStringParameters": params, "body": body, "isBase64Encoded": encode}
+
+
+def test_claim_requires_the_secret_and_succeeds_once(jobs):
+    url = jobs.register("token", {"key": "input/call.wav"})
+    params = url_params(url)
+
+    assert jobs.claim(params["job"], "wrong") is None
+    job = jobs.claim(params["job"], params["secret"])
+    assert job["taskToken"] == "token"
+    assert job["event"] == {"key": "input/call.wav"}
+    assert jobs.claim(params["job"], params["secret"]) is None
+
+
+def test_handler_resumes_workflow_once(jobs, sfn, completed):
+    url = jobs.register("token", {"key": "input/call.wav"})
+    event = callback_event(url, {"text": "hello", "segments": []}, encode=True)
+
+    assert lemonfox_callback.handler(event, None) == {"statusCode": 200}
+    # Lemonfox retrying the delivery must not resume the workflow again
+    assert lemonfox_callback.handler(event, None) == {"statusCode": 404}
+
+    assert completed == [{"text": "hello", "segments": []}]
+    assert sfn.calls == [("success", "token", {"event": {"key": "input/call.wav"}, "status": "SUCCEEDED"})]
+
+
+def test_handler_fails_task_on_failed_job(jobs, sfn, completed):
+    url = jobs.register("token", {"key": "input/call.wav"})
+
+    assert lemonfox_callback.handler(callback_event(url, {"error": "bad audio"}), None) == {"statusCode": 200}
+
+    assert completed == []
+    assert sfn.calls == [("failure", "token", "LemonfoxJobFailed")]
+
+
+def test_handler_rejects_wrong_secret(jobs, sfn, completed):
+    url = jobs.register("token", {"key": "input/call.wav"})
+    event = callback_event(url, {"text": "hello"})
+    event["queryStringParameters"]["secret"] = "guess"
+
+    assert lemonfox_callback.handler(event, None) == {"statusCode": 404}
+    assert sfn.calls == []
@@ -0,0 +1,68 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+from email import message_from_bytes
+from email.policy import HTTP
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import lemonfox_client
+from lemonfox_client import LemonfoxClient
+
+AUDIO = bytes(range(256)) * 4096
+
+
+@pytest.fixture
+def client(monkeypatch):
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="bucket")
+        s3_client.put_object(Bucket="bucket", Key="input/call.wav", Body=AUDIO, ContentType="audio/wav")
+        client = LemonfoxClient()
+        client.s3_client = s3_client
+        yield client
+
+
+def test_request_body_passes_public_urls_through(client):
+    data = {"file": "https://example.com/call.wav", "language": "english"}
+
+    assert client._request_body(data) == {"headers": client.headers, "data": data}
+
+
+def test_request_body_presigns_s3_locations(client):
+    client.audio_mode = "presigned"
+
+    request = client._request_body({"file": "s3://bucket/input/call.wav", "language": "english"})
+
+    url = urlparse(request["data"]["file"])
+    assert url.path.endswith("/input/call.wav")
+    assert "bucket" in url.netloc + url.path
+    assert url.scheme == "https"
+    assert {"Signature", "X-Amz-Signature"} & set(parse_qs(url.query))
+    assert request["data"]["language"] == "english"
+
+
+def test_request_body_streams_s3_object_as_multipart(client, monkeypatch):
+    monkeypatch.setattr(lemonfox_client, "STREAM_CHUNK_SIZE", 1000)
+    client.audio_mode = "stream"
+
+    request = client._request_body(
+        {"file": "s3://bucket/input/call.wav", "language": "english", "speaker_labels": True}
+    )
+    stream = request["data"]
+    body = b"".join(stream)
+
+    assert len(body) == len(stream)
+    message = message_from_bytes(
+        f"Content-Type: {request['headers']['Content-Type']}\r\n\r\n".encode("utf-8") + body, policy=HTTP
+    )
+    parts = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+    assert parts["language"].get_content() == "english"
+    assert parts["speaker_labels"].get_content() == "true"
+    assert parts["file"].get_filename() == "call.wav"
+    assert parts["file"].get_content_type() == "audio/wav"
+    assert parts["file"].get_payload(decode=True) == AUDIO
+    assert request["headers"]["Authorization"] == client.headers["Authorization"]
@@ -0,0 +1,60 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import http_transport  # noqa: E402
+from llama_client import Llama4ScoutClient  # noqa: E402
+
+
+class FakeStream:
+    status_code = 200
+
+    def __init__(self, fragments):
+        self.timing = {"total": 0.01}
+        self.lines = [f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}" for text in fragments]
+        self.lines.append("data: [DONE]")
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+
+def test_stream_holds_concurrency_slot_until_body_is_read(monkeypatch):
+    client = Llama4ScoutClient()
+    client.limiter = None
+    monkeypatch.setattr(http_transport, "post", lambda session, url, **kwargs: FakeStream(["a", "b"]))
+    endpoint = client.pool.endpoints[0]
+
+    stream = client.generate_stream("prompt", {"use_cache": False})
+    assert next(stream) == "a"
+    assert endpoint.concurrency.in_flight == 1
+    assert endpoint.in_flight == 1
+
+    assert list(stream) == ["b"]
+    assert endpoint.concurrency.in_flight == 0
+    assert endpoint.in_flight == 0
+    assert endpoint.ewma is not None
+
+
+def test_abandoned_stream_releases_concurrency_slot(monkeypatch):
+    client = Llama4ScoutClient()
+    client.limiter = None
+    monkeypatch.setattr(http_transport, "post", lambda session, url, **kwargs: FakeStream(["a", "b"]))
+    endpoint = client.pool.endpoints[0]
+
+    stream = client.generate_stream("prompt", {"use_cache": False})
+    next(stream)
+    stream.close()
+
+    assert endpoint.concurrency.in_flight == 0
+    assert endpoint.in_flight == 0
@@ -0,0 +1,83 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import rate_limiter
+from rate_limiter import DynamoDBTokenBucket, LocalTokenBucket, RateLimitTimeout
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock.time)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_local_bucket_allows_a_burst_then_refills(clock):
+    bucket = LocalTokenBucket("llama", 60)
+
+    assert all(bucket.try_acquire() == 0 for _ in range(60))
+    assert bucket.try_acquire() == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0
+
+
+def test_local_bucket_acquire_waits_for_a_token(clock):
+    bucket = LocalTokenBucket("llama", 60)
+    for _ in range(60):
+        bucket.acquire()
+
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_local_bucket_acquire_gives_up_after_max_wait(clock):
+    bucket = LocalTokenBucket("lemonfox", 6, max_wait=5)
+    for _ in range(6):
+        bucket.acquire()
+
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire()
+
+
+def test_dynamodb_bucket_is_shared_between_instances():
+    with mock_aws():
+        boto3.resource("dynamodb").create_table(
+            TableName="rate-limits",
+            KeySchema=[{"AttributeName": "bucket", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "bucket", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        first = DynamoDBTokenBucket("lemonfox", 3, "rate-limits")
+        second = DynamoDBTokenBucket("lemonfox", 3, "rate-limits")
+
+        assert [first.try_acquire(), second.try_acquire(), first.try_acquire()] == [0, 0, 0]
+        assert second.try_acquire() > 0
+        assert DynamoDBTokenBucket("llama", 3, "rate-limits").try_acquire() == 0
+
+
+def test_get_limiter_by_api_and_model(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RATE_LIMITS", {"llama": 60, "llama:big": 10})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_TABLE", "")
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+    assert rate_limiter.get_limiter("lemonfox") is None
+    assert rate_limiter.get_limiter("llama", "small").capacity == 60
+    assert rate_limiter.get_limiter("llama", "big").capacity == 10
+    assert rate_limiter.get_limiter("llama") is rate_limiter.get_limiter("llama")
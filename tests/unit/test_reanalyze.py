@@ -0,0 +1,94 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+os.environ.setdefault("UploadsTable", "uploads")
+
+import reanalyze  # noqa: E402
+
+
+class FakeContext:
+    function_name = "ci_reanalyze_fn"
+
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms()
+
+
+class FakeLambda:
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.payloads.append(json.loads(Payload))
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    with mock_aws():
+        table = boto3.resource("dynamodb").create_table(
+            TableName="uploads",
+            KeySchema=[{"AttributeName": "objectKey", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "objectKey", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setattr(reanalyze, "table", table)
+        monkeypatch.setattr(reanalyze, "lambda_client", FakeLambda())
+        monkeypatch.setattr(reanalyze, "find_field", lambda prompt: ("Topic", prompt, None))
+        monkeypatch.setattr(reanalyze.summarize.prompt_registry, "invalidate", lambda: None)
+        monkeypatch.setattr(reanalyze.summarize.prompt_registry, "get_version", lambda name: "v2")
+        yield table
+
+
+def test_handler_continues_mid_page_without_repeating_work(uploads, monkeypatch):
+    for i in range(20):
+        uploads.put_item(Item={"objectKey": f"input/{i:02d}.wav", "executionCompletedAt": "2024-05-01"})
+    uploads.put_item(Item={"objectKey": "input/pending.wav"})
+    monkeypatch.setattr(reanalyze, "REANALYSIS_CONCURRENCY", 2)
+    monkeypatch.setattr(reanalyze, "SCAN_PAGE_BATCHES", 4)
+    processed = []
+    monkeypatch.setattr(
+        reanalyze, "reanalyze_conversation", lambda item, fields: processed.append(item["objectKey"]) or "updated"
+    )
+
+    # Time runs out after the first batch of every invocation
+    event = {"prompt": "ci_topic"}
+    for _ in range(50):
+        calls = len(processed)
+        result = reanalyze.handler(event, FakeContext(lambda: 0 if len(processed) > calls else 10 ** 6))
+        if result["status"] == "SUCCEEDED":
+            break
+        event = reanalyze.lambda_client.payloads[-1]
+
+    assert result["status"] == "SUCCEEDED"
+    assert len(reanalyze.lambda_client.payloads) >= 9
+    assert sorted(processed) == [f"input/{i:02d}.wav" for i in range(20)]
+    assert result["counts"] == {"updated": 20, "skipped": 0, "failed": 0}
+
+
+def test_write_output_reapplies_fields_after_a_concurrent_write(monkeypatch):
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="bucket")
+        monkeypatch.setattr(reanalyze, "s3_client", s3_client)
+        original = {"ConversationAnalytics": {"Summary": {"Topic": "old", "Product": "old"}}}
+        s3_client.put_object(Bucket="bucket", Key="out.json", Body=json.dumps(original).encode("utf-8"))
+        conversation, etag = reanalyze.read_output("bucket", "out.json")
+
+        # Another re-analysis rewrites a different field in between
+        concurrent = {"ConversationAnalytics": {"Summary": {"Topic": "old", "Product": "new"}}}
+        s3_client.put_object(Bucket="bucket", Key="out.json", Body=json.dumps(concurrent).encode("utf-8"))
+        reanalyze.write_output("bucket", "out.json", conversation, etag, {"Topic": "new"}, {"Topic": "v2"})
+
+        summary, _ = reanalyze.read_output("bucket", "out.json")
+        assert summary["ConversationAnalytics"]["Summary"] == {
+            "Topic": "new", "Product": "new", "PromptVersions": {"Topic": "v2"}
+        }
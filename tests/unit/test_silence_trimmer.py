@@ -0,0 +1,124 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import struct
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import silence_trimmer
+import windowed_transcription
+from silence_trimmer import ChunkReader, kept_chunks, restore_timestamps, speech_spans, to_original, write_trimmed
+
+OFFSETS = [[0.0, 0.0], [10.0, 15.0], [25.0, 40.0]]
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_chunks(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 100, 4096])
+def test_kept_chunks_is_byte_exact_across_chunk_boundaries(monkeypatch, chunk_size):
+    monkeypatch.setattr(silence_trimmer, "READ_CHUNK_SIZE", chunk_size)
+    body = bytes(range(256)) * 8
+    # Adjacent ranges, ranges inside one chunk, straddling several and ending on the body's end
+    byte_ranges = [(0, 3), (3, 5), (64, 200), (700, 701), (1000, 1900), (2000, 2048)]
+
+    data = b"".join(kept_chunks(b"header", FakeBody(body), byte_ranges))
+
+    assert data == b"header" + b"".join(body[start:end] for start, end in byte_ranges)
+
+
+def test_kept_chunks_without_ranges_yields_only_header():
+    assert b"".join(kept_chunks(b"header", FakeBody(b"x" * 100), [])) == b"header"
+
+
+def test_chunk_reader_reads_requested_sizes():
+    reader = ChunkReader(iter([b"abc", b"", b"defgh", b"ij"]))
+
+    assert [reader.read(4), reader.read(1), reader.read(100), reader.read(1)] == [b"abcd", b"e", b"fghij", b""]
+
+
+def test_to_original_round_trip():
+    for trimmed_start, original_start in OFFSETS:
+        for delta in (0.0, 0.5, 9.999):
+            assert to_original(trimmed_start + delta, OFFSETS) == round(original_start + delta, 3)
+
+
+def test_to_original_end_on_join_stays_with_earlier_span():
+    assert to_original(10.0, OFFSETS) == 15.0
+    assert to_original(10.0, OFFSETS, end=True) == 10.0
+    assert to_original(25.0, OFFSETS, end=True) == 30.0
+
+
+def test_restore_timestamps_moves_segments_and_words():
+    result = {
+        "duration": 30.0,
+        "segments": [
+            {"start": 9.0, "end": 10.0, "words": [{"word": "a", "start": 9.5, "end": 10.0}]},
+            {"start": 10.0, "end": 12.0, "words": [{"word": "b", "start": 10.0, "end": 11.0}]},
+        ],
+    }
+
+    restore_timestamps(result, {"originalSeconds": 50.0, "offsets": OFFSETS})
+
+    assert [(segment["start"], segment["end"]) for segment in result["segments"]] == [(9.0, 10.0), (15.0, 17.0)]
+    assert [(word["start"], word["end"]) for segment in result["segments"] for word in segment["words"]] == [
+        (9.5, 10.0), (15.0, 16.0)
+    ]
+    assert result["duration"] == 50.0
+
+
+def wav_bytes(pcm, sample_rate=8000):
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(pcm)) + pcm
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+def test_write_trimmed_keeps_only_the_spans(monkeypatch):
+    monkeypatch.setattr(silence_trimmer, "READ_CHUNK_SIZE", 1000)
+    pcm = b"".join(struct.pack("<h", i % 30000) for i in range(8000 * 4))
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="bucket")
+        s3_client.put_object(Bucket="bucket", Key="call.wav", Body=wav_bytes(pcm))
+        monkeypatch.setattr(silence_trimmer, "s3_client", s3_client)
+        monkeypatch.setattr(windowed_transcription, "s3_client", s3_client)
+        info = windowed_transcription.read_wav_info("bucket", "call.wav")
+
+        offsets, duration = write_trimmed("bucket", "call.wav", info, [(0.0, 0.5), (1.25, 2.0), (3.5, 4.0)], "out.wav")
+
+        written = s3_client.get_object(Bucket="bucket", Key="out.wav")["Body"].read()
+    kept = pcm[0:8000] + pcm[20000:32000] + pcm[56000:64000]
+    assert written == wav_bytes(kept)
+    assert offsets == [[0.0, 0.0], [0.5, 1.25], [1.25, 3.5]]
+    assert duration == 1.75
+
+
+def test_speech_spans_cuts_long_silences_with_padding(monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(silence_trimmer, "VAD_MIN_SILENCE", 2.0)
+    monkeypatch.setattr(silence_trimmer, "VAD_PADDING", 0.3)
+    frame = silence_trimmer.VAD_FRAME_SECONDS
+    speech, silence = -20.0, -60.0
+    # 1.5 s leading silence, 3 s speech, 1.5 s pause (kept), 3 s speech, 6 s silence, 3 s speech
+    runs = [(silence, 50), (speech, 100), (silence, 50), (speech, 100), (silence, 200), (speech, 100)]
+    energies = np.concatenate([np.full(frames, level) for level, frames in runs])
+    duration = len(energies) * frame
+
+    spans = speech_spans(np, energies, duration)
+
+    assert spans == [(0.0, pytest.approx(9.3)), (pytest.approx(14.7), pytest.approx(duration))]
+
+
+def test_speech_spans_without_speech_keeps_everything():
+    np = pytest.importorskip("numpy")
+
+    assert speech_spans(np, np.full(100, -60.0), 3.0) is None
+    assert speech_spans(np, np.empty(0), 0.0) is None
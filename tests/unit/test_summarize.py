@@ -0,0 +1,62 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import summarize  # noqa: E402
+from transcript_utils import estimate_tokens  # noqa: E402
+
+
+def transcript_of(turns):
+    return "".join(f"{'Agent' if i % 2 else 'Customer'}: turn {i} of the conversation\n" for i in range(turns))
+
+
+def unexpected_map(transcript):
+    raise AssertionError("map_transcript should not be called")
+
+
+def test_reduce_transcript_leaves_short_transcript(monkeypatch):
+    monkeypatch.setattr(summarize, "map_transcript", unexpected_map)
+    transcript = transcript_of(3)
+
+    assert summarize.reduce_transcript(transcript) == transcript
+
+
+def test_reduce_transcript_maps_until_within_budget(monkeypatch):
+    rounds = []
+
+    def halve(transcript):
+        rounds.append(transcript)
+        lines = transcript.splitlines()
+        return "\n".join(lines[:len(lines) // 2]) + "\n"
+
+    monkeypatch.setattr(summarize, "CONTEXT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(summarize, "map_transcript", halve)
+
+    result = summarize.reduce_transcript(transcript_of(40))
+
+    assert len(rounds) == 2
+    assert result == transcript_of(10)
+
+
+def test_reduce_transcript_cuts_notes_still_over_budget(monkeypatch):
+    monkeypatch.setattr(summarize, "CONTEXT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(summarize, "MAX_REDUCE_ROUNDS", 2)
+    monkeypatch.setattr(summarize, "map_transcript", lambda transcript: transcript)
+    transcript = transcript_of(100)
+
+    result = summarize.reduce_transcript(transcript)
+    lines = result.splitlines()
+
+    assert estimate_tokens(result) <= 100
+    assert lines[0] == transcript.splitlines()[0]
+    assert lines[-1] == transcript.splitlines()[-1]
+    assert summarize.OMITTED_MARKER in lines
+
+
+def test_fit_transcript_keeps_transcript_within_budget():
+    transcript = transcript_of(4)
+
+    assert summarize.fit_transcript(transcript, 1000) == transcript
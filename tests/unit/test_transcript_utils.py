@@ -0,0 +1,71 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+from transcript_utils import compact_transcript, estimate_tokens, split_transcript
+
+
+def test_compact_transcript_removes_fillers_and_stutters():
+    transcript = "Agent: Um, so so the the refund is, uh, approved\n\nCustomer:   Great   great.\n"
+
+    assert compact_transcript(transcript, labels=False) == "Agent: so the refund is, approved\nCustomer: Great.\n"
+
+
+def test_compact_transcript_keeps_repeated_digits():
+    transcript = "Customer: my card is 4 4 1 1 2 2 3 3 and the code is 0 0 7, I paid 55 55\n"
+
+    assert compact_transcript(transcript) == transcript
+
+
+def test_compact_transcript_aliases_long_labels():
+    transcript = "Customer Service Agent: Hello\nCaller: Hi\nCustomer Service Agent: How can I help\n"
+
+    assert compact_transcript(transcript, fillers=False) == (
+        "Speakers: S1 = Customer Service Agent\nS1: Hello\nCaller: Hi\nS1: How can I help\n"
+    )
+
+
+def test_compact_transcript_leaves_unlabeled_colons_alone():
+    transcript = "Thanks for calling, your appointment at 10:30 on the 2nd is confirmed, the ratio is 3:1.\n"
+
+    assert compact_transcript(transcript) == transcript
+
+
+def test_compact_transcript_dedupe():
+    transcript = "Agent: Hello?\nAgent: hello?\nCustomer: Hello?\n"
+
+    assert compact_transcript(transcript, dedupe=True) == "Agent: Hello?\nCustomer: Hello?\n"
+
+
+def test_split_transcript_breaks_on_turns_within_budget():
+    transcript = "".join(f"Agent: turn number {i} of the call\n" for i in range(20))
+
+    windows = split_transcript(transcript, 40)
+
+    assert len(windows) > 1
+    assert "".join(windows) == transcript
+    assert all(estimate_tokens(window) <= 40 for window in windows)
+
+
+def test_split_transcript_long_turn_keeps_speaker_on_every_piece():
+    transcript = "Customer: " + " ".join(f"word{i}" for i in range(200)) + "\n"
+
+    windows = split_transcript(transcript, 50)
+    pieces = [line for window in windows for line in window.splitlines()]
+
+    assert len(pieces) > 1
+    assert all(piece.startswith("Customer: ") for piece in pieces)
+    assert all(estimate_tokens(piece) <= 50 for piece in pieces)
+    assert " ".join(piece[len("Customer: "):] for piece in pieces) == transcript[len("Customer: "):].strip()
+
+
+def test_split_transcript_unlabeled_text_gets_no_prefix():
+    sentence = "The appointment moved from 10:30 to 11:15 and the fee is 3:1 against the old plan."
+    transcript = " ".join([sentence] * 40) + "\n"
+
+    windows = split_transcript(transcript, 60)
+    pieces = [line for window in windows for line in window.splitlines()]
+
+    assert len(pieces) > 1
+    assert all(piece.startswith("The appointment") for piece in pieces)
+    assert all(estimate_tokens(piece) <= 60 for piece in pieces)
+    assert sum(len(piece) for piece in pieces) < len(transcript)
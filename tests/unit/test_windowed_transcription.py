@@ -0,0 +1,118 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import io
+import struct
+
+import windowed_transcription
+from windowed_transcription import match_speakers, plan_windows, read_wav_info, stitch
+
+
+def segment(start, end, speaker, text="x", words=None):
+    item = {"start": start, "end": end, "speaker": speaker, "text": text}
+    if words is not None:
+        item["words"] = words
+    return item
+
+
+def test_plan_windows_cover_duration_with_overlap():
+    windows = plan_windows(1500, window=600, overlap=30)
+
+    assert windows == [(0.0, 600), (570, 1170), (1140, 1500)]
+
+
+def test_plan_windows_short_audio_is_one_window():
+    assert plan_windows(100, window=600, overlap=30) == [(0.0, 100)]
+
+
+def test_match_speakers_by_overlap():
+    previous = [segment(570, 590, "SPEAKER_00"), segment(590, 600, "SPEAKER_01")]
+    current = [segment(570, 590, "SPEAKER_01"), segment(590, 600, "SPEAKER_00")]
+    labels = ["SPEAKER_00", "SPEAKER_01"]
+
+    mapping = match_speakers(previous, current, 570, 600, labels)
+
+    assert mapping == {"SPEAKER_01": "SPEAKER_00", "SPEAKER_00": "SPEAKER_01"}
+    assert labels == ["SPEAKER_00", "SPEAKER_01"]
+
+
+def test_match_speakers_silent_in_overlap_takes_free_label():
+    previous = [segment(570, 600, "SPEAKER_00"), segment(100, 200, "SPEAKER_01")]
+    # The second speaker only talks after the overlap
+    current = [segment(570, 600, "SPEAKER_01"), segment(700, 710, "SPEAKER_00")]
+    labels = ["SPEAKER_00", "SPEAKER_01"]
+
+    mapping = match_speakers(previous, current, 570, 600, labels, max_speakers=2)
+
+    assert mapping == {"SPEAKER_01": "SPEAKER_00", "SPEAKER_00": "SPEAKER_01"}
+    assert labels == ["SPEAKER_00", "SPEAKER_01"]
+
+
+def test_match_speakers_never_exceeds_max_speakers():
+    previous = [segment(570, 600, "SPEAKER_00")]
+    current = [segment(570, 600, "SPEAKER_00"), segment(650, 660, "SPEAKER_01"), segment(700, 710, "SPEAKER_02")]
+    labels = ["SPEAKER_00"]
+
+    mapping = match_speakers(previous, current, 570, 600, labels, max_speakers=2)
+
+    assert labels == ["SPEAKER_00", "SPEAKER_01"]
+    assert set(mapping.values()) <= {"SPEAKER_00", "SPEAKER_01"}
+
+
+def test_stitch_cuts_overlap_and_shifts_words():
+    windows = [(0.0, 600), (570, 1000)]
+    results = [
+        {"language": "en", "segments": [segment(0, 10, "SPEAKER_00", " a"), segment(575, 590, "SPEAKER_01", " b")]},
+        {"segments": [
+            # Duplicate of " b" from the first window, and a later turn by the other speaker
+            segment(5, 20, "SPEAKER_00", " b"),
+            segment(100, 110, "SPEAKER_01", " c", words=[{"word": "c", "start": 101, "end": 102}]),
+        ]},
+    ]
+
+    result = stitch(windows, results)
+
+    assert [item["text"] for item in result["segments"]] == [" a", " b", " c"]
+    assert [item["speaker"] for item in result["segments"]] == ["SPEAKER_00", "SPEAKER_01", "SPEAKER_00"]
+    assert result["segments"][2]["start"] == 670
+    assert result["segments"][2]["words"][0]["start"] == 671
+    assert result["text"] == "a b c"
+    assert result["duration"] == 1000
+
+
+def wav_bytes(pcm, sample_rate=8000, extra_chunk=b""):
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunk + b"data" + struct.pack("<I", len(pcm)) + pcm
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(value) for value in Range[len("bytes="):].split("-"))
+        return {
+            "Body": io.BytesIO(self.data[start:end + 1]),
+            "ContentRange": f"bytes {start}-{end}/{len(self.data)}",
+        }
+
+
+def test_read_wav_info_skips_extra_chunks(monkeypatch):
+    pcm = b"\x01\x00" * 16000
+    extra = b"LIST" + struct.pack("<I", 3) + b"abc\x00"
+    monkeypatch.setattr(windowed_transcription, "s3_client", FakeS3(wav_bytes(pcm, extra_chunk=extra)))
+
+    info = read_wav_info("bucket", "key")
+
+    assert info.sample_rate == 8000
+    assert info.data_offset == 12 + 24 + 12 + 8
+    assert info.data_size == len(pcm)
+    assert info.duration == 2.0
+    assert info.header(len(pcm)) + pcm == wav_bytes(pcm)
+
+
+def test_read_wav_info_rejects_other_formats(monkeypatch):
+    monkeypatch.setattr(windowed_transcription, "s3_client", FakeS3(b"ID3" + b"\x00" * 100))
+
+    assert read_wav_info("bucket", "key") is None
@@ -0,0 +1,81 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+"""
+Compare prefill work for the two summarize prompt layouts on one transcript.
+
+Runs every analysis field against the configured Llama endpoints (LLAMA_ENDPOINTS) once per
+layout and reports prompt tokens sent and prompt tokens the server answered from its prefix
+cache. The server has to report usage.prompt_tokens_details.cached_tokens, e.g. vLLM started
+with --enable-prefix-caching --enable-prompt-tokens-details.
+
+    python tools/prefix_cache_benchmark.py transcript.txt [--prompts prompts.json]
+
+Prompts are read from SSM unless a JSON file mapping SSM parameter names to templates is given.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server", "lambdas"))
+# Every request has to reach the server for the cached token counts to mean anything
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+import summarize  # noqa: E402
+from prompt_registry import prompt_version  # noqa: E402
+
+LAYOUTS = ["instruction_first", "transcript_first"]
+
+
+def load_prompts(path):
+    with open(path, "rt") as file:
+        prompts = json.load(file)
+    summarize.prompt_registry.prompts = {
+        name: {"value": value, "version": prompt_version(value)} for name, value in prompts.items()
+    }
+    summarize.prompt_registry.loaded_at = time.time()
+    summarize.prompt_registry.ttl_seconds = float("inf")
+
+
+def run_layout(layout, transcript, name):
+    summarize.PROMPT_LAYOUT = layout
+    # A fresh marker per run keeps earlier runs from warming the server's cache
+    transcript = f"Conversation {uuid.uuid4()}\n{transcript}"
+    usage = dict(summarize.llama_client.usage)
+    started = time.time()
+    summarize.run_analysis_concurrent(transcript)
+    elapsed = time.time() - started
+    report = summarize.report_prefill(name, summarize.llama_client.usage_since(usage))
+    report["Seconds"] = round(elapsed, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcript", help="Transcript text file, one speaker turn per line")
+    parser.add_argument("--prompts", help="JSON file of SSM prompt name -> template")
+    args = parser.parse_args()
+
+    if args.prompts:
+        load_prompts(args.prompts)
+    with open(args.transcript, "rt") as file:
+        transcript = "".join(line.strip() + "\n" for line in file)
+    transcript, tokens = summarize.prepare_transcript(transcript, args.transcript)
+
+    reports = {layout: run_layout(layout, transcript, args.transcript) for layout in LAYOUTS}
+    baseline = reports["instruction_first"]["Prompt"] - reports["instruction_first"]["Cached"]
+    print(f"\nTranscript ~{tokens['Compacted']} tokens, {len(summarize.ANALYSIS_FIELDS)} fields")
+    print(f"{'layout':<20}{'prompt':>10}{'cached':>10}{'prefilled':>12}{'seconds':>10}")
+    for layout, report in reports.items():
+        prefilled = report["Prompt"] - report["Cached"]
+        print(f"{layout:<20}{report['Prompt']:>10}{report['Cached']:>10}{prefilled:>12}{report['Seconds']:>10}")
+    prefilled = reports["transcript_first"]["Prompt"] - reports["transcript_first"]["Cached"]
+    print(f"Prefill tokens saved per conversation: {baseline - prefilled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+"""
+Local stand-in for the Lemonfox and Llama4Scout APIs, for benchmarks and load tests that must not
+touch the paid services.
+
+Serves the contracts the Lambda clients use:
+    POST /v1/chat/completions       OpenAI-compatible, including stream=True server-sent events
+    POST /v1/audio/transcriptions   Lemonfox verbose_json with speaker labels and translation, or an
+                                    immediate acknowledgement and a later POST to callback_url
+
+Latency, failures and response sizes are drawn from configurable distributions. A distribution is
+"fixed:X", "uniform:LOW,HIGH", "normal:MEAN,STDDEV" or "lognormal:MEDIAN,SIGMA" (values in seconds,
+tokens or segments depending on the option).
+
+    python tools/standin_server.py --port 8080 --llama-latency lognormal:1.5,0.6 --error-rate 0.02 \\
+        --burst-every 60 --burst-length 5
+
+Point the clients at it with
+    LLAMA_ENDPOINTS=http://localhost:8080/v1/chat/completions
+    LEMONFOX_BASE_URL=http://localhost:8080/v1
+--replicas N serves N independent replicas on consecutive ports, e.g. to exercise endpoint routing.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+WORDS = (
+    "the customer called about their account and the agent checked the billing details "
+    "before confirming the refund would arrive within five business days thank you for waiting"
+).split()
+CHARS_PER_TOKEN = 4
+
+
+class Distribution:
+    """
+    Samples non-negative values from a distribution spec such as "lognormal:1.5,0.6"
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        values = [float(value) for value in args.split(",") if value]
+        samplers = {
+            "fixed": lambda: values[0],
+            "uniform": lambda: random.uniform(values[0], values[1]),
+            "normal": lambda: random.gauss(values[0], values[1]),
+            "lognormal": lambda: random.lognormvariate(math.log(values[0]), values[1]),
+        }
+        if kind not in samplers:
+            raise argparse.ArgumentTypeError(f"Unknown distribution {spec}")
+        self.sampler = samplers[kind]
+
+    def sample(self):
+        return max(0.0, self.sampler())
+
+    def __repr__(self):
+        return self.spec
+
+
+class FaultInjector:
+    """
+    Decides per request whether to answer with a server error or a 429. Throttling comes from
+    periodic bursts (every burst_every seconds for burst_length seconds) and from an optional
+    requests-per-minute quota, and carries a Retry-After header like the real providers.
+    """
+
+    def __init__(self, error_rate, throttle_rate, burst_every, burst_length, rpm):
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.rpm = rpm
+        self.started = time.time()
+        self.recent = []
+        self.lock = threading.Lock()
+
+    def check(self):
+        """
+        Returns:
+            tuple: HTTP status and Retry-After seconds, or (None, None) to serve the request
+        """
+        now = time.time()
+        if self.burst_every:
+            into_cycle = (now - self.started) % self.burst_every
+            if into_cycle >= self.burst_every - self.burst_length:
+                return 429, math.ceil(self.burst_every - into_cycle)
+        if self.rpm:
+            with self.lock:
+                self.recent = [t for t in self.recent if now - t < 60]
+                if len(self.recent) >= self.rpm:
+                    return 429, math.ceil(60 - (now - self.recent[0]))
+                self.recent.append(now)
+        if random.random() < self.throttle_rate:
+            return 429, 1
+        if random.random() < self.error_rate:
+            return random.choice([500, 502, 503]), None
+        return None, None
+
+
+class StandInState:
+    def __init__(self, args):
+        self.args = args
+        self.faults = FaultInjector(args.error_rate, args.throttle_rate, args.burst_every, args.burst_length, args.rpm)
+        # Hashes of prompt prefixes already "prefilled", to mimic a server-side prefix cache
+        self.prefixes = set()
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+def generate_text(tokens):
+    return " ".join(random.choice(WORDS) for _ in range(max(1, int(tokens))))
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            route = "chat"
+        elif self.path.rstrip("/").endswith("/audio/transcriptions"):
+            route = "transcriptions"
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        status, retry_after = self.state.faults.check()
+        if status is not None:
+            self.state.count(f"{route}:{status}")
+            headers = {"Retry-After": retry_after} if retry_after is not None else None
+            self.send_json(status, {"error": {"message": "Injected failure", "code": status}}, headers)
+            return
+
+        self.state.count(f"{route}:200")
+        if route == "chat":
+            self.chat_completions(json.loads(body or b"{}"))
+        else:
+            self.transcriptions(self.form_fields(body))
+
+    def form_fields(self, body):
+        """
+        Form fields of a urlencoded or multipart request; uploaded file contents are not needed
+        """
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            fields = {}
+            boundary = content_type.split("boundary=", 1)[1].encode("utf-8")
+            for part in body.split(b"--" + boundary):
+                head, _, value = part.partition(b"\r\n\r\n")
+                if b'name="' not in head:
+                    continue
+                name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode("utf-8")
+                fields[name] = value.rstrip(b"\r\n").decode("utf-8", "replace") if b"filename=" not in head else "<upload>"
+            return fields
+        return {name: values[0] for name, values in parse_qs(body.decode("utf-8")).items()}
+
+    def chat_completions(self, request):
+        args = self.state.args
+        messages = request.get("messages", [])
+        prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in messages)
+        # Leading system messages are treated as a cacheable prefix
+        cached_tokens = 0
+        if args.prefix_cache and len(messages) > 1 and messages[0].get("role") == "system":
+            prefix = hashlib.sha256(messages[0]["content"].encode("utf-8")).hexdigest()
+            with self.state.lock:
+                if prefix in self.state.prefixes:
+                    cached_tokens = estimate_tokens(messages[0]["content"])
+                self.state.prefixes.add(prefix)
+        completion_tokens = min(int(request.get("max_tokens", 1024)), max(1, int(args.llama_tokens.sample())))
+        prefill = (prompt_tokens - cached_tokens) / 1000.0 * args.prefill_per_1k
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        model = request.get("model", "llama4scout")
+        text = generate_text(completion_tokens)
+
+        if request.get("stream"):
+            self.stream_completion(model, text, prefill, usage, request.get("stream_options", {}))
+            return
+        time.sleep(prefill + args.llama_latency.sample())
+        self.send_json(200, {
+            "id": f"chatcmpl-{random.getrandbits(64):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def stream_completion(self, model, text, prefill, usage, stream_options):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        time.sleep(prefill + self.state.args.llama_latency.sample())
+
+        def event(choices, extra=None):
+            chunk = {"object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices}
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for word in text.split(" "):
+            event([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+            time.sleep(self.state.args.token_interval)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if stream_options.get("include_usage"):
+            event([], {"usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def transcriptions(self, fields):
+        callback_url = fields.get("callback_url")
+        if not callback_url:
+            self.send_json(200, self.transcription_result(fields))
+            return
+        self.send_json(200, {"status": "accepted"})
+        threading.Thread(target=self.deliver, args=(callback_url, fields), daemon=True).start()
+
+    def deliver(self, callback_url, fields):
+        result = self.transcription_result(fields)
+        request = urllib.request.Request(
+            callback_url,
+            data=json.dumps(result).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                self.state.count(f"callback:{response.status}")
+        except Exception as err:
+            self.state.count("callback:failed")
+            print(f"Callback to {callback_url} failed: {err}")
+
+    def transcription_result(self, fields):
+        args = self.state.args
+        duration = max(1.0, args.audio_seconds.sample())
+        time.sleep(args.lemonfox_latency.sample() + duration * args.realtime_factor)
+
+        speaker_labels = str(fields.get("speaker_labels", "false")).lower() == "true"
+        segment_count = max(1, int(args.segments.sample()))
+        step = duration / segment_count
+        segments = []
+        for i in range(segment_count):
+            segment = {
+                "id": i,
+                "start": round(i * step, 3),
+                "end": round((i + 1) * step, 3),
+                "text": " " + generate_text(max(3, step * 2.5)),
+            }
+            if speaker_labels:
+                segment["speaker"] = f"SPEAKER_{i % 2:02d}"
+            segments.append(segment)
+        result = {
+            "task": "transcribe",
+            "language": fields.get("language", "english"),
+            "duration": round(duration, 3),
+            "text": "".join(segment["text"] for segment in segments).strip(),
+            "segments": segments,
+        }
+        if str(fields.get("translate", "false")).lower() == "true":
+            result["translated_text"] = result["text"]
+        return result
+
+
+def serve(args, port):
+    handler = type("Handler", (StandInHandler,), {"state": StandInState(args)})
+    server = ThreadingHTTPServer((args.host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--replicas", type=int, default=1, help="Independent servers on consecutive ports")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    faults = parser.add_argument_group("fault injection")
+    faults.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 5xx")
+    faults.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    faults.add_argument("--burst-every", type=float, default=0.0, help="Seconds between 429 bursts, 0 disables")
+    faults.add_argument("--burst-length", type=float, default=5.0, help="Seconds each 429 burst lasts")
+    faults.add_argument("--rpm", type=int, default=0, help="Requests per minute before answering 429, 0 disables")
+
+    llama = parser.add_argument_group("chat completions")
+    llama.add_argument("--llama-latency", type=Distribution, default=Distribution("lognormal:1.0,0.5"),
+                       help="Seconds until the first token")
+    llama.add_argument("--llama-tokens", type=Distribution, default=Distribution("lognormal:60,0.8"),
+                       help="Completion tokens, capped at the request's max_tokens")
+    llama.add_argument("--prefill-per-1k", type=float, default=0.05,
+                       help="Extra seconds per 1000 uncached prompt tokens")
+    llama.add_argument("--token-interval", type=float, default=0.02, help="Seconds between streamed tokens")
+    llama.add_argument("--no-prefix-cache", dest="prefix_cache", action="store_false",
+                       help="Never report system message prefixes as cached")
+
+    lemonfox = parser.add_argument_group("transcriptions")
+    lemonfox.add_argument("--lemonfox-latency", type=Distribution, default=Distribution("lognormal:2.0,0.4"),
+                          help="Fixed seconds per transcription request")
+    lemonfox.add_argument("--audio-seconds", type=Distribution, default=Distribution("uniform:60,600"),
+                          help="Simulated audio duration")
+    lemonfox.add_argument("--realtime-factor", type=float, default=0.02,
+                          help="Processing seconds per second of simulated audio")
+    lemonfox.add_argument("--segments", type=Distribution, default=Distribution("uniform:20,120"),
+                          help="Segments per transcript")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    servers = [serve(args, args.port + i) for i in range(args.replicas)]
+    for server in servers:
+        host, port = server.server_address[:2]
+        print(f"Stand-in serving http://{host}:{port}/v1/chat/completions and http://{host}:{port}/v1/audio/transcriptions")
+    try:
+        while True:
+            time.sleep(60)
+            for server in servers:
+                print(f"{server.server_address[1]}: {server.RequestHandlerClass.state.counts}")
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
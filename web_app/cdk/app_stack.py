@@ -1,6 +1,7 @@
 #  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #  SPDX-License-Identifier: MIT-0
 
+import json
 import os
 import typing
 
@@ -78,6 +79,40 @@ class WebAppStack(Stack):
             self, "ci_uploads_table", table_name=uploads_table_name.string_value
         )
 
+        llm_cache_table_name = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ci_llm_cache_ddb_param",
+            string_parameter_name="ci_llm_cache_ddb",
+        )
+
+        llm_cache_table = dynamodb.Table.from_table_name(
+            self, "ci_llm_cache_table", table_name=llm_cache_table_name.string_value
+        )
+
+        rate_limit_table_name = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ci_rate_limit_ddb_param",
+            string_parameter_name="ci_rate_limit_ddb",
+        )
+
+        rate_limit_table = dynamodb.Table.from_table_name(
+            self, "ci_rate_limit_table", table_name=rate_limit_table_name.string_value
+        )
+
+        corpus_index_table_name = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ci_corpus_index_ddb_param",
+            string_parameter_name="ci_corpus_index_ddb",
+        )
+
+        # Index permissions are needed to read postings through the impact index
+        corpus_index_table = dynamodb.Table.from_table_attributes(
+            self,
+            "ci_corpus_index_table",
+            table_name=corpus_index_table_name.string_value,
+            grant_index_permissions=True,
+        )
+
         input_bucket_name = ssm.StringParameter.from_string_parameter_name(
             self,
             "ci_io_bucket_name",
@@ -271,10 +306,31 @@ class WebAppStack(Stack):
 
         input_bucket.grant_read(details_fn.role)
 
+        # Partial /genai answers for streamed queries, expired by TTL once read
+        genai_streams_table = dynamodb.Table(
+            self,
+            "ci_genai_streams",
+            partition_key=dynamodb.Attribute(name="streamId", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+        # Answers to repeated or paraphrased /genai questions, per conversation and prompt version
+        genai_answers_table = dynamodb.Table(
+            self,
+            "ci_genai_answers",
+            partition_key=dynamodb.Attribute(name="conversation", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="questionKey", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
         # Summarization stack to process output json file
+        genai_fn_name = "ci_genai_query_fn"
         genai_fn = _lambda.Function(
             self,
             "genai_query_api_fn",
+            function_name=genai_fn_name,
             runtime=ci_lambda_runtime,
             handler="genai_query.handler",
             timeout=Duration.minutes(15),
@@ -283,10 +339,39 @@ class WebAppStack(Stack):
             environment={
                 "UploadsTable": uploads_table.table_name,
                 "MAX_TOKENS": "1024",
-                "TEMPERATURE": "0.1"
+                "TEMPERATURE": "0.1",
+                "LLM_CACHE_TABLE": llm_cache_table.table_name,
+                "LLM_CACHE_TTL": str(cfg.LLM_CACHE_TTL),
+                "GENAI_STREAMS_TABLE": genai_streams_table.table_name,
+                "ANSWER_CACHE_TABLE": genai_answers_table.table_name,
+                "ANSWER_CACHE_TTL": str(cfg.ANSWER_CACHE_TTL),
+                "ANSWER_CACHE_THRESHOLD": str(cfg.ANSWER_CACHE_THRESHOLD),
+                "LLAMA_ENDPOINTS": ",".join(cfg.LLAMA_API_ENDPOINTS),
+                "LLM_HEDGING": str(cfg.LLAMA_HEDGING).lower(),
+                "RATE_LIMIT_TABLE": rate_limit_table.table_name,
+                "RATE_LIMITS": json.dumps(cfg.RATE_LIMITS)
             },
         )
         genai_fn.grant_invoke(cognito_idp.authenticated_role)
+        llm_cache_table.grant_read_write_data(genai_fn.role)
+        genai_streams_table.grant_read_write_data(genai_fn.role)
+        genai_answers_table.grant_read_write_data(genai_fn.role)
+        rate_limit_table.grant_read_write_data(genai_fn.role)
+        # Streamed queries hand generation to an asynchronous invocation of the same function. The ARN
+        # is built from the fixed name: a grant on the function would make its own role policy depend on it
+        genai_fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    self.format_arn(
+                        service="lambda",
+                        resource="function",
+                        resource_name=genai_fn_name,
+                        arn_format=aws_cdk.ArnFormat.COLON_RESOURCE_NAME,
+                    )
+                ],
+            )
+        )
 
         genai_api = rest_api.root.add_resource("genai")
         genai_with_id = genai_api.add_resource("{key}")
@@ -304,6 +389,55 @@ class WebAppStack(Stack):
         input_bucket.grant_read(genai_fn.role)
         chatbot_prompt.grant_read(genai_fn.role)
 
+        # Search across all conversations, optionally with an LLM answer over the top hits
+        corpus_fn = _lambda.Function(
+            self,
+            "corpus_query_api_fn",
+            runtime=ci_lambda_runtime,
+            handler="corpus_query.handler",
+            timeout=Duration.minutes(2),
+            code=_lambda.Code.from_asset("web_app/lambdas"),
+            role=lambda_role,
+            environment={
+                "CORPUS_INDEX_TABLE": corpus_index_table.table_name,
+                "MAX_TOKENS": "1024",
+                "TEMPERATURE": "0.1",
+                "LLM_CACHE_TABLE": llm_cache_table.table_name,
+                "LLM_CACHE_TTL": str(cfg.LLM_CACHE_TTL),
+                "LLAMA_ENDPOINTS": ",".join(cfg.LLAMA_API_ENDPOINTS),
+                "LLM_HEDGING": str(cfg.LLAMA_HEDGING).lower(),
+                "RATE_LIMIT_TABLE": rate_limit_table.table_name,
+                "RATE_LIMITS": json.dumps(cfg.RATE_LIMITS)
+            },
+        )
+        corpus_fn.grant_invoke(cognito_idp.authenticated_role)
+        corpus_index_table.grant_read_data(corpus_fn.role)
+        llm_cache_table.grant_read_write_data(corpus_fn.role)
+        rate_limit_table.grant_read_write_data(corpus_fn.role)
+
+        corpus_api = rest_api.root.add_resource("corpus")
+        corpus_fn_integration = api_gtwy.LambdaIntegration(
+            credentials_passthrough=True,
+            handler=corpus_fn,
+        )
+        corpus_api.add_method(
+            http_method="ANY",
+            authorization_type=api_gtwy.AuthorizationType(
+                api_gtwy.AuthorizationType.IAM
+            ),
+            integration=corpus_fn_integration,
+        ).grant_execute(cognito_idp.authenticated_role)
+
+        reanalyze_fn_name = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ci_reanalyze_fn_param",
+            string_parameter_name="ci_reanalyze_fn",
+        )
+
+        reanalyze_fn = _lambda.Function.from_function_name(
+            self, "ci_reanalyze_fn", function_name=reanalyze_fn_name.string_value
+        )
+
         prompts_fn = _lambda.Function(
             self,
             "ci_prompts_admin_api_fn",
@@ -311,7 +445,9 @@ class WebAppStack(Stack):
             handler="prompts_admin.handler",
             code=_lambda.Code.from_asset("web_app/lambdas"),
             role=lambda_role,
+            environment={"REANALYZE_FUNCTION": reanalyze_fn.function_name},
         )
+        reanalyze_fn.grant_invoke(prompts_fn)
         prompts_fn.grant_invoke(cognito_idp.authenticated_role)
         prompts_api = rest_api.root.add_resource("prompts")
         prompts_with_id = prompts_api.add_resource("{key}")
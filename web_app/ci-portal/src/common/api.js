@@ -29,6 +29,55 @@ const CIAPI = {
         });
     },
 
+    // Starts a streamed query and polls for new text, calling onText with the answer so far.
+    // Gives up after maxWait ms (the query function's timeout) if the answer never completes
+    async genAiQueryStream(key, query, onText, pollInterval = 250, maxWait = 15 * 60 * 1000) {
+        const apiName = 'ci-api';
+        const path = `/genai/${key}`;
+        const { streamId } = await API.post(apiName, path, {
+            body: {
+                query: query,
+                stream: true
+            }
+        });
+        let text = '';
+        let offset = 0;
+        const deadline = Date.now() + maxWait;
+        for (;;) {
+            const chunk = await API.post(apiName, path, {
+                body: {
+                    stream_id: streamId,
+                    offset: offset
+                }
+            });
+            text += chunk.text;
+            offset = chunk.offset;
+            onText(text);
+            if (chunk.done) {
+                return text;
+            }
+            if (Date.now() > deadline) {
+                throw new Error('Timed out waiting for the streamed answer');
+            }
+            await new Promise(resolve => setTimeout(resolve, pollInterval));
+        }
+    },
+
+    // Ranked segments across all conversations; set answer to also get an LLM summary of the top hits
+    async corpusQuery(query, { topK = 10, since, until, answer = false } = {}) {
+        const apiName = 'ci-api';
+        const path = '/corpus';
+        return await API.post(apiName, path, {
+            body: {
+                query: query,
+                top_k: topK,
+                since: since,
+                until: until,
+                answer: answer
+            }
+        });
+    },
+
     async getDefaultPrompts(){
         const apiName = 'ci-api';
         const path = '/prompts/get';
@@ -117,20 +117,24 @@ const Dashboard = ({ userid }) => {
         setGenAiQueries(currentQueries);
         scrollToBottomOfChat();
 
-        let query_response = await CIAPI.genAiQuery(key, query);
-        const queries = currentQueries.map(query => {
-            if (query.value !== '...') {
-                return query;
-            } else {
-                return {
-                    type: 'manual',
-                    label: query.label,
-                    value: query_response
+        const showResponse = (query_response) => {
+            const queries = currentQueries.map((query, index) => {
+                if (index !== currentQueries.length - 1) {
+                    return query;
+                } else {
+                    return {
+                        type: 'manual',
+                        label: query.label,
+                        value: query_response || '...'
+                    }
                 }
-            }
-        });
-        setGenAiQueries(queries);
-        scrollToBottomOfChat();
+            });
+            setGenAiQueries(queries);
+            scrollToBottomOfChat();
+        }
+
+        let query_response = await CIAPI.genAiQueryStream(key, query, showResponse);
+        showResponse(query_response);
         setGenAiQueryStatus(false);
     }
 
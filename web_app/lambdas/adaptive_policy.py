@@ -0,0 +1,121 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import email.utils
+import os
+import threading
+import time
+
+# AIMD concurrency limits for requests to one endpoint from this container
+CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "4"))
+CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "16"))
+# Responses slower than this count as a congestion signal
+LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "20"))
+CONCURRENCY_BACKOFF = float(os.getenv("LLM_CONCURRENCY_BACKOFF", "0.5"))
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+
+MAX_RETRY_AFTER = float(os.getenv("LLM_MAX_RETRY_AFTER", "60"))
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the endpoint is considered unhealthy
+    """
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Additive-increase / multiplicative-decrease cap on in-flight requests.
+    The limit grows by one per window of successful, fast responses and is cut by
+    CONCURRENCY_BACKOFF on throttling, server errors, timeouts or slow responses.
+    """
+
+    def __init__(self, initial=None, minimum=None, maximum=None, latency_target=None):
+        self.minimum = minimum or CONCURRENCY_MIN
+        self.maximum = maximum or CONCURRENCY_MAX
+        self.limit = float(initial or CONCURRENCY_INITIAL)
+        self.latency_target = latency_target or LATENCY_TARGET
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, overloaded):
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * CONCURRENCY_BACKOFF)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated endpoint failures and lets a single probe through once
+    the reset timeout has passed
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or BREAKER_RESET_TIMEOUT
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = self.HALF_OPEN
+                return
+            if self.state == self.HALF_OPEN:
+                # A probe is already in flight
+                raise CircuitOpenError(f"{self.name} circuit is half-open")
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Opening {self.name} circuit after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+
+def retry_after_seconds(response):
+    """
+    Seconds requested by a Retry-After header (delta-seconds or HTTP date), capped at
+    MAX_RETRY_AFTER, or None when the header is absent or unparseable
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER)
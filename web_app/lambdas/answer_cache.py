@@ -0,0 +1,175 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import hashlib
+import math
+import os
+import re
+import time
+from collections import Counter
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from segment_index import EMBEDDING_MODEL, TOKEN_PATTERN, get_embedding_model
+
+ANSWER_CACHE_TABLE = os.getenv("ANSWER_CACHE_TABLE", "")
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(30 * 24 * 3600)))
+# Minimum similarity for a paraphrased question to reuse a cached answer: cosine of the question
+# embeddings, or of their content words when no embedding model is configured (1 = exact matches only)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_LEXICAL_THRESHOLD = float(os.getenv("ANSWER_CACHE_LEXICAL_THRESHOLD", "0.75"))
+# Cached questions compared per lookup in the semantic tier
+SEMANTIC_CANDIDATES = 100
+# Without an embedding model, questions are compared as bags of words. Question words are kept
+# because they change the answer. Questions that differ in negation never match, and neither do
+# questions where each has a word the other lacks ("customer" for "agent"): a swapped role, entity
+# or question word asks something else, so only added or dropped words are tolerated.
+LEXICAL_MODEL = "lexical"
+QUESTION_STOPWORDS = frozenset(
+    "a an the is was were are be been being do does did to of for in on at by with and this that it its "
+    "please can could would you tell me about there any get got".split()
+)
+QUESTION_SYNONYMS = {"which": "what", "whom": "who"}
+NEGATIONS = frozenset("not no never nothing none".split())
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+def question_tokens(question):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(question):
+        if token.endswith("n't"):
+            token = "not"
+        elif token in QUESTION_STOPWORDS:
+            continue
+        elif token.endswith("'s"):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            # Crude plural folding so "issues", "issue" and "issue's" match
+            token = token[:-1]
+        tokens.append(QUESTION_SYNONYMS.get(token, token))
+    return tokens
+
+
+def lexical_similarity(a, b):
+    a, b = Counter(question_tokens(a)), Counter(question_tokens(b))
+    if NEGATIONS.intersection(a) != NEGATIONS.intersection(b):
+        return 0.0
+    # A word only one question has is a qualifier ("second", "billing") or a substitution that changes
+    # what is asked, so it is a different question however much else they share
+    if set(a) != set(b):
+        return 0.0
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return sum(a[token] * b[token] for token in a) / norm if norm else 0.0
+
+
+def match_question(question, candidates, threshold=None):
+    """
+    The candidate question closest in wording to the given one
+
+    Returns:
+        str: Matching candidate, or None if none reaches the lexical threshold
+    """
+    threshold = ANSWER_CACHE_LEXICAL_THRESHOLD if threshold is None else threshold
+    question = normalize_question(question)
+    best, best_score = None, 0.0
+    for candidate in candidates:
+        score = 1.0 if normalize_question(candidate) == question else lexical_similarity(question, normalize_question(candidate))
+        if score > best_score:
+            best, best_score = candidate, score
+    return best if best_score >= threshold else None
+
+
+class AnswerCache:
+    """
+    /genai answers keyed on conversation, prompt version and normalised question. Exact repeats are a
+    single key lookup; paraphrases are matched by embedding similarity (or, with no embedding model
+    configured, by having the same content words) against the conversation's other cached questions.
+    Entries are ignored once the conversation has been reprocessed, and a prompt change moves lookups
+    to a new key prefix, so stale answers are never served and simply expire through the table TTL.
+    """
+
+    def __init__(self, table_name=None, threshold=None):
+        self.table = boto3.resource("dynamodb").Table(table_name or ANSWER_CACHE_TABLE)
+        self.threshold = ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.lexical_threshold = ANSWER_CACHE_LEXICAL_THRESHOLD if threshold is None else threshold
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    @staticmethod
+    def question_key(prompt_version, question):
+        digest = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()[:32]
+        return f"{prompt_version}#{digest}"
+
+    def _embed(self, question):
+        model = get_embedding_model()
+        if model is None:
+            return LEXICAL_MODEL, None
+        return EMBEDDING_MODEL, [float(value) for value in model.encode([question], normalize_embeddings=True)[0]]
+
+    def _similarity(self, question, vector, model_name, item):
+        if item.get("embeddingModel") != model_name:
+            return 0.0
+        if vector is None:
+            return lexical_similarity(question, item["question"])
+        return sum(a * float(b) for a, b in zip(vector, item["embedding"]))
+
+    def get(self, conversation, conversation_version, prompt_version, question):
+        """
+        Returns:
+            str: Cached answer, or None on a miss
+        """
+        now = int(time.time())
+        question = normalize_question(question)
+        item = self.table.get_item(
+            Key={"conversation": conversation, "questionKey": self.question_key(prompt_version, question)}
+        ).get("Item")
+        if item and item["conversationVersion"] == conversation_version and item["expiresAt"] > now:
+            self.stats["exact_hits"] += 1
+            return item["answer"]
+
+        if self.threshold < 1:
+            model_name, vector = self._embed(question)
+            page = self.table.query(
+                KeyConditionExpression=Key("conversation").eq(conversation)
+                & Key("questionKey").begins_with(f"{prompt_version}#"),
+                Limit=SEMANTIC_CANDIDATES,
+            )
+            threshold = self.threshold if vector is not None else self.lexical_threshold
+            best, best_score = None, 0.0
+            for candidate in page["Items"]:
+                if candidate["conversationVersion"] != conversation_version or candidate["expiresAt"] <= now:
+                    continue
+                score = self._similarity(question, vector, model_name, candidate)
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is not None and best_score >= threshold:
+                print(f"Semantic cache hit ({best_score:.3f}): '{question}' ~ '{best['question']}'")
+                self.stats["semantic_hits"] += 1
+                return best["answer"]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, conversation, conversation_version, prompt_version, question, answer):
+        question = normalize_question(question)
+        model_name, vector = self._embed(question)
+        item = {
+            "conversation": conversation,
+            "questionKey": self.question_key(prompt_version, question),
+            "question": question,
+            "answer": answer,
+            "conversationVersion": conversation_version,
+            "embeddingModel": model_name,
+            "expiresAt": int(time.time()) + ANSWER_CACHE_TTL,
+        }
+        if vector is not None:
+            item["embedding"] = [Decimal(str(round(value, 5))) for value in vector]
+        self.table.put_item(Item=item)
+
+    def report(self):
+        print(f"Answer cache stats: {self.stats}")
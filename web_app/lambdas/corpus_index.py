@@ -0,0 +1,332 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import math
+import os
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+
+from segment_index import BM25_B, BM25_K1, tokenize
+
+CORPUS_INDEX_TABLE = os.getenv("CORPUS_INDEX_TABLE", "")
+# Local secondary index ordering each posting partition by its precomputed BM25 weight
+IMPACT_INDEX = "impact"
+# Highest-impact postings read per query term and posting partition; bounds query cost per partition
+POSTINGS_PER_PARTITION = int(os.getenv("CORPUS_POSTINGS_PER_PARTITION", "200"))
+MAX_QUERY_TERMS = 8
+INDEX_WORKERS = int(os.getenv("CORPUS_INDEX_WORKERS", "16"))
+SEARCH_WORKERS = int(os.getenv("CORPUS_SEARCH_WORKERS", "32"))
+# Writes for a term (and for the counters) are spread over this many partitions by conversation.
+# Changing it requires rebuilding the index.
+INDEX_SHARDS = int(os.getenv("CORPUS_INDEX_SHARDS", "4"))
+
+# Item layout (partition key "term", sort key "docId"):
+#   <term>#<month>#<shard>, <objectKey>#<line>  posting with its BM25 term-frequency weight ("impact")
+#                                               and the conversation's completedAt
+#   #df#<term>, <shard>                         number of documents (segments and summaries) containing the term
+#   #conv#<objectKey>, #meta                    per-term document counts, segment count and summary fields
+#                                               of a conversation
+#   #conv#<objectKey>, seg#<line>               segment text
+#   #stats, <shard>                             number of indexed documents and the months they cover
+# Postings are bucketed by the month the conversation completed in, so a date-restricted search only
+# ranks postings from inside the range, and no term's postings grow into a single hot partition.
+META_ID = "#meta"
+STATS_PARTITION = "#stats"
+# Month bucket of conversations without a completion time; only searched without a date range
+UNDATED = "undated"
+SUMMARY_LINE = "summary"
+BATCH_GET_SIZE = 100
+
+
+def conversation_partition(object_key):
+    return f"#conv#{object_key}"
+
+
+def conversation_shard(object_key):
+    return str(zlib.crc32(object_key.encode("utf-8")) % INDEX_SHARDS)
+
+
+def month_bucket(completed_at):
+    return completed_at[:7] if completed_at else UNDATED
+
+
+def posting_partition(term, month, shard):
+    return f"{term}#{month}#{shard}"
+
+
+def df_partition(term):
+    return f"#df#{term}"
+
+
+def line_id(line):
+    return f"{line:05d}" if isinstance(line, int) else line
+
+
+def summary_text(summary, topic, product):
+    return f"Summary: {summary}\nTopic: {topic}\nProduct: {product}"
+
+
+def term_impacts(documents):
+    """
+    BM25 term-frequency weight of every term in every document, normalised by the
+    conversation's average document length. Multiplied by the term's idf at query time.
+
+    Args:
+        documents (dict): line id -> text
+
+    Returns:
+        dict: term -> {line id: weight}
+    """
+    terms = {line: Counter(tokenize(text)) for line, text in documents.items()}
+    lengths = {line: sum(counts.values()) for line, counts in terms.items()}
+    avgdl = sum(lengths.values()) / len(lengths) if lengths else 0.0
+    impacts = {}
+    for line, counts in terms.items():
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[line] / (avgdl or 1))
+        for term, frequency in counts.items():
+            impacts.setdefault(term, {})[line] = frequency * (BM25_K1 + 1) / (frequency + norm)
+    return impacts
+
+
+class CorpusIndex:
+    """
+    Inverted index over the speech segments and summary fields of every conversation, kept in
+    DynamoDB so a query reads a bounded number of postings instead of scanning S3
+    """
+
+    def __init__(self, table_name=None):
+        self.dynamodb = boto3.resource("dynamodb")
+        self.table = self.dynamodb.Table(table_name or CORPUS_INDEX_TABLE)
+
+    def _get(self, key):
+        return self.table.get_item(Key=key).get("Item")
+
+    def _batch_get(self, keys):
+        items = []
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            request = {self.table.name: {"Keys": keys[i:i + BATCH_GET_SIZE]}}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                items.extend(response["Responses"].get(self.table.name, []))
+                request = response.get("UnprocessedKeys")
+        return items
+
+    def _query_all(self, **query_kwargs):
+        items = []
+        while True:
+            page = self.table.query(**query_kwargs)
+            items.extend(page["Items"])
+            if "LastEvaluatedKey" not in page:
+                return items
+            query_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    def _postings(self, partition, object_key):
+        return self._query_all(
+            KeyConditionExpression=Key("term").eq(partition) & Key("docId").begins_with(f"{object_key}#"),
+            ProjectionExpression="#term, docId",
+            ExpressionAttributeNames={"#term": "term"},
+        )
+
+    def _adjust_df(self, term, shard, delta):
+        self.table.update_item(
+            Key={"term": df_partition(term), "docId": shard},
+            UpdateExpression="ADD df :delta",
+            ExpressionAttributeValues={":delta": delta},
+        )
+
+    def index_conversation(self, object_key, segments, metadata):
+        """
+        Replace everything indexed for a conversation
+
+        Args:
+            object_key (str): Uploads table key of the conversation
+            segments (list): Speaker-labelled segment texts in transcript order
+            metadata (dict): summary, topic, product and completedAt of the conversation
+        """
+        partition = conversation_partition(object_key)
+        shard = conversation_shard(object_key)
+        previous = self._get({"term": partition, "docId": META_ID}) or {}
+        old_counts = {term: int(count) for term, count in previous.get("terms", {}).items()}
+        old_segments = int(previous.get("segments", 0))
+        old_documents = int(previous.get("documents", 0))
+        # Re-analysis can move the completion time, and with it the postings' month
+        old_month = month_bucket(previous.get("completedAt", ""))
+        completed_at = metadata.get("completedAt", "")
+        month = month_bucket(completed_at)
+
+        documents = {line_id(line): text for line, text in enumerate(segments)}
+        if metadata.get("summary"):
+            documents[SUMMARY_LINE] = summary_text(
+                metadata.get("summary", ""), metadata.get("topic", ""), metadata.get("product", "")
+            )
+        impacts = term_impacts(documents)
+        new_counts = {term: len(lines) for term, lines in impacts.items()}
+        df_changes = {
+            term: new_counts.get(term, 0) - old_counts.get(term, 0)
+            for term in set(new_counts) | set(old_counts)
+        }
+
+        with ThreadPoolExecutor(max_workers=INDEX_WORKERS) as executor:
+            stale = [
+                posting
+                for postings in executor.map(
+                    lambda term: self._postings(posting_partition(term, old_month, shard), object_key), old_counts
+                )
+                for posting in postings
+            ]
+            list(executor.map(
+                lambda change: self._adjust_df(change[0], shard, change[1]),
+                [(term, delta) for term, delta in df_changes.items() if delta],
+            ))
+
+        with self.table.batch_writer(overwrite_by_pkeys=["term", "docId"]) as batch:
+            for posting in stale:
+                batch.delete_item(Key={"term": posting["term"], "docId": posting["docId"]})
+            for line in range(len(segments), old_segments):
+                batch.delete_item(Key={"term": partition, "docId": f"seg#{line_id(line)}"})
+            if SUMMARY_LINE not in documents and old_documents > old_segments:
+                batch.delete_item(Key={"term": partition, "docId": f"seg#{SUMMARY_LINE}"})
+            for term, lines in impacts.items():
+                for line, impact in lines.items():
+                    batch.put_item(Item={
+                        "term": posting_partition(term, month, shard),
+                        "docId": f"{object_key}#{line}",
+                        "impact": Decimal(str(round(impact, 4))),
+                        "completedAt": completed_at,
+                    })
+            for line, text in documents.items():
+                batch.put_item(Item={"term": partition, "docId": f"seg#{line}", "text": text})
+            batch.put_item(Item={
+                "term": partition,
+                "docId": META_ID,
+                "objectKey": object_key,
+                "terms": new_counts,
+                "segments": len(segments),
+                "documents": len(documents),
+                **{name: value for name, value in metadata.items() if value},
+            })
+
+        self.table.update_item(
+            Key={"term": STATS_PARTITION, "docId": shard},
+            UpdateExpression="ADD documents :delta, months :month",
+            ExpressionAttributeValues={":delta": len(documents) - old_documents, ":month": {month}},
+        )
+        print(f"Indexed {len(documents)} documents and {len(new_counts)} terms for {object_key}")
+
+    def _stats(self):
+        """
+        Returns:
+            tuple: (number of indexed documents, months holding postings)
+        """
+        shards = self._query_all(KeyConditionExpression=Key("term").eq(STATS_PARTITION))
+        documents = sum(int(item.get("documents", 0)) for item in shards)
+        months = set().union(*(item.get("months", set()) for item in shards))
+        return documents, months
+
+    def _df(self, term):
+        shards = self._query_all(KeyConditionExpression=Key("term").eq(df_partition(term)))
+        return sum(int(item["df"]) for item in shards)
+
+    def _partition_candidates(self, term, month, shard, since, until):
+        query_kwargs = {
+            "IndexName": IMPACT_INDEX,
+            "KeyConditionExpression": Key("term").eq(posting_partition(term, month, shard)),
+            "ScanIndexForward": False,
+            "Limit": POSTINGS_PER_PARTITION,
+        }
+        # Only the first and last month of a range hold conversations outside it
+        condition = None
+        if since and month == since[:7]:
+            condition = Attr("completedAt").gte(since)
+        if until and month == until[:7]:
+            upper = Attr("completedAt").lte(until)
+            condition = upper if condition is None else condition & upper
+        if condition is None:
+            return term, self.table.query(**query_kwargs)["Items"]
+        # A filtered page can come back short, so keep reading until the partition's share is found
+        query_kwargs["FilterExpression"] = condition
+        postings = []
+        while len(postings) < POSTINGS_PER_PARTITION:
+            page = self.table.query(**query_kwargs)
+            postings.extend(page["Items"])
+            if "LastEvaluatedKey" not in page:
+                break
+            query_kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        return term, postings[:POSTINGS_PER_PARTITION]
+
+    def search(self, query, top_k, since=None, until=None):
+        """
+        Segments across all conversations ranked by BM25, optionally restricted to conversations
+        completed within [since, until] (ISO-8601 strings)
+
+        Returns:
+            list: Hits with conversation key, line, score, text and the conversation's summary fields
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        documents, months = self._stats()
+        total = max(1, documents)
+        if since or until:
+            months = {
+                month for month in months
+                if month != UNDATED and (not since or month >= since[:7]) and (not until or month <= until[:7])
+            }
+        if not months:
+            return []
+
+        partitions = [
+            (term, month, str(shard), since, until)
+            for term in terms for month in sorted(months) for shard in range(INDEX_SHARDS)
+        ]
+        scores = {}
+        with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+            dfs = dict(zip(terms, executor.map(self._df, terms)))
+            idfs = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in dfs.items()}
+            for term, postings in executor.map(lambda args: self._partition_candidates(*args), partitions):
+                for posting in postings:
+                    scores[posting["docId"]] = scores.get(posting["docId"], 0.0) + idfs[term] * float(posting["impact"])
+
+        # Postings of a conversation being re-indexed can outlive its metadata, so rank a few spare candidates
+        candidates = sorted(scores, key=scores.get, reverse=True)[:top_k * 5]
+        object_keys = {doc_id.rsplit("#", 1)[0] for doc_id in candidates}
+        metas = {
+            item["objectKey"]: item
+            for item in self._batch_get([
+                {"term": conversation_partition(object_key), "docId": META_ID} for object_key in object_keys
+            ])
+        }
+
+        hits = []
+        for doc_id in candidates:
+            object_key, line = doc_id.rsplit("#", 1)
+            meta = metas.get(object_key)
+            if meta is None:
+                continue
+            hits.append({
+                "objectKey": object_key,
+                "key": object_key.split("/", 1)[-1],
+                "line": int(line) if line.isdigit() else line,
+                "score": round(scores[doc_id], 4),
+                "completedAt": meta.get("completedAt", ""),
+                "topic": meta.get("topic", ""),
+                "product": meta.get("product", ""),
+            })
+            if len(hits) == top_k:
+                break
+
+        texts = {
+            (item["term"], item["docId"]): item["text"]
+            for item in self._batch_get([
+                {"term": conversation_partition(hit["objectKey"]), "docId": f"seg#{line_id(hit['line'])}"}
+                for hit in hits
+            ])
+        }
+        for hit in hits:
+            hit["text"] = texts.get((conversation_partition(hit["objectKey"]), f"seg#{line_id(hit['line'])}"), "")
+        return hits
@@ -0,0 +1,82 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import json
+import os
+from decimal import Decimal
+
+from corpus_index import CorpusIndex
+from llama_client import Llama4ScoutClient
+
+print("Loading Corpus Query Fn...")
+corpus_index = CorpusIndex()
+
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1024"))
+TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
+CORPUS_TOP_K = int(os.getenv("CORPUS_TOP_K", "10"))
+CORPUS_MAX_TOP_K = 50
+# Hits passed to the LLM when a synthesized answer is requested
+CORPUS_ANSWER_HITS = int(os.getenv("CORPUS_ANSWER_HITS", "10"))
+CORPUS_PROMPT = (
+    "You are an AI assistant answering a question about many customer service conversations. "
+    "Use only the numbered excerpts below, each taken from the conversation named in brackets. "
+    "Cite the excerpt numbers you rely on. If the excerpts do not answer the question, "
+    "reply with 'Sorry, I don't know.'\n\n"
+    "Question: {question}\n\n"
+    "Excerpts:\n{excerpts}\n\n"
+    "Answer:"
+)
+
+llama_client = Llama4ScoutClient()
+
+
+class JSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+def synthesize_answer(question, hits):
+    excerpts = "\n".join(
+        f"[{i + 1}] ({hit['key']}) {hit['text']}" for i, hit in enumerate(hits[:CORPUS_ANSWER_HITS])
+    )
+    prompt = CORPUS_PROMPT.replace("{question}", question).replace("{excerpts}", excerpts)
+    return llama_client.generate_response(prompt, {"temperature": TEMPERATURE, "max_tokens": MAX_TOKENS})
+
+
+def get_response():
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Headers": "*",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+        },
+    }
+
+
+def handler(event, context):
+    """
+    Search every processed conversation.
+
+    Expects {"query": ..., "top_k"?: int, "since"?: ISO date, "until"?: ISO date, "answer"?: bool}
+    and returns the ranked segments with their conversation keys, plus an LLM answer over the
+    top hits when "answer" is set.
+    """
+    request = json.loads(event["body"])
+    payload = get_response()
+    try:
+        top_k = max(1, min(CORPUS_MAX_TOP_K, int(request.get("top_k", CORPUS_TOP_K))))
+        hits = corpus_index.search(request["query"], top_k, request.get("since"), request.get("until"))
+        result = {"hits": hits}
+        if request.get("answer"):
+            result["answer"] = synthesize_answer(request["query"], hits) if hits else "Sorry, I don't know."
+        print(f"Corpus query returned {len(hits)} hits")
+    except Exception as err:
+        print(f"Corpus query failed: {err}")
+        payload["statusCode"] = 500
+        return payload
+
+    payload["body"] = json.dumps(result, cls=JSONEncoder)
+    return payload
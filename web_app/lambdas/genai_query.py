@@ -3,9 +3,15 @@
 
 import json
 import os
+import time
+import uuid
+from functools import lru_cache
 
 import boto3
+import segment_index
+from answer_cache import ANSWER_CACHE_TABLE, AnswerCache, match_question
 from llama_client import Llama4ScoutClient
+from prompt_registry import PromptRegistry, SSM_LLM_CHATBOT_NAME
 
 print("Loading Gen AI Query Fn...")
 s3_client = boto3.client("s3")
@@ -13,14 +19,32 @@ ssm_client = boto3.client("ssm")
 tableName = os.environ["UploadsTable"]
 table = boto3.resource("dynamodb").Table(tableName)
 s3_resource = boto3.resource("s3")
+lambda_client = boto3.client("lambda")
 
 # Llama4Scout Configuration
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1024"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
 
+# Streaming answers are written incrementally to this table and polled by the client
+STREAMS_TABLE = os.getenv("GENAI_STREAMS_TABLE", "")
+streams_table = boto3.resource("dynamodb").Table(STREAMS_TABLE) if STREAMS_TABLE else None
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.25"))
+STREAM_TTL = int(os.getenv("STREAM_TTL", "3600"))
+
+# Retrieval: transcripts longer than RAG_MIN_TOKENS are reduced to the RAG_TOP_K most relevant
+# segments plus RAG_NEIGHBOURS turns either side, using the index built at post-processing
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true") == "true"
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+RAG_NEIGHBOURS = int(os.getenv("RAG_NEIGHBOURS", "1"))
+RAG_MIN_TOKENS = int(os.getenv("RAG_MIN_TOKENS", "1500"))
+CHARS_PER_TOKEN = 4
+
+# Repeated and paraphrased questions are answered from the cache without reading the transcript
+answer_cache = AnswerCache() if ANSWER_CACHE_TABLE else None
+
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
-SSM_LLM_CHATBOT_NAME = "ci_chatbot_prompt"
+prompt_registry = PromptRegistry(ssm_client, [SSM_LLM_CHATBOT_NAME])
 
 # Initialize Llama4Scout client
 llama_client = Llama4ScoutClient()
@@ -33,15 +57,20 @@ def call_llama(parameters, prompt):
     return llama_client.generate_response(prompt, parameters)
 
 
-def generate_llama_query(prompt, transcript, question):
-    """
-    Generate query using Llama4Scout instead of Bedrock
-    """
+def render_prompt(prompt, transcript, question):
     # Clean up prompt formatting
     prompt = prompt.replace("<br>", "\n")
     prompt = prompt.replace("{transcript}", transcript)
     if question != "":
         prompt = prompt.replace("{question}", question)
+    return prompt
+
+
+def generate_llama_query(prompt, transcript, question):
+    """
+    Generate query using Llama4Scout instead of Bedrock
+    """
+    prompt = render_prompt(prompt, transcript, question)
     
     parameters = {
         "temperature": TEMPERATURE,
@@ -52,6 +81,209 @@ def generate_llama_query(prompt, transcript, question):
     return generated_text
 
 
+@lru_cache(maxsize=32)
+def load_segment_index(s3_bucket, index_key, version):
+    # The index key is the same for every run on a conversation; version (its
+    # executionCompletedAt) keeps a warm container from serving the index of an earlier run
+    s3_obj = s3_client.get_object(Bucket=s3_bucket, Key=index_key)
+    return json.loads(s3_obj["Body"].read().decode("utf-8"))
+
+
+def retrieve_context(item, transcript, question):
+    """
+    Relevant excerpt of a long transcript for the question, or the whole transcript when it is
+    short, has no index or nothing in it matches
+    """
+    if not RAG_ENABLED or "segmentIndexFile" not in item or len(transcript) / CHARS_PER_TOKEN <= RAG_MIN_TOKENS:
+        return transcript
+    try:
+        index = load_segment_index(item["bucketName"], item["segmentIndexFile"], conversation_version(item))
+    except Exception as err:
+        print(f"Segment index unavailable, sending the full transcript: {err}")
+        return transcript
+    excerpt = segment_index.select_context(index, question, RAG_TOP_K, RAG_NEIGHBOURS)
+    if excerpt is None:
+        return transcript
+    print(f"Retrieved ~{len(excerpt) // CHARS_PER_TOKEN} of ~{len(transcript) // CHARS_PER_TOKEN} transcript tokens")
+    return excerpt
+
+
+def get_conversation(key):
+    """
+    Returns:
+        dict: Uploads table item of the conversation, or None if it is unknown
+    """
+    return table.get_item(
+        Key={"objectKey": "input/" + key},
+        ConsistentRead=True,
+    ).get("Item")
+
+
+def conversation_version(item):
+    # Set again whenever the conversation is reprocessed, which invalidates its cached answers
+    return item.get("executionCompletedAt", "")
+
+
+def precomputed_answer(item, question):
+    """
+    Answer generated at ingest time for a standard question, if the question matches one and the
+    chatbot prompt has not changed since. A match is the same normalised question or one that only
+    adds or drops words; a question about another role or subject never matches.
+    """
+    answers = item.get("precomputedAnswers") or {}
+    if not answers:
+        return None
+    if item.get("promptVersions", {}).get("PrecomputedAnswers") != prompt_registry.get_version(SSM_LLM_CHATBOT_NAME):
+        return None
+    match = match_question(question, answers)
+    return answers[match] if match is not None else None
+
+
+def get_cached_answer(item, question):
+    answer = precomputed_answer(item, question)
+    if answer is not None:
+        print(f"Answered '{question}' from the precomputed answers")
+        return answer
+    if answer_cache is None:
+        return None
+    try:
+        answer = answer_cache.get(
+            item["objectKey"],
+            conversation_version(item),
+            prompt_registry.get_version(SSM_LLM_CHATBOT_NAME),
+            question,
+        )
+    except Exception as err:
+        print(f"Answer cache lookup failed: {err}")
+        return None
+    answer_cache.report()
+    return answer
+
+
+def cache_answer(item, question, answer, prompt_version):
+    if answer_cache is None or not answer:
+        return
+    try:
+        answer_cache.put(item["objectKey"], conversation_version(item), prompt_version, question, answer)
+    except Exception as err:
+        print(f"Answer cache write failed: {err}")
+
+
+def load_transcript(item, question=""):
+    """
+    Read the (translated, if available) transcript of a processed conversation, reduced to the
+    segments relevant to the question when one is given
+
+    Returns:
+        str: Transcript text
+    """
+    s3_bucket = item["bucketName"]
+    output_key = item["outputFile"]
+    s3_obj = s3_client.get_object(Bucket=s3_bucket, Key=output_key)
+    s3_data = s3_obj["Body"].read().decode("utf-8")
+    s3_client_data = json.loads(s3_data)
+    if "TranslatedTranscript" in s3_client_data:
+        transcript_data = s3_client_data["TranslatedTranscript"]
+    else:
+        transcript_data = s3_client_data["RawTranscript"]
+    transcript = "".join(transcript_data)
+    if question:
+        transcript = retrieve_context(item, transcript, question)
+    return transcript
+
+
+def start_stream(key, question, context):
+    """
+    Register a stream and hand generation to an asynchronous invocation of this function. A cached
+    answer is written as an already completed stream.
+    """
+    stream_id = str(uuid.uuid4())
+    item = get_conversation(key)
+    cached = get_cached_answer(item, question) if item is not None else None
+    streams_table.put_item(Item={
+        "streamId": stream_id,
+        "objectKey": key,
+        "text": cached or "",
+        "done": cached is not None,
+        "expiresAt": int(time.time()) + STREAM_TTL,
+    })
+    if cached is not None:
+        print(f"Answered {key} from the answer cache")
+        payload = get_response()
+        payload["body"] = json.dumps({"streamId": stream_id})
+        return payload
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"stream_worker": {"stream_id": stream_id, "key": key, "query": question}}),
+    )
+    payload = get_response()
+    payload["body"] = json.dumps({"streamId": stream_id})
+    return payload
+
+
+def write_stream(stream_id, text, done):
+    streams_table.update_item(
+        Key={"streamId": stream_id},
+        UpdateExpression="SET #text = :text, done = :done",
+        ExpressionAttributeNames={"#text": "text"},
+        ExpressionAttributeValues={":text": text, ":done": done},
+    )
+
+
+def stream_worker(job):
+    """
+    Consume the streamed completion and flush the text generated so far every STREAM_FLUSH_INTERVAL
+    """
+    stream_id = job["stream_id"]
+    text = ""
+    try:
+        item = get_conversation(job["key"])
+        if item is None:
+            write_stream(stream_id, "Sorry, I don't know.", True)
+            return {"streamId": stream_id, "status": "SUCCEEDED"}
+        transcript_data = load_transcript(item, job["query"])
+        prompt_version = prompt_registry.get_version(SSM_LLM_CHATBOT_NAME)
+        prompt = render_prompt(prompt_registry.get(SSM_LLM_CHATBOT_NAME), transcript_data, job["query"])
+        parameters = {"temperature": TEMPERATURE, "max_tokens": MAX_TOKENS}
+        last_flush = 0.0
+        for fragment in llama_client.generate_stream(prompt, parameters):
+            # Clients poll by offset into the stored text, so every write must extend the previous one:
+            # leading whitespace is dropped before it is first written and the text never stripped after
+            text = (text + fragment).lstrip()
+            if time.time() - last_flush >= STREAM_FLUSH_INTERVAL:
+                write_stream(stream_id, text, False)
+                last_flush = time.time()
+        write_stream(stream_id, text, True)
+        print(f"Streamed response from Llama4Scout for {job['key']}")
+        cache_answer(item, job["query"], text.strip(), prompt_version)
+        return {"streamId": stream_id, "status": "SUCCEEDED"}
+    except Exception as err:
+        print(err)
+        write_stream(stream_id, text + "\nAn error occurred generating Llama4Scout query response.", True)
+        return {"streamId": stream_id, "status": "FAILED"}
+
+
+def poll_stream(request):
+    """
+    Return the text generated since the client's last offset
+    """
+    item = streams_table.get_item(
+        Key={"streamId": request["stream_id"]},
+        ConsistentRead=True,
+    ).get("Item")
+    if item is None:
+        return get_err_response()
+    offset = int(request.get("offset", 0))
+    payload = get_response()
+    payload["body"] = json.dumps({
+        "text": item["text"][offset:],
+        "offset": len(item["text"]),
+        "done": item["done"],
+    })
+    return payload
+
+
 def get_response():
     return {
         "statusCode": 200,
@@ -75,33 +307,34 @@ def get_err_response():
 
 
 def handler(event, context):
+    if "stream_worker" in event:
+        return stream_worker(event["stream_worker"])
+
     key = event["path"].replace("/genai/", "")
     request = json.loads(event["body"])
+    if streams_table is not None:
+        if "stream_id" in request:
+            return poll_stream(request)
+        if request.get("stream"):
+            return start_stream(key, request["query"], context)
+
     payload = get_response()
     query_response = ""
     try:
-        object_from_table = table.get_item(
-            Key={"objectKey": "input/" + key},
-            ConsistentRead=True,
-        )
-        if "Item" in object_from_table.keys():
-            item = object_from_table["Item"]
-            s3_bucket = item["bucketName"]
-            output_key = item["outputFile"]
-            s3_obj = s3_client.get_object(Bucket=s3_bucket, Key=output_key)
-            s3_data = s3_obj["Body"].read().decode("utf-8")
-            s3_client_data = json.loads(s3_data)
-            if "TranslatedTranscript" in s3_client_data:
-                transcript_data = s3_client_data["TranslatedTranscript"]
-            else:
-                transcript_data = s3_client_data["RawTranscript"]
-            transcript_data = "".join(transcript_data)
-            llm_summarization_prompt = ssm_client.get_parameter(
-                Name=SSM_LLM_CHATBOT_NAME
-            )
-            prompt = llm_summarization_prompt["Parameter"]["Value"]
+        item = get_conversation(key)
+        cached = get_cached_answer(item, request["query"]) if item is not None else None
+        if cached is not None:
+            query_response = cached
+            print(f"Answered {key} from the answer cache")
+        elif item is not None:
+            transcript_data = load_transcript(item, request["query"])
+            prompt_version = prompt_registry.get_version(SSM_LLM_CHATBOT_NAME)
+            prompt = prompt_registry.get(SSM_LLM_CHATBOT_NAME)
             query_response = generate_llama_query(prompt, transcript_data, request["query"])
             print(f"Got response from Llama4Scout for {key}")
+            cache_answer(item, request["query"], query_response, prompt_version)
+            if llama_client.cache is not None:
+                llama_client.cache.report()
     except Exception as err:
         query_response = "An error occurred generating Llama4Scout query response."
         print(query_response)
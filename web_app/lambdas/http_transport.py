@@ -0,0 +1,139 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Connection pools per host and connections kept alive per pool
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+HTTP_TIMING_LOG = os.getenv("HTTP_TIMING_LOG", "false") == "true"
+
+# Connection setup timings of the request currently running on this thread
+_connection_timings = threading.local()
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        started = time.perf_counter()
+        conn = super()._new_conn()
+        _connection_timings.connect = time.perf_counter() - started
+        return conn
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        started = time.perf_counter()
+        conn = super()._new_conn()
+        _connection_timings.connect = time.perf_counter() - started
+        return conn
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        # Everything after the TCP connect is the TLS handshake
+        _connection_timings.tls = time.perf_counter() - started - getattr(_connection_timings, "connect", 0.0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    Keep-alive adapter whose connections record TCP connect and TLS handshake times
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def get_session(name):
+    """
+    Shared keep-alive session for an API, reused across requests, retries and threads
+    in the same container
+    """
+    with _sessions_lock:
+        if name not in _sessions:
+            session = requests.Session()
+            adapter = TimedHTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+        return _sessions[name]
+
+
+def post(session, url, **kwargs):
+    """
+    POST through a pooled session and attach per-request timings (seconds) as response.timing:
+    connect and tls are 0 when a kept-alive connection was reused, ttfb is the time until the
+    response headers arrived and total includes reading the body (unless stream=True).
+    """
+    _connection_timings.connect = 0.0
+    _connection_timings.tls = 0.0
+    started = time.perf_counter()
+    response = session.post(url, **kwargs)
+    response.timing = {
+        "connect": round(_connection_timings.connect, 4),
+        "tls": round(_connection_timings.tls, 4),
+        "ttfb": round(response.elapsed.total_seconds(), 4),
+        "total": round(time.perf_counter() - started, 4),
+        "reused": _connection_timings.connect == 0.0,
+    }
+    if HTTP_TIMING_LOG:
+        print(f"POST {url} {response.status_code} timing: {response.timing}")
+    return response
+
+
+class AsyncHTTPTransport:
+    """
+    Optional asyncio variant backed by aiohttp, for callers that run their own event loop.
+    aiohttp is not part of the Lambda bundle and has to be installed to use this class.
+    """
+
+    def __init__(self, limit=None):
+        import aiohttp
+
+        self.aiohttp = aiohttp
+        self.limit = limit or HTTP_POOL_MAXSIZE
+        self.session = None
+
+    async def post(self, url, timeout, **kwargs):
+        """
+        Returns:
+            tuple: HTTP status, decoded JSON body and the request timings
+        """
+        if self.session is None:
+            self.session = self.aiohttp.ClientSession(
+                connector=self.aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=60)
+            )
+        started = time.perf_counter()
+        async with self.session.post(url, timeout=self.aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            ttfb = time.perf_counter() - started
+            body = await response.json()
+            timing = {"ttfb": round(ttfb, 4), "total": round(time.perf_counter() - started, 4)}
+            return response.status, body, timing
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
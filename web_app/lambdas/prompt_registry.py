@@ -0,0 +1,103 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import hashlib
+import os
+import threading
+import time
+
+import boto3
+
+SSM_LLM_CHATBOT_NAME = "ci_chatbot_prompt"
+SSM_LLM_SUMMARIZATION_NAME = "ci_summarization_prompt"
+SSM_LLM_ACTION_PROMPT = "ci_action_prompt"
+SSM_LLM_TOPIC_PROMPT = "ci_topic_prompt"
+SSM_LLM_PRODUCT_PROMPT = "ci_product_prompt"
+SSM_LLM_RESOLVED_PROMPT = "ci_resolved_prompt"
+SSM_LLM_CALLBACK_PROMPT = "ci_callback_prompt"
+SSM_LLM_POLITE_PROMPT = "ci_politeness_prompt"
+SSM_LLM_AGENT_SENTIMENT_PROMPT = "ci_agent_sentiment_prompt"
+SSM_LLM_CUSTOMER_SENTIMENT_PROMPT = "ci_customer_sentiment_prompt"
+
+# Admin display title -> SSM parameter name, in the order the admin page lists them
+PROMPT_TITLES = {
+    "Chatbot": SSM_LLM_CHATBOT_NAME,
+    "Summarization": SSM_LLM_SUMMARIZATION_NAME,
+    "Action Item": SSM_LLM_ACTION_PROMPT,
+    "Topic": SSM_LLM_TOPIC_PROMPT,
+    "Product": SSM_LLM_PRODUCT_PROMPT,
+    "Resolution": SSM_LLM_RESOLVED_PROMPT,
+    "Callback": SSM_LLM_CALLBACK_PROMPT,
+    "Politeness": SSM_LLM_POLITE_PROMPT,
+    "Agent Sentiment": SSM_LLM_AGENT_SENTIMENT_PROMPT,
+    "Customer Sentiment": SSM_LLM_CUSTOMER_SENTIMENT_PROMPT,
+}
+
+# SSM GetParameters accepts at most 10 names per call
+SSM_BATCH_SIZE = 10
+
+
+def prompt_version(value):
+    """
+    Short content hash identifying a prompt revision
+    """
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptRegistry:
+    """
+    Loads every prompt with batched SSM reads and keeps them in a warm-container cache
+    """
+
+    def __init__(self, ssm_client=None, names=None, ttl_seconds=None):
+        self.ssm_client = ssm_client or boto3.client("ssm")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("PROMPT_CACHE_TTL", "60"))
+        # Callers restrict the registry to the parameters their role is allowed to read
+        self.names = list(names) if names is not None else list(PROMPT_TITLES.values())
+        self.prompts = {}
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        prompts = {}
+        for i in range(0, len(self.names), SSM_BATCH_SIZE):
+            response = self.ssm_client.get_parameters(Names=self.names[i:i + SSM_BATCH_SIZE])
+            for parameter in response["Parameters"]:
+                prompts[parameter["Name"]] = {
+                    "value": parameter["Value"],
+                    "version": prompt_version(parameter["Value"]),
+                }
+            if response.get("InvalidParameters"):
+                print(f"Prompts not found in SSM: {response['InvalidParameters']}")
+        self.prompts = prompts
+        self.loaded_at = time.time()
+
+    def get_all(self):
+        """
+        Returns:
+            dict: SSM parameter name -> {"value": prompt text, "version": content hash}
+        """
+        with self.lock:
+            if not self.prompts or time.time() - self.loaded_at > self.ttl_seconds:
+                self._load()
+            return dict(self.prompts)
+
+    def get(self, name):
+        return self.get_all()[name]["value"]
+
+    def get_version(self, name):
+        return self.get_all()[name]["version"]
+
+    def put(self, name, value):
+        self.ssm_client.put_parameter(
+            Name=name,
+            Value=value,
+            Type="String",
+            Overwrite=True,
+        )
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.prompts = {}
+            self.loaded_at = 0
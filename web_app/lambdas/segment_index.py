@@ -0,0 +1,152 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+
+import math
+import os
+import re
+from collections import Counter
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rank constant for reciprocal rank fusion of the BM25 and embedding rankings
+RRF_K = 60
+# Optional sentence-transformers model for hybrid retrieval, e.g. "all-MiniLM-L6-v2". The package is
+# not part of the Lambda bundle, so retrieval is BM25 only unless it is installed (e.g. as a layer).
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i if in into is it its me my no not of on "
+    "or our she so that the their them then there they this to was we were what when which who will with you "
+    "your yes okay ok um uh".split()
+)
+
+_embedding_models = {}
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def segment_text(segment):
+    """
+    Speaker-labelled line of a SpeechSegments entry, translated when a translation exists
+    """
+    return segment.get("RawTranslatedText") or segment["RawText"]
+
+
+def get_embedding_model():
+    if not EMBEDDING_MODEL:
+        return None
+    if EMBEDDING_MODEL not in _embedding_models:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            print(f"sentence-transformers is not installed, {EMBEDDING_MODEL} embeddings are disabled")
+            _embedding_models[EMBEDDING_MODEL] = None
+        else:
+            _embedding_models[EMBEDDING_MODEL] = SentenceTransformer(EMBEDDING_MODEL)
+    return _embedding_models[EMBEDDING_MODEL]
+
+
+def build_index(speech_segments):
+    """
+    BM25 index over the speech segments of one conversation, plus segment embeddings when
+    an embedding model is configured
+
+    Returns:
+        dict: JSON-serialisable index
+    """
+    texts = [segment_text(segment).strip() for segment in speech_segments]
+    postings = {}
+    lengths = []
+    for i, text in enumerate(texts):
+        terms = Counter(tokenize(text))
+        lengths.append(sum(terms.values()))
+        for term, frequency in terms.items():
+            postings.setdefault(term, []).append([i, frequency])
+    index = {
+        "version": INDEX_VERSION,
+        "segments": texts,
+        "lengths": lengths,
+        "avgdl": sum(lengths) / len(lengths) if lengths else 0.0,
+        "postings": postings,
+    }
+    model = get_embedding_model()
+    if model is not None and texts:
+        vectors = model.encode(texts, normalize_embeddings=True)
+        index["embedding_model"] = EMBEDDING_MODEL
+        index["embeddings"] = [[round(float(value), 5) for value in vector] for vector in vectors]
+    return index
+
+
+def bm25_scores(index, query):
+    count = len(index["segments"])
+    scores = {}
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for segment, frequency in postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index["lengths"][segment] / (index["avgdl"] or 1))
+            scores[segment] = scores.get(segment, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+    return scores
+
+
+def embedding_scores(index, query):
+    if "embeddings" not in index or index.get("embedding_model") != EMBEDDING_MODEL:
+        return {}
+    model = get_embedding_model()
+    if model is None:
+        return {}
+    vector = model.encode([query], normalize_embeddings=True)[0]
+    return {
+        i: sum(a * b for a, b in zip(vector, embedding))
+        for i, embedding in enumerate(index["embeddings"])
+    }
+
+
+def search(index, query, top_k):
+    """
+    Segment numbers most relevant to the query, best first. BM25 and embedding rankings are
+    combined with reciprocal rank fusion when the index carries embeddings.
+    """
+    rankings = [
+        sorted(scores, key=scores.get, reverse=True)
+        for scores in (bm25_scores(index, query), embedding_scores(index, query))
+        if scores
+    ]
+    fused = {}
+    for ranking in rankings:
+        for rank, segment in enumerate(ranking):
+            fused[segment] = fused.get(segment, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:top_k]
+
+
+def select_context(index, query, top_k, neighbours):
+    """
+    The top-k segments for a question with their neighbouring turns, in transcript order.
+    Gaps between non-adjacent excerpts are marked with "...".
+
+    Returns:
+        str: Transcript excerpt, or None when no segment matches the question
+    """
+    hits = search(index, query, top_k)
+    if not hits:
+        return None
+    count = len(index["segments"])
+    selected = sorted({
+        line
+        for hit in hits
+        for line in range(max(0, hit - neighbours), min(count, hit + neighbours + 1))
+    })
+    lines = []
+    previous = -1
+    for line in selected:
+        if previous >= 0 and line != previous + 1:
+            lines.append("...")
+        lines.append(index["segments"][line])
+        previous = line
+    return "\n".join(lines) + "\n"